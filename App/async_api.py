@@ -0,0 +1,151 @@
+import re
+import time
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import Headers
+
+from App.database import resolve_url, sqlite_pragmas, apply_sqlite_pragmas
+from App.models import Student, Accolade, Leaderboard
+from App.controllers import page_args, users_page_query, leaderboard_top, leaderboard_json
+from App.instrumentation import instrument_engine, begin_request_stats, record_request
+from App.response_cache import cache_key, lookup, store, conditional_response
+
+# Async drivers for each backend the sync app supports
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_url(app, uri):
+    url = resolve_url(app, uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class AsyncAPI:
+    """ASGI app serving the read-heavy endpoints from an async engine over the
+    shared models and controller helpers, with the same response cache and
+    metrics as their sync views; every other request goes to the Flask app
+    through WsgiToAsgi"""
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        # Reads can go to the replica, like the read_only() controller paths
+        uri = app.config.get('SQLALCHEMY_REPLICA_URI') or app.config['SQLALCHEMY_DATABASE_URI']
+        self.engine = create_async_engine(async_url(app, uri), **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        if self.engine.dialect.name == 'sqlite':
+            apply_sqlite_pragmas(self.engine, sqlite_pragmas(app))
+        self.metrics = app.extensions.get('metrics')
+        if self.metrics is not None:
+            instrument_engine(self.engine.sync_engine)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        # (pattern, handler, the sync view's endpoint for metrics, cached like that view)
+        self.routes = [
+            (re.compile(r'/health'), self.health, 'index_views.health_check', False),
+            (re.compile(r'/api/users'), self.users, 'user_views.get_users_action', True),
+            (re.compile(r'/api/leaderboard'), self.leaderboard, 'user_views.get_leaderboard_action', True),
+            (re.compile(r'/api/students/(\d+)/accolades'), self.accolades,
+             'user_views.get_student_accolades_action', True),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            for pattern, handler, endpoint, cached in self.routes:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    # First value of each argument, as request.args.get() gives the sync views
+                    args = {key: values[0] for key, values in
+                            parse_qs(scope['query_string'].decode(), keep_blank_values=True).items()}
+                    headers = Headers([(name.decode('latin-1'), value.decode('latin-1'))
+                                       for name, value in scope['headers']])
+                    with self.app.app_context():
+                        started = time.perf_counter()
+                        stats = begin_request_stats() if self.metrics is not None else None
+                        if cached:
+                            full_path = f"{scope['path']}?{scope['query_string'].decode('latin-1')}"
+                            result = await self.cached(full_path, headers, handler, args, match.groups())
+                        else:
+                            result = self.render(*await handler(args, headers, *match.groups()))
+                        # None hands the request to the sync view (e.g. NDJSON streaming)
+                        if result is not None and stats is not None:
+                            record_request(endpoint, 'GET', result[0], started, stats)
+                    if result is not None:
+                        return await self.respond(send, *result)
+                    break
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def render(self, status, data, headers=()):
+        # The app's JSON provider, so bodies (and ETags) match jsonify's
+        return status, self.app.json.response(data).get_data(), {'Content-Type': 'application/json', **dict(headers)}
+
+    async def cached(self, full_path, headers, handler, args, groups):
+        """Serve a handler through the response cache, sharing entries with the sync view"""
+        key = cache_key(full_path, headers)
+        entry, token, modified = lookup(key)
+        if entry is None:
+            result = await handler(args, headers, *groups)
+            if result is None:
+                return None
+            status, body, response_headers = self.render(*result)
+            if status != 200:
+                return status, body, response_headers
+            entry = store(key, token, body, 'application/json', response_headers)
+        return conditional_response(entry, modified, headers)
+
+    @staticmethod
+    async def respond(send, status, body, headers):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-length', str(len(body)).encode()),
+            *((name.encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def health(self, args, headers):
+        return 200, {'status': 'healthy'}
+
+    async def users(self, args, headers):
+        if args.get('format') == 'ndjson' or 'application/x-ndjson' in headers.get('accept', ''):
+            return None
+        limit, after_id = page_args(args)
+        async with self.session() as session:
+            users = [user.get_json() for user in (await session.scalars(users_page_query(limit, after_id)))]
+        cursor = [('X-Next-After-Id', str(users[-1]['id']))] if len(users) == limit else []
+        return 200, users, cursor
+
+    async def leaderboard(self, args, headers):
+        window = args.get('window')
+        try:
+            top = leaderboard_top(args)
+            query = Leaderboard.windowQuery(*Leaderboard.windowBounds(window)) if window \
+                else Leaderboard.rankingQuery(use_stored=True)
+        except ValueError as e:
+            return 400, {'message': str(e)}
+        # Serve from the process's rank index when the sync side has it built
+        index = None if window else Leaderboard.builtIndex()
+        if index is not None:
+            rows = index.top(top)
+        else:
+            if top is not None:
+                query = query.limit(top)
+            async with self.session() as session:
+                rows = (await session.execute(query)).all()
+        return 200, leaderboard_json(rows)
+
+    async def accolades(self, args, headers, student_id):
+        async with self.session() as session:
+            if await session.get(Student, int(student_id)) is None:
+                return 404, {'message': "Student not found"}
+            accolades = await session.scalars(Accolade.forStudent(int(student_id)))
+            return 200, [accolade.get_json() for accolade in accolades]
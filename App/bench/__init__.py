@@ -0,0 +1,6 @@
+from .indexes import run_index_benchmark
+from .seed import seed_synthetic
+from .paths import run_path_benchmarks
+from .startup import run_startup_benchmark, parse_importtime
+from .load import run_load, run_async_load, asgi_get
+from .writes import run_write_benchmark
@@ -0,0 +1,103 @@
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import MetaData, UniqueConstraint, create_engine, text
+
+from App.database import db
+
+# Index and constraint names added by migrations 3f2a9c41d7e0 and 8b71e0c5a2f4
+INDEX_NAMES = {
+    'ix_loggedHours_student_confirmed',
+    'ix_loggedHours_staff_confirmed',
+    'ix_confirmRequest_student_status',
+    'ix_confirmRequest_status_date',
+    'uq_accolade_student_milestone',
+}
+
+HOT_QUERIES = {
+    'confirmed_hours_sum': (
+        'SELECT SUM(hours) FROM "loggedHours" WHERE "studentID" = :student AND "isConfirmed" = 1'
+    ),
+    'accolade_probe': (
+        'SELECT "accoladeID" FROM accolade WHERE "studentID" = :student AND milestone = 25'
+    ),
+    'pending_requests': (
+        'SELECT "requestID" FROM "confirmRequest" WHERE "studentID" = :student AND status = \'pending\''
+    ),
+}
+
+
+def _schema(with_indexes):
+    """Copy of the app schema, optionally stripped of the hot-filter indexes"""
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        if not with_indexes:
+            copy.indexes = {index for index in copy.indexes if index.name not in INDEX_NAMES}
+            copy.constraints = {c for c in copy.constraints
+                                if not (isinstance(c, UniqueConstraint) and c.name in INDEX_NAMES)}
+    return metadata
+
+def _seed(conn, students, logs_per_student, rng):
+    now = datetime.utcnow()
+    staff_count = max(1, students // 50)
+    conn.execute(db.metadata.tables['user'].insert(), [
+        {'id': i, 'username': f'bench{i}', 'password': 'x', 'user_type': 'student' if i <= students else 'staff'}
+        for i in range(1, students + staff_count + 1)
+    ])
+    conn.execute(db.metadata.tables['student'].insert(), [
+        {'id': i, 'studentName': f'Student {i}', 'totalHours': 0} for i in range(1, students + 1)
+    ])
+    conn.execute(db.metadata.tables['staff'].insert(), [
+        {'id': students + i, 'staffName': f'Staff {i}'} for i in range(1, staff_count + 1)
+    ])
+    logs = []
+    for student in range(1, students + 1):
+        for _ in range(logs_per_student):
+            logs.append({'logID': len(logs) + 1, 'studentID': student,
+                         'staffID': students + rng.randint(1, staff_count),
+                         'hours': rng.randint(1, 8), 'logDate': now, 'isConfirmed': rng.random() < 0.7})
+    conn.execute(db.metadata.tables['loggedHours'].insert(), logs)
+    conn.execute(db.metadata.tables['accolade'].insert(), [
+        {'studentID': student, 'milestone': milestone, 'dateAwarded': now}
+        for student in range(1, students + 1) for milestone in (10, 25, 50) if rng.random() < 0.5
+    ])
+    conn.execute(db.metadata.tables['confirmRequest'].insert(), [
+        {'loggedHoursID': log['logID'], 'studentID': log['studentID'], 'requestDate': now,
+         'status': 'pending' if not log['isConfirmed'] else 'approved'}
+        for log in logs if rng.random() < 0.3
+    ])
+
+def _measure(conn, students, repeat, rng):
+    results = {}
+    for name, sql in HOT_QUERIES.items():
+        plan = conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'), {'student': 1}).all()
+        ids = [rng.randint(1, students) for _ in range(repeat)]
+        start = time.perf_counter()
+        for student in ids:
+            conn.execute(text(sql), {'student': student}).all()
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            'plan': [row[-1] for row in plan],
+            'avg_ms': round(elapsed * 1000 / repeat, 4),
+        }
+    return results
+
+def run_index_benchmark(students=2000, logs_per_student=25, repeat=200, seed=42):
+    """Seed two scratch SQLite databases, with and without the hot-filter indexes,
+    and report the query plan and average latency of each hot filter"""
+    report = {'students': students, 'loggedHours': students * logs_per_student, 'queries': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant in ('without_indexes', 'with_indexes'):
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, variant)}.db")
+            _schema(variant == 'with_indexes').create_all(engine)
+            with engine.begin() as conn:
+                _seed(conn, students, logs_per_student, random.Random(seed))
+            with engine.connect() as conn:
+                conn.execute(text('ANALYZE'))
+                for name, result in _measure(conn, students, repeat, random.Random(seed)).items():
+                    report['queries'].setdefault(name, {})[variant] = result
+            engine.dispose()
+    return report
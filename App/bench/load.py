@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from .paths import summarize
+
+
+def _http_get(base_url):
+    def get(path):
+        try:
+            with urllib.request.urlopen(base_url.rstrip('/') + path, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return get
+
+def _client_get(app):
+    local = threading.local()
+    def get(path):
+        # Test clients are not shared between threads
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        with app.app_context():
+            return local.client.get(path).status_code
+    return get
+
+async def asgi_get(application, path, headers=()):
+    """Call an ASGI app in-process, returning (status, headers, body)"""
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+             'query_string': query.encode(), 'server': ('bench', 80), 'client': ('127.0.0.1', 0),
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+    response = {'status': None, 'headers': {}, 'body': b''}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode().lower(): value.decode() for name, value in message['headers']}
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    await application(scope, receive, send)
+    return response['status'], response['headers'], response['body']
+
+def run_async_load(application, paths, requests=500, concurrency=64):
+    """Drive GET requests over paths through an ASGI app with up to concurrency in flight"""
+    samples, statuses = [], {}
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        async def one(i):
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    status = (await asgi_get(application, paths[i % len(paths)]))[0]
+                except Exception as e:
+                    status = type(e).__name__
+                samples.append(time.perf_counter() - start)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+        await asyncio.gather(*(one(i) for i in range(requests)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    wall = time.perf_counter() - start
+    return {
+        'target': 'asgi',
+        'paths': paths,
+        'concurrency': concurrency,
+        'requests': requests,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(requests / wall, 2) if wall else None,
+        'statuses': statuses,
+        'latency': summarize(samples),
+    }
+
+def run_load(paths, requests=500, threads=8, base_url=None, app=None):
+    """Drive GET requests over paths from a thread pool, either against a running
+    server at base_url (e.g. local gunicorn) or through the app's test client"""
+    get = _http_get(base_url) if base_url else _client_get(app)
+    samples, statuses = [], {}
+    lock = threading.Lock()
+
+    def one(i):
+        path = paths[i % len(paths)]
+        start = time.perf_counter()
+        try:
+            status = get(path)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        'target': base_url or 'test-client',
+        'paths': paths,
+        'threads': threads,
+        'requests': requests,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(requests / wall, 2) if wall else None,
+        'statuses': statuses,
+        'latency': summarize(samples),
+    }
@@ -0,0 +1,92 @@
+import platform
+import subprocess
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event
+
+from App.database import db
+from App.models import Student, Staff, LoggedHours, Leaderboard
+from App.controllers import StudentController, StaffController, view_leaderboard, login
+from .seed import BENCH_PASSWORD
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'runs': 0}
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(50), 3),
+        'p95_ms': round(percentile(95), 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+def measure(fn, repeat, setup=None):
+    """Time fn repeat times, also counting the SQL statements of each call"""
+    samples, statements = [], [0]
+    def count(*args):
+        statements[0] += 1
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(repeat):
+            if setup:
+                setup()
+            # Time each call against a clean identity map, like a fresh request
+            db.session.expunge_all()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    result = summarize(samples)
+    result['queries_per_call'] = round(statements[0] / repeat, 2) if repeat else 0
+    return result
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_path_benchmarks(repeat=20):
+    """Time the key read and write paths against the current database"""
+    staff = db.session.scalars(db.select(Staff).order_by(Staff.id).limit(1)).first()
+    student = db.session.scalars(
+        db.select(Student).where(Student.username.like('bench_s%')).order_by(Student.id).limit(1)).first()
+    pending = db.session.scalars(
+        db.select(LoggedHours.logID).where(LoggedHours.isConfirmed.isnot(True)).limit(repeat)).all()
+    pending_iter = iter(pending)
+    client = current_app.test_client()
+
+    paths = {
+        'view_leaderboard_cold': measure(view_leaderboard, repeat, setup=Leaderboard.invalidate),
+        'view_leaderboard_warm': measure(view_leaderboard, repeat),
+        'leaderboard_full_ranking': measure(lambda: Leaderboard().generateRankings(), repeat),
+        'get_students_json_summary': measure(lambda: StudentController.get_students_json('summary'), repeat),
+        'get_students_page_detail': measure(lambda: StudentController.get_students_page(100), repeat),
+        'api_users_page': measure(lambda: client.get('/api/users?limit=100'), repeat),
+    }
+    if student:
+        paths['login'] = measure(lambda: login(student.username, BENCH_PASSWORD), repeat)
+    if staff and pending:
+        paths['confirm_hours'] = measure(
+            lambda: StaffController.confirm_hours(staff.id, next(pending_iter)), len(pending))
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'database': db.engine.dialect.name,
+        'rows': {
+            'students': db.session.scalar(db.select(db.func.count(Student.id))),
+            'loggedHours': db.session.scalar(db.select(db.func.count(LoggedHours.logID))),
+        },
+        'repeat': repeat,
+        'paths': paths,
+    }
@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from App.database import db
+from App.models import User, Student, Staff, LoggedHours, DailyHours, HoursLedger, Accolade, Leaderboard, hash_password
+
+BENCH_PASSWORD = 'benchpass'
+
+
+def _insert(table, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+
+def _advance_id_sequence(table):
+    # Explicit ids leave PostgreSQL's serial sequence behind, so the next
+    # ordinary insert would collide with a seeded row
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+            f"(SELECT max(id) FROM \"{table.name}\"))"))
+
+def seed_synthetic(students=1000, staff=20, logs=20000, skew=1.1, confirmed_ratio=0.7,
+                   seed=42, batch_size=5000):
+    """Bulk insert a synthetic dataset. Logged hours follow a Zipf-like
+    distribution over students, so a few students hold most of the history."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    first_id = (db.session.scalar(db.select(db.func.max(User.id))) or 0) + 1
+    # Every bench account shares one hash, hashing is not what is measured here
+    password = hash_password(BENCH_PASSWORD)
+    student_ids = list(range(first_id, first_id + students))
+    staff_ids = list(range(first_id + students, first_id + students + staff))
+
+    _insert(User.__table__, [
+        {'id': i, 'username': f'bench_s{i}', 'password': password, 'user_type': 'student', 'created_date': now}
+        for i in student_ids
+    ] + [
+        {'id': i, 'username': f'bench_t{i}', 'password': password, 'user_type': 'staff', 'created_date': now}
+        for i in staff_ids
+    ], batch_size)
+    _advance_id_sequence(User.__table__)
+    _insert(Staff.__table__, [
+        {'id': i, 'staffName': f'Bench Staff {i}', 'staffEmail': f'bench_t{i}@example.com'} for i in staff_ids
+    ], batch_size)
+
+    weights = list(accumulate(1 / (rank ** skew) for rank in range(1, students + 1)))
+    owners = rng.choices(student_ids, cum_weights=weights, k=logs)
+    totals = dict.fromkeys(student_ids, 0)
+    rows = []
+    for owner in owners:
+        hours = rng.randint(1, 8)
+        logDate = now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440))
+        confirmed = rng.random() < confirmed_ratio
+        if confirmed:
+            totals[owner] += hours
+        rows.append({'studentID': owner, 'staffID': rng.choice(staff_ids), 'hours': hours,
+                     'description': 'Synthetic service', 'logDate': logDate, 'isConfirmed': confirmed,
+                     'dateConfirmed': logDate + timedelta(days=rng.randint(0, 14)) if confirmed else None})
+    _insert(Student.__table__, [
+        {'id': i, 'studentName': f'Bench Student {i}', 'studentEmail': f'bench_s{i}@example.com',
+         'totalHours': totals[i]} for i in student_ids
+    ], batch_size)
+    _insert(LoggedHours.__table__, rows, batch_size)
+    awarded = Accolade.recomputeAll()
+    DailyHours.rebuild()
+    HoursLedger.rebuild()
+    db.session.commit()
+    Leaderboard.invalidate()
+    return {'students': students, 'staff': staff, 'loggedHours': logs, 'accolades': awarded,
+            'confirmed': sum(1 for row in rows if row['isConfirmed']),
+            'firstStudentID': student_ids[0] if student_ids else None,
+            'firstStaffID': staff_ids[0] if staff_ids else None}
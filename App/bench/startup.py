@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import time
+
+from .paths import summarize
+
+FACTORY_SNIPPET = (
+    "import time; start = time.perf_counter(); from App.main import create_app; "
+    "create_app(profile={profile!r}); print(time.perf_counter() - start)"
+)
+
+
+def _python(code, env=None, importtime=False):
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    return subprocess.run(args, capture_output=True, text=True, env={**os.environ, **(env or {})},
+                          cwd=os.getcwd(), timeout=120)
+
+def parse_importtime(stderr, top=15):
+    """Top-level packages by cumulative import time (microseconds) from -X importtime output"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    total = sum(packages.values())
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {'total_ms': round(total / 1000, 1),
+            'packages': [{'package': name, 'ms': round(us / 1000, 1)} for name, us in ranked]}
+
+def run_startup_benchmark(repeat=3, command=('user', 'list'), top=15):
+    """Time interpreter startup for the app factory profiles, a short CLI
+    command and a server import, each in a fresh interpreter"""
+    report = {'repeat': repeat, 'factory': {}, 'imports': {}}
+    for profile in ('web', 'cli'):
+        samples = [float(_python(FACTORY_SNIPPET.format(profile=profile)).stdout.strip().splitlines()[-1])
+                   for _ in range(repeat)]
+        report['factory'][profile] = summarize(samples)
+        traced = _python(FACTORY_SNIPPET.format(profile=profile), importtime=True)
+        report['imports'][profile] = parse_importtime(traced.stderr, top)
+
+    cli = [sys.executable, '-m', 'flask'] + list(command)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cli, capture_output=True, env={**os.environ, 'FLASK_APP': 'wsgi.py'},
+                       cwd=os.getcwd(), timeout=120)
+        samples.append(time.perf_counter() - start)
+    report['cli'] = {'command': ' '.join(['flask'] + list(command)), **summarize(samples)}
+
+    # What a gunicorn worker pays to import the app module
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _python('import wsgi')
+        samples.append(time.perf_counter() - start)
+    report['server_import'] = summarize(samples)
+    return report
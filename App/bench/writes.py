@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+from App.database import db
+from App.models import Student, Staff, LoggedHours, HoursLedger
+from App.controllers import StaffController
+from App.write_buffer import HoursBuffer
+from .paths import summarize
+
+BENCH_DESCRIPTION = 'Bench write-behind'
+
+
+def _log_many(app, staffIDs, studentIDs, entries, threads):
+    """Log entries through the controller from a pool of threads, like concurrent requests"""
+    samples, errors = [], [0]
+    def one(i):
+        with app.app_context():
+            start = time.perf_counter()
+            log, message = StaffController.log_hours(staffIDs[i % len(staffIDs)], studentIDs[i % len(studentIDs)],
+                                                     1 + i % 4, BENCH_DESCRIPTION, durable=False)
+            samples.append(time.perf_counter() - start)
+            if log is None:
+                errors[0] += 1
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(entries)))
+    return start, samples, errors[0]
+
+def _result(start, samples, errors, entries):
+    wall = time.perf_counter() - start
+    return {'entries': entries, 'errors': errors, 'wall_seconds': round(wall, 3),
+            'entries_per_second': round(entries / wall, 2) if wall else None, 'latency': summarize(samples)}
+
+def _cleanup():
+    logIDs = db.select(LoggedHours.logID).where(LoggedHours.description == BENCH_DESCRIPTION)
+    db.session.execute(db.delete(HoursLedger).where(HoursLedger.logID.in_(logIDs)))
+    removed = db.session.execute(db.delete(LoggedHours).where(LoggedHours.description == BENCH_DESCRIPTION))
+    db.session.commit()
+    return removed.rowcount
+
+def run_write_benchmark(entries=2000, threads=8, batch_size=100):
+    """Compare per-row commits with the write-behind buffer for logging hours
+    against the current database; the benchmark's entries are removed after"""
+    app = current_app._get_current_object()
+    staffIDs = db.session.scalars(db.select(Staff.id).order_by(Staff.id).limit(20)).all()
+    studentIDs = db.session.scalars(db.select(Student.id).order_by(Student.id).limit(200)).all()
+    if not staffIDs or not studentIDs:
+        raise ValueError("Seed some staff and students first, e.g. flask bench seed")
+    report = {'threads': threads, 'batch_size': batch_size}
+    previous = app.extensions.pop('hours_buffer', None)
+    try:
+        report['per_row'] = _result(*_log_many(app, staffIDs, studentIDs, entries, threads), entries)
+        buffer = app.extensions['hours_buffer'] = HoursBuffer(app, batch_size, interval=0)
+        start, samples, errors = _log_many(app, staffIDs, studentIDs, entries, threads)
+        buffer.flush()
+        report['buffered'] = _result(start, samples, errors, entries)
+        report['buffered']['flushes'] = buffer.flushes
+    finally:
+        app.extensions.pop('hours_buffer', None)
+        if previous is not None:
+            app.extensions['hours_buffer'] = previous
+        report['removed'] = _cleanup()
+    if report['per_row']['entries_per_second'] and report['buffered']['entries_per_second']:
+        report['speedup'] = round(report['buffered']['entries_per_second'] / report['per_row']['entries_per_second'], 2)
+    return report
@@ -16,4 +16,6 @@ def load_config(app, overrides):
     app.config["JWT_COOKIE_CSRF_PROTECT"] = False
     app.config['FLASK_ADMIN_SWATCH'] = 'darkly'
     for key in overrides:
-        app.config[key] = overrides[key]
\ No newline at end of file
+        app.config[key] = overrides[key]
+    if app.config.get('LOG_LEVEL'):
+        app.logger.setLevel(app.config['LOG_LEVEL'])
\ No newline at end of file
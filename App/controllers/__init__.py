@@ -1,3 +1,7 @@
 from .user import *
 from .auth import *
 from .initialize import *
+from .importer import *
+from .exporter import *
+from .analytics import *
+from .queue import *
@@ -0,0 +1,172 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from datetime import date, timedelta
+
+from App.models import Student, Staff, LoggedHours, get_milestones
+from App.database import db, read_only
+
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+
+def percentiles(ordered, count, ps=PERCENTILES):
+    """Linear-interpolated percentiles, as percentile_cont computes them, of count
+    sorted values. ordered is an array (indexed directly) or a sorted iterator,
+    walked once up to the highest rank needed."""
+    wanted = {p: (count - 1) * p / 100 for p in ps}
+    ranks = {index for rank in wanted.values() for index in (int(rank), min(int(rank) + 1, count - 1))}
+    if isinstance(ordered, array):
+        values = {index: ordered[index] for index in ranks}
+    else:
+        values, last = {}, max(ranks)
+        for index, value in enumerate(ordered):
+            if index in ranks:
+                values[index] = value
+                if index == last:
+                    break
+    return {p: values[int(rank)] + (values[min(int(rank) + 1, count - 1)] - values[int(rank)]) * (rank - int(rank))
+            for p, rank in wanted.items()}
+
+def _summary(columns):
+    # Count, mean, max and percentiles of one or more sorted arrays; several are
+    # merged lazily, so they are never copied into one
+    count = sum(len(column) for column in columns)
+    if not count:
+        return {'count': 0}
+    ordered = columns[0] if len(columns) == 1 else heapq.merge(*columns)
+    return {
+        'count': count,
+        'mean': round(sum(sum(column) for column in columns) / count, 2),
+        'max': max(column[-1] for column in columns if column),
+        'percentiles': {f'p{p}': round(value, 2) for p, value in percentiles(ordered, count).items()},
+    }
+
+def _filtered(query, start, end):
+    # Inclusive days on logDate
+    if start:
+        query = query.where(LoggedHours.logDate >= start)
+    if end:
+        query = query.where(LoggedHours.logDate < end + timedelta(days=1))
+    return query
+
+def _day(value):
+    # func.date() is a string on SQLite and a date elsewhere
+    return value if isinstance(value, date) or value is None else date.fromisoformat(value)
+
+def _student_hours(start, end):
+    # Confirmed hours per student, summed by the database into one sorted column;
+    # students without any count as zero
+    studentIDs = db.session.scalars(db.select(Student.id)).all()
+    totals = dict(db.session.execute(_filtered(
+        db.select(LoggedHours.studentID, db.func.sum(LoggedHours.hours))
+        .where(LoggedHours.isConfirmed == True).group_by(LoggedHours.studentID), start, end)).all())
+    column = array('q', sorted(totals.get(studentID) or 0 for studentID in studentIDs))
+    report = _summary([column])
+    # Buckets at the accolade milestones, e.g. 0-9, 10-24, 25-49, 50+
+    edges = [0] + [hours for hours in get_milestones().hours if hours > 0]
+    counts = [bisect_left(column, edge) for edge in edges[1:]] + [len(column)]
+    report['histogram'] = [{
+        'range': f"{low}-{high - 1}" if high is not None else f"{low}+",
+        'students': count - previous
+    } for low, high, count, previous in zip(edges, edges[1:] + [None], counts, [0] + counts)]
+    return report
+
+def _latency_query(*columns):
+    return db.select(*columns).where(
+        LoggedHours.isConfirmed == True, LoggedHours.logDate.isnot(None), LoggedHours.dateConfirmed.isnot(None)
+    )
+
+def _latency_percentile_cont(start, end):
+    # PostgreSQL computes the percentiles itself, per staff member and overall,
+    # without sending the latencies back. Imported on use like upsert_insert.
+    from sqlalchemy.dialects.postgresql import ARRAY, array as pg_array
+    hours = db.cast(db.extract('epoch', LoggedHours.dateConfirmed - LoggedHours.logDate), db.Float) / 3600
+    # One call with every fraction returns an array, which SQLAlchemy types as a scalar
+    cuts = db.func.percentile_cont(pg_array([p / 100 for p in PERCENTILES])).within_group(hours)
+    aggregates = (
+        db.func.count(), db.func.avg(hours), db.func.max(hours), db.type_coerce(cuts, ARRAY(db.Float)),
+    )
+    def summary(count, mean, largest, values):
+        if not count:
+            return {'count': 0}
+        return {
+            'count': count,
+            'mean': round(float(mean), 2),
+            'max': float(largest),
+            'percentiles': {f'p{p}': round(float(value), 2) for p, value in zip(PERCENTILES, values)},
+        }
+    overall = db.session.execute(_filtered(_latency_query(*aggregates), start, end)).one()
+    staff = db.session.execute(_filtered(
+        _latency_query(LoggedHours.staffID, *aggregates).group_by(LoggedHours.staffID), start, end)).all()
+    return summary(*overall), {staffID: summary(*row) for staffID, *row in staff}
+
+def _latency_columns(start, end, batch_size):
+    # Elsewhere the three columns are streamed in batches into one array of
+    # doubles per staff member (8 bytes an entry), each sorted once; the overall
+    # percentiles come from a single merged walk over the sorted arrays
+    query = _filtered(_latency_query(LoggedHours.staffID, LoggedHours.logDate, LoggedHours.dateConfirmed), start, end)
+    columns = {}
+    for partition in db.session.execute(query.execution_options(yield_per=batch_size)).partitions():
+        for staffID, logged, confirmed in partition:
+            columns.setdefault(staffID, array('d')).append((confirmed - logged).total_seconds() / 3600)
+    for staffID, column in columns.items():
+        columns[staffID] = array('d', sorted(column))
+    return _summary(list(columns.values())), {staffID: _summary([column]) for staffID, column in columns.items()}
+
+def _confirmation_latency(start, end, batch_size):
+    # Hours from logging to confirmation, grouped by the staff member who logged the entry
+    staffNames = dict(db.session.execute(db.select(Staff.id, Staff.staffName)).all())
+    if db.session.get_bind(mapper=LoggedHours).dialect.name == 'postgresql':
+        overall, staff = _latency_percentile_cont(start, end)
+    else:
+        overall, staff = _latency_columns(start, end, batch_size)
+    return {'overall': overall, 'staff': [
+        {'staffID': staffID, 'staffName': staffNames.get(staffID), **summary}
+        for staffID, summary in sorted(staff.items())
+    ]}
+
+def _weekly_volume(start, end):
+    # Per-day totals from the database, folded into weeks starting Monday
+    logged = db.session.execute(_filtered(
+        db.select(db.func.date(LoggedHours.logDate), db.func.count(), db.func.sum(LoggedHours.hours))
+        .group_by(db.func.date(LoggedHours.logDate)), start, end)).all()
+    confirmed = db.session.execute(_filtered(
+        db.select(db.func.date(LoggedHours.dateConfirmed), db.func.sum(LoggedHours.hours))
+        .where(LoggedHours.dateConfirmed.isnot(None))
+        .group_by(db.func.date(LoggedHours.dateConfirmed)), start, end)).all()
+    entries, weeks = 0, {}
+    for day, count, hours in logged:
+        entries += count
+        day = _day(day)
+        if day is not None:
+            bucket = weeks.setdefault(day - timedelta(days=day.weekday()), [0, 0, 0])
+            bucket[0] += count
+            bucket[1] += hours
+    for day, hours in confirmed:
+        day = _day(day)
+        weeks.setdefault(day - timedelta(days=day.weekday()), [0, 0, 0])[2] += hours
+    return entries, [{
+        'week': week.isoformat(),
+        'entries': count,
+        'loggedHours': logged,
+        'confirmedHours': confirmed
+    } for week, (count, logged, confirmed) in sorted(weeks.items())]
+
+def hours_analytics(start=None, end=None, batch_size=10000):
+    """Distribution of confirmed hours per student, per-staff confirmation latency
+    and weekly volume. Sums are grouped in the database; latency percentiles use
+    percentile_cont on PostgreSQL and sorted columnar arrays elsewhere."""
+    try:
+        with read_only():
+            entries, weekly = _weekly_volume(start, end)
+            report = {
+                'from': start.isoformat() if start else None,
+                'to': end.isoformat() if end else None,
+                'entries': entries,
+                'studentHours': _student_hours(start, end),
+                'confirmationLatencyHours': _confirmation_latency(start, end, batch_size),
+                'weeklyVolume': weekly,
+            }
+        return report, f"Analysed {entries} logged hours entries"
+    except Exception as e:
+        return None, f"Error building analytics: {str(e)}"
@@ -1,19 +1,77 @@
+import logging
+from flask import g, current_app
 from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy.orm import make_transient_to_detached
 
 from App.models import User
 from App.database import db
+from App.cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 def login(username, password):
   result = db.session.execute(db.select(User).filter_by(username=username))
   user = result.scalar_one_or_none()
   if user and user.check_password(password):
+    if db.session.is_modified(user):
+      # check_password upgraded an outdated hash
+      db.session.commit()
+      invalidate_user(user.id)
     # Store ONLY the user id as a string in JWT 'sub'
     return create_access_token(identity=str(user.id))
   return None
 
 
+def load_user(identity):
+  """Load a user at most once per request, through the optional cross-request cache"""
+  try:
+    user_id = int(identity)
+  except (TypeError, ValueError):
+    return None
+  loaded = g.setdefault('_auth_users', {})
+  if user_id in loaded:
+    return loaded[user_id]
+
+  cache = current_app.extensions.get('user_cache')
+  values = cache.get(user_id) if cache is not None else None
+  if values is not None:
+    # Rebuild a detached instance from the cached columns without a query
+    user = User.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+      setattr(user, key, value)
+    make_transient_to_detached(user)
+    user = db.session.merge(user, load=False)
+  else:
+    user = db.session.get(User, user_id)
+    if user is not None and cache is not None:
+      cache.set(user_id, {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs})
+  loaded[user_id] = user
+  return user
+
+def invalidate_user(user_id):
+  """Drop a user from the request memo and the cross-request cache after a change"""
+  g.get('_auth_users', {}).pop(user_id, None)
+  cache = current_app.extensions.get('user_cache')
+  if cache is not None:
+    cache.delete(user_id)
+
+def get_request_user():
+  """The authenticated user for this request or None, verified at most once"""
+  if '_auth_user' not in g:
+    try:
+      verify_jwt_in_request(optional=True)
+      identity = get_jwt_identity()
+      g._auth_user = load_user(identity) if identity is not None else None
+    except Exception as e:
+      logger.info("Could not verify JWT for template context: %s", e)
+      g._auth_user = None
+  return g._auth_user
+
+
 def setup_jwt(app):
   jwt = JWTManager(app)
+  ttl = app.config.get('USER_CACHE_TTL', 0)
+  app.extensions['user_cache'] = TTLCache(app.config.get('USER_CACHE_SIZE', 1024), ttl) if ttl else None
 
   # Always store a string user id in the JWT identity (sub),
   # whether a User object or a raw id is passed.
@@ -24,13 +82,8 @@ def setup_jwt(app):
 
   @jwt.user_lookup_loader
   def user_lookup_callback(_jwt_header, jwt_data):
-    identity = jwt_data["sub"]
-    # Cast back to int primary key
-    try:
-      user_id = int(identity)
-    except (TypeError, ValueError):
-      return None
-    return db.session.get(User, user_id)
+    # Cast back to int primary key inside load_user
+    return load_user(jwt_data["sub"])
 
   return jwt
 
@@ -39,14 +92,10 @@ def setup_jwt(app):
 def add_auth_context(app):
   @app.context_processor
   def inject_user():
-      try:
-          verify_jwt_in_request()
-          identity = get_jwt_identity()
-          user_id = int(identity) if identity is not None else None
-          current_user = db.session.get(User, user_id) if user_id is not None else None
-          is_authenticated = current_user is not None
-      except Exception as e:
-          print(e)
-          is_authenticated = False
-          current_user = None
-      return dict(is_authenticated=is_authenticated, current_user=current_user)
\ No newline at end of file
+      current_user = get_request_user()
+      return dict(is_authenticated=current_user is not None, current_user=current_user)
+
+  @app.teardown_request
+  def clear_request_user(exception=None):
+      g.pop('_auth_user', None)
+      g.pop('_auth_users', None)
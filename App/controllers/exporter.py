@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+
+from App.models import Student, LoggedHours, Accolade, Leaderboard, get_milestones
+from App.database import db, read_only
+
+EXPORT_FIELDS = {
+    'hours': ['logID', 'studentID', 'studentName', 'staffID', 'hours', 'description',
+              'logDate', 'isConfirmed', 'dateConfirmed'],
+    'accolades': ['accoladeID', 'studentID', 'studentName', 'milestone', 'name', 'dateAwarded'],
+    'leaderboard': ['rank', 'studentID', 'studentName', 'totalHours'],
+}
+
+
+def _hours_query(start, end, studentId):
+    query = db.select(
+        LoggedHours.logID, LoggedHours.studentID, Student.studentName, LoggedHours.staffID,
+        LoggedHours.hours, LoggedHours.description, LoggedHours.logDate,
+        LoggedHours.isConfirmed, LoggedHours.dateConfirmed
+    ).join(Student, Student.id == LoggedHours.studentID).order_by(LoggedHours.logID)
+    return _filtered(query, LoggedHours.logDate, LoggedHours.studentID, start, end, studentId)
+
+def _accolades_query(start, end, studentId):
+    query = db.select(
+        Accolade.accoladeID, Accolade.studentID, Student.studentName, Accolade.milestone,
+        Accolade.dateAwarded
+    ).join(Student, Student.id == Accolade.studentID).order_by(Accolade.accoladeID)
+    return _filtered(query, Accolade.dateAwarded, Accolade.studentID, start, end, studentId)
+
+def _leaderboard_query(window, studentId):
+    ranked = (Leaderboard.windowQuery(*Leaderboard.windowBounds(window)) if window
+              else Leaderboard.rankingQuery(use_stored=True)).subquery()
+    query = db.select(ranked.c.rank, ranked.c.id.label('studentID'), ranked.c.studentName,
+                      ranked.c.totalHours).order_by(ranked.c.rank, ranked.c.id)
+    if studentId is not None:
+        query = query.where(ranked.c.id == studentId)
+    return query
+
+def _filtered(query, dateColumn, studentColumn, start, end, studentId):
+    # Dates are inclusive days
+    if start:
+        query = query.where(dateColumn >= start)
+    if end:
+        query = query.where(dateColumn < end + timedelta(days=1))
+    if studentId is not None:
+        query = query.where(studentColumn == studentId)
+    return query
+
+def parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+def export_rows(kind, start=None, end=None, studentId=None, window=None, batch_size=1000):
+    """Yield export rows as dicts, fetched batch_size at a time from a
+    server-side cursor so memory stays flat however large the table is"""
+    if kind == 'hours':
+        query = _hours_query(start, end, studentId)
+    elif kind == 'accolades':
+        query = _accolades_query(start, end, studentId)
+    elif kind == 'leaderboard':
+        query = _leaderboard_query(window, studentId)
+    else:
+        raise ValueError(f"Unknown export {kind}")
+    milestones = get_milestones()
+    with read_only():
+        result = db.session.execute(query.execution_options(yield_per=batch_size))
+        for row in result:
+            item = row._asdict()
+            if kind == 'accolades':
+                item['name'] = milestones.name(item['milestone'])
+            yield item
+
+def _value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def render_rows(kind, rows, format='csv'):
+    """Serialize rows to CSV or JSONL text chunks, one chunk per row"""
+    fields = EXPORT_FIELDS[kind]
+    if format == 'jsonl':
+        for row in rows:
+            yield json.dumps({field: _value(row.get(field)) for field in fields}) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([_value(row.get(field)) for field in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(kind, format='csv', gzip=False, **filters):
+    """Rendered export as str chunks, or bytes when gzip is set. Bad arguments
+    raise ValueError here rather than part way through the stream."""
+    if kind not in EXPORT_FIELDS:
+        raise ValueError(f"Unknown export {kind}")
+    if format not in ('csv', 'jsonl'):
+        raise ValueError(f"Unknown format {format}")
+    if filters.get('window'):
+        Leaderboard.windowBounds(filters['window'])
+    chunks = render_rows(kind, export_rows(kind, **filters), format)
+    return gzip_chunks(chunks) if gzip else chunks
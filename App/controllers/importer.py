@@ -0,0 +1,171 @@
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+from App.models import User, Student, Staff, LoggedHours, HoursLedger, Leaderboard, hash_passwords
+from App.database import db
+from App.response_cache import invalidate_responses
+
+
+def read_rows(path, format=None):
+    """Lazily yield (line number, row dict) pairs from a CSV or JSONL file"""
+    format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as file:
+        if format == 'csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(file, 1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError:
+                    row = None
+                yield line, row
+
+def _chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _validate(chunk, required, errors):
+    valid = []
+    for line, row in chunk:
+        if not isinstance(row, dict):
+            errors.append((line, "Malformed row"))
+            continue
+        missing = [field for field in required if row.get(field) is None or not str(row[field]).strip()]
+        if missing:
+            errors.append((line, f"Missing {', '.join(missing)}"))
+            continue
+        valid.append((line, row))
+    return valid
+
+def _insert(model, pending, errors, return_defaults=False, on_insert=None):
+    """Bulk insert (line, mapping) pairs, isolating bad rows if the batch fails.
+    on_insert(mappings) runs in the same transaction, before each commit."""
+    if not pending:
+        return 0
+    try:
+        mappings = [m for _, m in pending]
+        db.session.bulk_insert_mappings(model, mappings, return_defaults=return_defaults)
+        if on_insert:
+            on_insert(mappings)
+        db.session.commit()
+        return len(pending)
+    except Exception:
+        db.session.rollback()
+    created = 0
+    for line, mapping in pending:
+        try:
+            db.session.bulk_insert_mappings(model, [mapping], return_defaults=return_defaults)
+            if on_insert:
+                on_insert([mapping])
+            db.session.commit()
+            created += 1
+        except Exception as e:
+            db.session.rollback()
+            errors.append((line, f"Cannot insert row: {str(e.__cause__ or e)}"))
+    return created
+
+def _import_users(model, user_type, rows, nameField, emailField, chunk_size):
+    created, errors = 0, []
+    for chunk in _chunked(rows, chunk_size):
+        valid = _validate(chunk, ('username', 'password', nameField), errors)
+        usernames = [str(row['username']).strip() for _, row in valid]
+        # One set query per chunk instead of a lookup per username
+        taken = set(db.session.scalars(db.select(User.username).where(User.username.in_(usernames))))
+        pending = []
+        for line, row in valid:
+            username = str(row['username']).strip()
+            if len(username) > 20:
+                errors.append((line, "Username longer than 20 characters"))
+            elif username in taken:
+                errors.append((line, f"Username {username} already exists"))
+            else:
+                taken.add(username)
+                pending.append((line, {
+                    'username': username,
+                    'password': str(row['password']),
+                    'user_type': user_type,
+                    nameField: str(row[nameField]).strip(),
+                    emailField: str(row.get(emailField) or '').strip() or None
+                }))
+        hashes = hash_passwords(mapping['password'] for _, mapping in pending)
+        for (_, mapping), pwhash in zip(pending, hashes):
+            mapping['password'] = pwhash
+        # Joined inheritance needs the generated user ids for the child table
+        created += _insert(model, pending, errors, return_defaults=True)
+    return {'created': created, 'errors': errors}
+
+def import_students(rows, chunk_size=500):
+    try:
+        report = _import_users(Student, 'student', rows, 'studentName', 'studentEmail', chunk_size)
+        Leaderboard.invalidate()
+        invalidate_responses()
+        return report, f"Imported {report['created']} students with {len(report['errors'])} error(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error importing students: {str(e)}"
+
+def import_staff(rows, chunk_size=500):
+    try:
+        report = _import_users(Staff, 'staff', rows, 'staffName', 'staffEmail', chunk_size)
+        invalidate_responses()
+        return report, f"Imported {report['created']} staff with {len(report['errors'])} error(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error importing staff: {str(e)}"
+
+def _ledger_logged(mappings):
+    # Stamped with the import time, not logDate, so the ledger stays in recording order
+    HoursLedger.append([(m['studentID'], m['logID'], 'logged', m['hours'], None) for m in mappings])
+
+def import_hours(rows, chunk_size=500):
+    """Import unconfirmed logged hours keyed by staff and student usernames"""
+    try:
+        created, errors = 0, []
+        for chunk in _chunked(rows, chunk_size):
+            valid = _validate(chunk, ('staff', 'student', 'hours'), errors)
+            staff_ids = dict(db.session.execute(
+                db.select(Staff.username, Staff.id).where(Staff.username.in_({r['staff'] for _, r in valid}))
+            ).all())
+            student_ids = dict(db.session.execute(
+                db.select(Student.username, Student.id).where(Student.username.in_({r['student'] for _, r in valid}))
+            ).all())
+            pending = []
+            for line, row in valid:
+                try:
+                    hours = int(row['hours'])
+                    logDate = datetime.fromisoformat(row['logDate']) if row.get('logDate') else datetime.utcnow()
+                except (TypeError, ValueError):
+                    errors.append((line, "Invalid hours or logDate"))
+                    continue
+                if row['staff'] not in staff_ids:
+                    errors.append((line, f"Staff {row['staff']} not found"))
+                elif row['student'] not in student_ids:
+                    errors.append((line, f"Student {row['student']} not found"))
+                elif hours <= 0:
+                    errors.append((line, "Hours must be greater than zero"))
+                else:
+                    pending.append((line, {
+                        'staffID': staff_ids[row['staff']],
+                        'studentID': student_ids[row['student']],
+                        'hours': hours,
+                        'description': row.get('description'),
+                        'logDate': logDate,
+                        'isConfirmed': False
+                    }))
+            created += _insert(LoggedHours, pending, errors, return_defaults=True, on_insert=_ledger_logged)
+        invalidate_responses()
+        report = {'created': created, 'errors': errors}
+        return report, f"Imported {created} logged hours entries with {len(errors)} error(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error importing hours: {str(e)}"
@@ -0,0 +1,41 @@
+from flask import current_app
+
+from App.models import Staff, ConfirmRequest
+from App.database import db
+from App.response_cache import invalidate_responses
+
+
+def claim_confirm_requests(staffId, limit=50):
+    """Claim a batch of pending confirmation requests for a staff member to review"""
+    try:
+        if not db.session.get(Staff, staffId):
+            return None, "Staff not found"
+        if limit <= 0:
+            return None, "Batch size must be greater than zero"
+        timeout = current_app.config.get('CONFIRM_CLAIM_TIMEOUT', 300)
+        token, requests = ConfirmRequest.claimBatch(limit, timeout)
+        return {'token': token, 'requests': requests}, f"Claimed {len(requests)} confirmation request(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error claiming confirmation requests: {str(e)}"
+
+def process_confirm_requests(staffId, token, approveIds=(), rejectIds=()):
+    """Approve and reject claimed requests in one transaction, releasing the rest"""
+    try:
+        staff = db.session.get(Staff, staffId)
+        if not staff:
+            return None, "Staff not found"
+        if set(approveIds) & set(rejectIds):
+            return None, "A request cannot be both approved and rejected"
+        result = staff.processRequests(token, list(approveIds), list(rejectIds))
+        invalidate_responses()
+        return result, f"Approved {len(result['approved'])} and rejected {len(result['rejected'])} request(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error processing confirmation requests: {str(e)}"
+
+def confirm_queue_stats():
+    try:
+        return ConfirmRequest.queueStats(), "Retrieved confirmation queue stats"
+    except Exception as e:
+        return None, f"Error reading queue stats: {str(e)}"
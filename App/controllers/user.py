@@ -1,6 +1,12 @@
-from App.models import User, Student, Staff, LoggedHours, Accolade, ConfirmRequest, Leaderboard
-from App.database import db
-from datetime import datetime
+from App.models import User, Student, Staff, LoggedHours, Accolade, ConfirmRequest, Leaderboard, DailyHours, HoursLedger, IdempotencyKey
+from App.database import db, read_only
+import os
+from flask import current_app
+from datetime import datetime, date, time
+from App.response_cache import invalidate_responses
+from App.write_buffer import hours_buffer, replay_dead_letters
+from App.idempotency import idempotent
+from .auth import invalidate_user
 
 def create_user(username, password, user_type):
     if get_user_by_username(username):
@@ -8,6 +14,7 @@ def create_user(username, password, user_type):
     newuser = User(username=username, password=password, user_type=user_type)
     db.session.add(newuser)
     db.session.commit()
+    invalidate_responses()
     return newuser
 
 def get_user_by_username(username):
@@ -19,17 +26,79 @@ def get_user(id):
 def get_all_users():
     return User.query.all()
 
+@read_only()
 def get_all_users_json():
     users = get_all_users()
     if not users:
         return []
     return [user.get_json() for user in users]
 
+@read_only()
+def get_users_page(limit=100, after_id=None):
+    """Keyset-paginated users ordered by id"""
+    return [user.get_json() for user in db.session.scalars(users_page_query(limit, after_id))]
+
+def users_page_query(limit=100, after_id=None):
+    """The users page query, shared with the async API"""
+    query = db.select(User).order_by(User.id).limit(limit)
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    return query
+
+def int_arg(args, name, default=None):
+    """An integer query argument, or default when it is missing or not an
+    integer, like request.args.get(name, default, type=int)"""
+    try:
+        return int(args[name]) if args.get(name) is not None else default
+    except ValueError:
+        return default
+
+def page_args(args):
+    """(limit, after_id) for a keyset-paginated listing, with limit clamped to
+    1..API_MAX_PAGE_SIZE; values that are not integers fall back to the defaults"""
+    config = current_app.config
+    limit = int_arg(args, 'limit', config.get('API_PAGE_SIZE', 100))
+    limit = max(1, min(limit, config.get('API_MAX_PAGE_SIZE', 1000)))
+    return limit, int_arg(args, 'after_id')
+
+def leaderboard_top(args):
+    """The leaderboard's top argument, capped at API_MAX_PAGE_SIZE like a page
+    limit; ValueError when it is not a positive integer"""
+    top = args.get('top')
+    if top is None:
+        return None
+    try:
+        top = int(top)
+    except ValueError:
+        top = 0
+    if top < 1:
+        raise ValueError("top must be a positive integer")
+    return min(top, current_app.config.get('API_MAX_PAGE_SIZE', 1000))
+
+def leaderboard_json(rows):
+    return [{
+        'rank': row.rank,
+        'studentID': row.id,
+        'studentName': row.studentName,
+        'totalHours': row.totalHours
+    } for row in rows]
+
+def iter_pages(fetch_page, batch_size=500, after_id=None):
+    """Yield every item of a keyset-paginated listing, one page in memory at a time"""
+    while True:
+        items = fetch_page(batch_size, after_id)
+        yield from items
+        if len(items) < batch_size:
+            return
+        after_id = items[-1]['id']
+
 def update_user(id, username):
     user = get_user(id)
     if user:
         user.username = username
         db.session.commit()
+        invalidate_user(user.id)
+        invalidate_responses()
         return user
     return None
 
@@ -49,6 +118,8 @@ class StudentController:
             )
             db.session.add(student)
             db.session.commit()
+            Leaderboard.updateStudent(student)
+            invalidate_responses()
             return student, "Successfully created student account"
         except Exception as e:
             db.session.rollback()
@@ -67,13 +138,24 @@ class StudentController:
         return Student.query.all()
 
     @staticmethod
-    def get_students_json():
-        students = StudentController.get_all_students()
+    @read_only()
+    def get_students_json(profile='detail'):
+        students = db.session.scalars(db.select(Student).options(*Student.loadOptions(profile))).all()
         if not students:
             return []
-        return [student.get_json() for student in students]
+        return [student.get_json(profile) for student in students]
 
     @staticmethod
+    @read_only()
+    def get_students_page(limit=100, after_id=None, profile='detail'):
+        """Keyset-paginated students serialized with the given profile"""
+        query = db.select(Student).options(*Student.loadOptions(profile)).order_by(Student.id).limit(limit)
+        if after_id is not None:
+            query = query.where(Student.id > after_id)
+        return [student.get_json(profile) for student in db.session.scalars(query)]
+
+    @staticmethod
+    @idempotent('request_confirmation', ConfirmRequest)
     def request_confirmation(studentId, loggedHoursId):
         try:
             student = StudentController.get_student(studentId)
@@ -94,20 +176,148 @@ class StudentController:
             return None, f"Error requesting confirmation: {str(e)}"
 
     @staticmethod
+    @read_only()
     def view_accolades(studentId):
         student = StudentController.get_student(studentId)
         if student:
             return student.viewAccolades(), "Retrieved student's accolades successfully"
         return [], "Student not found"
 
-def view_leaderboard():
-    """View current leaderboard"""
+    @staticmethod
+    @read_only()
+    def view_ledger(studentId, limit=50, before=None):
+        """Newest-first page of a student's ledger entries before the seq cursor"""
+        if not StudentController.get_student(studentId):
+            return None, "Student not found"
+        return HoursLedger.history(studentId, limit, before), "Retrieved ledger successfully"
+
+    @staticmethod
+    @read_only()
+    def view_balance(studentId, asOf=None):
+        """Confirmed and pending hours now, or as of a datetime, from the ledger's running totals"""
+        if not StudentController.get_student(studentId):
+            return None, "Student not found"
+        entry = HoursLedger.latest(studentId, asOf)
+        balance = {
+            'studentID': studentId,
+            'asOf': (asOf or datetime.utcnow()).isoformat(),
+            'confirmedHours': entry.confirmedBalance if entry else 0,
+            'pendingHours': entry.pendingBalance if entry else 0,
+            'seq': entry.seq if entry else 0
+        }
+        return balance, "Retrieved balance successfully"
+
+def parse_as_of(value):
+    """ISO datetime for a point-in-time query; a bare date means the end of that day"""
+    if not value:
+        return None
+    if len(value) == 10:
+        return datetime.combine(date.fromisoformat(value), time.max)
+    return datetime.fromisoformat(value)
+
+@read_only()
+def view_leaderboard(n=None, window=None):
+    """View current leaderboard, all-time or for a week/month/term window"""
     try:
         leaderboard = Leaderboard()
-        rankings = leaderboard.generateRankings()
+        if window:
+            leaderboard.generateWindowRankings(window)
+        rankings = leaderboard.topAchiever(n)
         return rankings, "Retrieved leaderboard successfully"
     except Exception as e:
-        return [], f"Error generating leaderboard: {str(e)}"
+        return None, f"Error generating leaderboard: {str(e)}"
+
+@read_only()
+def view_student_rank(studentId):
+    """View a single student's leaderboard position"""
+    try:
+        rank = Leaderboard().rankOf(studentId)
+        if rank:
+            return rank, "Retrieved student rank successfully"
+        return None, "Student not found"
+    except Exception as e:
+        return None, f"Error retrieving rank: {str(e)}"
+
+def reconcile_total_hours(fix=True):
+    """Recompute every student's total with one grouped query and report drift"""
+    try:
+        confirmed = db.func.coalesce(db.func.sum(LoggedHours.hours), 0)
+        stored = db.func.coalesce(Student.totalHours, 0)
+        rows = db.session.execute(
+            db.select(Student.id, Student.studentName, stored.label('storedHours'),
+                      confirmed.label('confirmedHours'))
+            .outerjoin(LoggedHours, db.and_(LoggedHours.studentID == Student.id,
+                                            LoggedHours.isConfirmed == True))
+            .group_by(Student.id, Student.studentName, Student.totalHours)
+            .having(stored != confirmed)
+        ).all()
+        if fix and rows:
+            db.session.execute(
+                db.update(Student),
+                [{'id': row.id, 'totalHours': row.confirmedHours} for row in rows]
+            )
+            db.session.commit()
+            Leaderboard.invalidate()
+            invalidate_responses()
+        return rows, f"Found {len(rows)} student(s) with drifted totals"
+    except Exception as e:
+        db.session.rollback()
+        return [], f"Error reconciling hours: {str(e)}"
+
+def recompute_accolades():
+    """Backfill accolades for every student from their stored totals"""
+    try:
+        awarded = Accolade.recomputeAll()
+        db.session.commit()
+        invalidate_responses()
+        return awarded, f"Awarded {awarded} missing accolade(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error recomputing accolades: {str(e)}"
+
+def rebuild_ledger():
+    """Rebuild every student's hours ledger from loggedHours"""
+    try:
+        entries = HoursLedger.rebuild()
+        db.session.commit()
+        invalidate_responses()
+        return entries, f"Rebuilt {entries} ledger entries"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error rebuilding ledger: {str(e)}"
+
+def replay_buffered_hours(path=None):
+    """Retry logged hours the write-behind buffer dead-lettered"""
+    try:
+        buffer = hours_buffer()
+        path = path or (buffer.dead_letter if buffer else current_app.config.get('HOURS_DEAD_LETTER')
+                        or os.path.join(current_app.instance_path, 'hours-dead-letter.jsonl'))
+        report = replay_dead_letters(path)
+        return report, f"Replayed {report['written']} entries, {report['failed']} still failing"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error replaying buffered hours: {str(e)}"
+
+def purge_idempotency_keys():
+    """Delete expired idempotency keys"""
+    try:
+        purged = IdempotencyKey.purgeExpired()
+        db.session.commit()
+        return purged, f"Purged {purged} expired idempotency key(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error purging idempotency keys: {str(e)}"
+
+def rebuild_rollups():
+    """Backfill the daily confirmed-hours rollup from loggedHours"""
+    try:
+        buckets = DailyHours.rebuild()
+        db.session.commit()
+        invalidate_responses()
+        return buckets, f"Rebuilt {buckets} daily hour bucket(s)"
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Error rebuilding rollups: {str(e)}"
 
 class StaffController:
     @staticmethod
@@ -125,6 +335,7 @@ class StaffController:
             )
             db.session.add(staff)
             db.session.commit()
+            invalidate_responses()
             return staff, "Successfully created staff account"
         except Exception as e:
             db.session.rollback()
@@ -143,14 +354,27 @@ class StaffController:
         return Staff.query.all()
 
     @staticmethod
-    def get_staff_json():
-        staff_members = StaffController.get_all_staff()
+    @read_only()
+    def get_staff_json(profile='detail'):
+        staff_members = db.session.scalars(db.select(Staff).options(*Staff.loadOptions(profile))).all()
         if not staff_members:
             return []
-        return [staff.get_json() for staff in staff_members]
+        return [staff.get_json(profile) for staff in staff_members]
 
     @staticmethod
-    def log_hours(staffId, studentId, hours, description):
+    @read_only()
+    def get_staff_page(limit=100, after_id=None, profile='detail'):
+        """Keyset-paginated staff serialized with the given profile"""
+        query = db.select(Staff).options(*Staff.loadOptions(profile)).order_by(Staff.id).limit(limit)
+        if after_id is not None:
+            query = query.where(Staff.id > after_id)
+        return [staff.get_json(profile) for staff in db.session.scalars(query)]
+
+    @staticmethod
+    @idempotent('log_hours', LoggedHours)
+    def log_hours(staffId, studentId, hours, description, durable=True):
+        """Log hours for a student. With HOURS_WRITE_BUFFER on, a non-durable call only
+        queues the entry (its logID is None until the buffer flushes)."""
         try:
             staff = StaffController.get_staff(staffId)
             student = StudentController.get_student(studentId)
@@ -162,12 +386,20 @@ class StaffController:
             if hours <= 0:
                 return None, "Hours must be greater than zero"
             
+            buffer = hours_buffer()
+            if buffer is not None:
+                log_entry = buffer.log(staff.id, student.id, hours, description, durable)
+                if log_entry.logID is None:
+                    return log_entry, "Queued hours for logging"
+                return log_entry, "Logged hours successfully"
             log_entry = staff.logHours(student, hours, description)
+            invalidate_responses()
             return log_entry, "Logged hours successfully"
         except Exception as e:
             return None, f"Error logging hours: {str(e)}"
 
     @staticmethod
+    @idempotent('confirm_hours', LoggedHours)
     def confirm_hours(staffId, loggedHoursId):
         try:
             staff = StaffController.get_staff(staffId)
@@ -182,7 +414,33 @@ class StaffController:
             
             confirmed_log = staff.confirmHours(loggedHours)
             if confirmed_log:
+                invalidate_responses()
                 return confirmed_log, "Hours confirmed successfully"
             return None, "Failed to confirm hours"
         except Exception as e:
-            return None, f"Error confirming hours: {str(e)}"
\ No newline at end of file
+            db.session.rollback()
+            return None, f"Error confirming hours: {str(e)}"
+    @staticmethod
+    @idempotent('confirm_hours_bulk')
+    def confirm_hours_bulk(staffId, logIds, chunk_size=500):
+        requested, confirmed = set(logIds), []
+        try:
+            staff = StaffController.get_staff(staffId)
+            if not staff:
+                return None, "Staff not found"
+            if chunk_size <= 0:
+                return None, "Chunk size must be greater than zero"
+
+            def committed(logIDs):
+                # Earlier chunks stay committed if a later one fails
+                confirmed.extend(logIDs)
+                invalidate_responses()
+            staff.confirmHoursBulk(requested, chunk_size, on_chunk=committed)
+            result = {
+                'confirmed': sorted(confirmed),
+                'skipped': sorted(requested.difference(confirmed))
+            }
+            return result, f"Confirmed {len(confirmed)} of {len(requested)} logged hours entries"
+        except Exception as e:
+            db.session.rollback()
+            return None, f"Error confirming hours after confirming {len(confirmed)} of {len(requested)} entries: {str(e)}"
@@ -1,14 +1,160 @@
+import os
+from contextlib import contextmanager
+from flask import current_app, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 
+READ_YOUR_WRITES_HEADER = 'X-Read-Your-Writes'
+# Set on the WSGI environ once a request has committed a write
+WROTE_ENVIRON_KEY = 'app.session_wrote'
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):
+    """Session that sends reads made inside read_only() to the replica engine.
+    Flushes and DML always use the primary, and once this session has written
+    its reads stay on the primary for the rest of the transaction, or of the
+    request when there is one, so a request sees its own writes. The session
+    can outlive a request (e.g. under the app context create_app pushes), so
+    the flag is cleared whenever a transaction ends."""
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._read_only = 0
+        self._primary_only = 0
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self._wrote = True
+            elif self._read_only and self._use_replica():
+                engine = current_app.extensions.get('replica_engine')
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self):
+        if self._wrote or self._primary_only:
+            return False
+        if not has_request_context():
+            return True
+        return not (request.environ.get(WROTE_ENVIRON_KEY) or request.headers.get(READ_YOUR_WRITES_HEADER))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(session):
+    if session._wrote and has_request_context():
+        request.environ[WROTE_ENVIRON_KEY] = True
+    session._wrote = False
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(session):
+    session._wrote = False
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+@contextmanager
+def read_only():
+    """Route the reads made inside this block (or decorated call) to the replica"""
+    session = db.session()
+    session._read_only += 1
+    try:
+        yield session
+    finally:
+        session._read_only -= 1
+
+@contextmanager
+def use_primary():
+    """Keep reads on the primary even inside read_only(), e.g. right after a write"""
+    session = db.session()
+    session._primary_only += 1
+    try:
+        yield session
+    finally:
+        session._primary_only -= 1
+
+# Engine defaults per backend, overridable with the DB_* config keys and
+# any explicit SQLALCHEMY_ENGINE_OPTIONS
+ENGINE_PROFILES = {
+    'postgresql': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    },
+    'sqlite': {},
+}
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 268435456,
+}
+
+def engine_profile(uri, config):
+    """Pick the engine profile for a database URI and build its engine options"""
+    name = config.get('DB_ENGINE_PROFILE', 'auto')
+    if name == 'auto':
+        name = make_url(uri).get_backend_name()
+    options = dict(ENGINE_PROFILES.get(name, {}))
+    if name == 'postgresql':
+        for key, option in (('DB_POOL_SIZE', 'pool_size'), ('DB_MAX_OVERFLOW', 'max_overflow'),
+                            ('DB_POOL_TIMEOUT', 'pool_timeout'), ('DB_POOL_RECYCLE', 'pool_recycle'),
+                            ('DB_POOL_PRE_PING', 'pool_pre_ping')):
+            if key in config:
+                options[option] = config[key]
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return name, options
+
+def sqlite_pragmas(app):
+    return {**SQLITE_PRAGMAS, **(app.config.get('SQLITE_PRAGMAS') or {})}
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the pragmas on every new connection of a (sync or async) SQLite engine"""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+    event.listen(getattr(engine, 'sync_engine', engine), 'connect', set_pragmas)
 
 def get_migrate(app):
-    return Migrate(app, db)
+    from flask_migrate import Migrate
+    return Migrate(app, db, render_as_batch=True)
 
 def create_db():
     db.create_all()
-    
+
+def resolve_url(app, uri):
+    """Database URL with relative SQLite paths under the instance folder, as Flask-SQLAlchemy does"""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:' \
+            and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
 def init_db(app):
-    db.init_app(app)
\ No newline at end of file
+    name, options = engine_profile(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    db.init_app(app)
+    details = ', '.join(f"{key}={value}" for key, value in sorted(options.items()))
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        # Kept out of SQLALCHEMY_BINDS so create_all and migrations only see the primary
+        app.extensions['replica_engine'] = create_engine(resolve_url(app, replica_uri), **options)
+    with app.app_context():
+        engines = list(db.engines.values()) + [app.extensions.get('replica_engine')]
+    if name == 'sqlite':
+        pragmas = sqlite_pragmas(app)
+        for engine in engines:
+            if engine is not None and engine.dialect.name == 'sqlite':
+                apply_sqlite_pragmas(engine, pragmas)
+        details = ', '.join(f"{key}={value}" for key, value in pragmas.items())
+    app.logger.info("Database engine profile %s (%s)", name, details or 'defaults')
+    if replica_uri:
+        app.logger.info("Read-only paths use the replica at %s",
+                        app.extensions['replica_engine'].url.render_as_string(hide_password=True))
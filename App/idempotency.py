@@ -0,0 +1,92 @@
+import hashlib
+import json
+from functools import wraps
+from flask import current_app
+
+from App.cache import TTLCache
+from App.database import db
+from App.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+KEY_IN_PROGRESS = "A request with this idempotency key is still in progress"
+KEY_REUSED = "Idempotency key was already used with different arguments"
+
+
+def _digest(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode()).hexdigest()
+
+def _cache():
+    return current_app.extensions.get('idempotency_cache')
+
+def _replay(stored, model):
+    fingerprint, resultID, result, message = stored
+    if model is not None:
+        return db.session.get(model, resultID), message
+    return result, message
+
+def _release(keyHash):
+    db.session.rollback()
+    db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.keyHash == keyHash))
+    db.session.commit()
+
+def idempotent(scope, model=None):
+    """Let a controller take an idempotencyKey. The first call under a key runs and
+    its outcome is stored (model results by primary key, others as JSON); retries
+    with the same key and arguments get that outcome back without writing again.
+    Failed calls (None result) release the key so the client can retry."""
+    def decorator(controller):
+        @wraps(controller)
+        def wrapper(actorId, *args, idempotencyKey=None, **kwargs):
+            if not idempotencyKey:
+                return controller(actorId, *args, **kwargs)
+            keyHash = _digest(scope, actorId, idempotencyKey)
+            fingerprint = _digest(args, kwargs)
+            cache = _cache()
+            stored = cache.get(keyHash) if cache is not None else None
+            ttl = current_app.config.get('IDEMPOTENCY_TTL', 86400)
+            lease = current_app.config.get('IDEMPOTENCY_LEASE', 30)
+            if stored is None and not IdempotencyKey.claim(keyHash, fingerprint, ttl, lease):
+                row = IdempotencyKey.lookup(keyHash)
+                if row is None or row.message is None:
+                    return None, KEY_IN_PROGRESS
+                stored = (row.fingerprint, row.resultID, row.result, row.message)
+                if cache is not None:
+                    cache.set(keyHash, stored)
+            if stored is not None:
+                if stored[0] != fingerprint:
+                    return None, KEY_REUSED
+                return _replay(stored, model)
+
+            try:
+                result, message = controller(actorId, *args, **kwargs)
+            except Exception:
+                _release(keyHash)
+                raise
+            if result is None:
+                _release(keyHash)
+                return result, message
+            if model is not None:
+                resultID, data = getattr(result, db.inspect(model).primary_key[0].key), None
+                if resultID is None:
+                    # Not written yet (e.g. a queued log), so there is nothing to replay
+                    _release(keyHash)
+                    return result, message
+            else:
+                resultID, data = None, result
+            db.session.execute(db.update(IdempotencyKey).where(IdempotencyKey.keyHash == keyHash)
+                               .values(message=message, resultID=resultID, result=data))
+            db.session.commit()
+            if cache is not None:
+                cache.set(keyHash, (fingerprint, resultID, data, message))
+            return result, message
+        return wrapper
+    return decorator
+
+def idempotency_status(message):
+    """HTTP status for a failed controller call: 409 for idempotency conflicts"""
+    return 409 if message in (KEY_IN_PROGRESS, KEY_REUSED) else 400
+
+def setup_idempotency(app):
+    # Per-worker front cache of finished keys, so most retries skip the database
+    ttl = min(app.config.get('IDEMPOTENCY_CACHE_TTL', 300), app.config.get('IDEMPOTENCY_TTL', 86400))
+    app.extensions['idempotency_cache'] = TTLCache(app.config.get('IDEMPOTENCY_CACHE_SIZE', 1024), ttl)
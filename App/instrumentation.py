@@ -0,0 +1,199 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from threading import Lock
+from flask import Blueprint, Response, current_app, g, request
+from sqlalchemy import event
+
+from App.database import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+metrics_views = Blueprint('metrics_views', __name__)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """Per-process request and SQL metrics, rendered in Prometheus text format"""
+    def __init__(self):
+        self._lock = Lock()
+        self.latency = {}
+        self.queries = {}
+        self.requests = Counter()
+        self.sql_statements = Counter()
+        self.sql_seconds = Counter()
+        self.n_plus_one = Counter()
+
+    def record(self, endpoint, method, status, seconds, statements, sql_seconds, repeated):
+        key = (endpoint, method)
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(statements)
+            self.requests[(endpoint, method, str(status))] += 1
+            self.sql_statements[key] += statements
+            self.sql_seconds[key] += sql_seconds
+            if repeated:
+                self.n_plus_one[key] += 1
+
+    def render(self, gauges=()):
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'http_request_duration_seconds',
+                                    'Request latency by endpoint', self.latency)
+            self._render_histograms(lines, 'http_request_sql_statements',
+                                    'SQL statements per request by endpoint', self.queries)
+            self._render_counter(lines, 'http_requests_total', 'Requests by endpoint and status',
+                                 self.requests, ('endpoint', 'method', 'status'))
+            self._render_counter(lines, 'sql_statements_total', 'SQL statements executed by endpoint',
+                                 self.sql_statements, ('endpoint', 'method'))
+            self._render_counter(lines, 'sql_duration_seconds_total', 'Time spent in SQL by endpoint',
+                                 self.sql_seconds, ('endpoint', 'method'))
+            self._render_counter(lines, 'sql_n_plus_one_total', 'Requests that repeated one statement shape',
+                                 self.n_plus_one, ('endpoint', 'method'))
+        for name, help_text, samples in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            lines += [f'{name}{_labels(labels)} {value}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, histograms):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (endpoint, method), histogram in sorted(histograms.items()):
+            labels = {'endpoint': endpoint, 'method': method}
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{_labels({**labels, "le": bound})} {count}')
+            lines.append(f'{name}_bucket{_labels({**labels, "le": "+Inf"})} {histogram.count}')
+            lines.append(f'{name}_sum{_labels(labels)} {histogram.sum}')
+            lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+
+    @staticmethod
+    def _render_counter(lines, name, help_text, counter, label_names):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for key, value in sorted(counter.items()):
+            lines.append(f'{name}{_labels(dict(zip(label_names, key)))} {value}')
+
+
+def _labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,?)+\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACE = re.compile(r'\s+')
+
+def statement_shape(statement):
+    """Normalize a statement so repeats with different values compare equal"""
+    shape = _LITERAL.sub('?', statement)
+    shape = _IN_LIST.sub('(?)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+# The current request's SQL stats. A context variable rather than g, so the
+# async API's handlers (one task per request, no request context) count too
+_request_stats = ContextVar('request_sql_stats', default=None)
+
+# The start time rides on the statement's execution context, which is dropped
+# with the statement, so one that raises leaves nothing behind on the connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._instrumentation_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrumentation_start', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _request_stats.get()
+    if stats is not None:
+        stats['count'] += 1
+        stats['seconds'] += elapsed
+        stats['shapes'][statement_shape(statement)] += 1
+
+def instrument_engine(engine):
+    """Count and time the statements run on engine"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+def begin_request_stats():
+    """Start counting SQL for the current request"""
+    stats = {'count': 0, 'seconds': 0.0, 'shapes': Counter()}
+    _request_stats.set(stats)
+    return stats
+
+def record_request(endpoint, method, status, started, stats):
+    """Record a finished request's latency and SQL stats, and warn about repeated statements"""
+    _request_stats.set(None)
+    threshold = current_app.config.get('INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 10)
+    repeated = [(shape, n) for shape, n in stats['shapes'].items() if n >= threshold]
+    for shape, n in repeated:
+        logger.warning("Possible N+1 in %s: statement ran %d times: %s", endpoint, n, shape[:200])
+    current_app.extensions['metrics'].record(
+        endpoint, method, status, time.perf_counter() - started,
+        stats['count'], stats['seconds'], bool(repeated))
+
+def _start_request():
+    g._request_start = time.perf_counter()
+    g._sql_stats = begin_request_stats()
+
+def _finish_request(response):
+    stats = g.pop('_sql_stats', None)
+    started = g.pop('_request_start', None)
+    if stats is None or started is None:
+        return response
+    record_request(request.endpoint or 'unmatched', request.method, response.status_code, started, stats)
+    if current_app.config.get('INSTRUMENTATION_DEBUG_HEADER'):
+        response.headers['X-Query-Count'] = str(stats['count'])
+        response.headers['X-Query-Time-Ms'] = f"{stats['seconds'] * 1000:.2f}"
+    return response
+
+def _end_request(exc):
+    # A request that raised never reached _finish_request
+    _request_stats.set(None)
+
+
+@metrics_views.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    from App.models import ConfirmRequest
+    gauges = []
+    try:
+        depth = ConfirmRequest.queueStats()['depth']
+        gauges.append(('confirm_queue_depth', 'Confirmation requests by status',
+                       [({'status': status}, count) for status, count in depth.items()]))
+    except Exception as e:
+        logger.warning("Could not read confirmation queue depth: %s", e)
+    body = current_app.extensions['metrics'].render(gauges)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def setup_instrumentation(app):
+    """Hook request timing and SQL statement counting into the app"""
+    app.extensions['metrics'] = Metrics()
+    with app.app_context():
+        engines = list(db.engines.values()) + [app.extensions.get('replica_engine')]
+    for engine in engines:
+        if engine is not None:
+            instrument_engine(engine)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    app.register_blueprint(metrics_views)
@@ -1,12 +1,11 @@
-import os
 from flask import Flask, render_template
-from flask_uploads import DOCUMENTS, IMAGES, TEXT, UploadSet, configure_uploads
-from flask_cors import CORS
-from werkzeug.utils import secure_filename
-from werkzeug.datastructures import  FileStorage
 
 from App.database import init_db
 from App.config import load_config
+from App.models import load_milestones
+from App.response_cache import setup_response_cache
+from App.write_buffer import setup_hours_buffer
+from App.idempotency import setup_idempotency
 
 
 from App.controllers import (
@@ -14,7 +13,7 @@ from App.controllers import (
     add_auth_context
 )
 
-from App.views import views, setup_admin
+from App.views import views
 
 
 
@@ -22,20 +21,38 @@ def add_views(app):
     for view in views:
         app.register_blueprint(view)
 
-def create_app(overrides={}):
+def setup_uploads(app):
+    from flask_uploads import DOCUMENTS, IMAGES, TEXT, UploadSet, configure_uploads
+    photos = UploadSet('photos', TEXT + DOCUMENTS + IMAGES)
+    configure_uploads(app, photos)
+
+def create_app(overrides={}, profile='web'):
+    """Build the app. The 'cli' profile skips what one-off commands never use
+    (CORS, uploads and the admin site); APP_PROFILE in the config wins."""
     app = Flask(__name__, static_url_path='/static')
     load_config(app, overrides)
-    CORS(app)
+    profile = app.config.get('APP_PROFILE', profile)
+    load_milestones(app)
+    if profile == 'web':
+        from flask_cors import CORS
+        CORS(app)
+        setup_uploads(app)
     add_auth_context(app)
-    photos = UploadSet('photos', TEXT + DOCUMENTS + IMAGES)
-    configure_uploads(app, photos)
     add_views(app)
     init_db(app)
+    setup_response_cache(app)
+    setup_hours_buffer(app)
+    setup_idempotency(app)
+    if app.config.get('INSTRUMENTATION'):
+        from App.instrumentation import setup_instrumentation
+        setup_instrumentation(app)
     jwt = setup_jwt(app)
-    setup_admin(app)
+    if profile == 'web':
+        from App.views.admin import setup_admin
+        setup_admin(app)
     @jwt.invalid_token_loader
     @jwt.unauthorized_loader
     def custom_unauthorized_response(error):
         return render_template('401.html', error=error), 401
     app.app_context().push()
-    return app
\ No newline at end of file
+    return app
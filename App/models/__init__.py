@@ -1,2 +1,4 @@
-from .user import User, Student,Staff, LoggedHours,Accolade,ConfirmRequest,Leaderboard
-__all__ = ['User', 'Student','Staff','LoggedHours','Accolade','ConfirmRequest','Leaderboard'] 
\ No newline at end of file
+from .user import User, Student,Staff, LoggedHours,Accolade,ConfirmRequest,Leaderboard, DailyHours, HoursLedger, IdempotencyKey, load_milestones, get_milestones
+from .passwords import hash_password, hash_passwords, needs_rehash
+__all__ = ['User', 'Student','Staff','LoggedHours','Accolade','ConfirmRequest','Leaderboard','DailyHours','HoursLedger','IdempotencyKey',
+           'load_milestones', 'get_milestones', 'hash_password', 'hash_passwords', 'needs_rehash'] 
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash
+
+# Full werkzeug method strings, so a stored hash can be compared against them
+HASH_PROFILES = {
+    'default': 'scrypt:32768:8:1',
+    'fast': 'pbkdf2:sha256:1000',
+}
+
+# Below this many passwords a process pool costs more than it saves
+POOL_THRESHOLD = 32
+
+def hash_method():
+    """Get the configured hash method (PASSWORD_HASH_METHOD or PASSWORD_HASH_PROFILE)"""
+    if not has_app_context():
+        return HASH_PROFILES['default']
+    config = current_app.config
+    return config.get('PASSWORD_HASH_METHOD') or HASH_PROFILES[config.get('PASSWORD_HASH_PROFILE', 'default')]
+
+def hash_password(password):
+    """Hash one password with the configured method"""
+    return generate_password_hash(password, method=hash_method())
+
+def hash_passwords(passwords, workers=None):
+    """Hash a batch of passwords across a process pool, keeping input order"""
+    passwords = list(passwords)
+    method = hash_method()
+    if workers is None:
+        workers = current_app.config.get('PASSWORD_HASH_WORKERS') if has_app_context() else None
+        workers = workers or os.cpu_count() or 1
+        if len(passwords) < POOL_THRESHOLD:
+            workers = 1
+    workers = min(workers, len(passwords))
+    if workers <= 1:
+        return [generate_password_hash(password, method=method) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(partial(generate_password_hash, method=method), passwords, chunksize=chunksize))
+
+def parse_method(method):
+    """Split a werkzeug method string into (algorithm, *params), filling in the
+    defaults werkzeug uses, so 'pbkdf2:sha256' and its stored form compare equal"""
+    algorithm, *params = method.split(':')
+    if algorithm == 'pbkdf2':
+        hash_name = params[0] if params else 'sha256'
+        iterations = int(params[1]) if len(params) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return (algorithm, hash_name, iterations)
+    if algorithm == 'scrypt':
+        return (algorithm, *(tuple(map(int, params)) if params else (2 ** 15, 8, 1)))
+    return (algorithm, *params)
+
+def needs_rehash(pwhash):
+    """Check whether a stored hash was made with outdated parameters"""
+    return parse_method(pwhash.split('$', 1)[0]) != parse_method(hash_method())
@@ -1,7 +1,15 @@
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.security import check_password_hash
 from App.database import db
+from App.models.passwords import hash_password, needs_rehash
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from collections import namedtuple
+from uuid import uuid4
+from bisect import bisect_left, insort
+from threading import Lock
+import time
+from flask import current_app, has_app_context
+from sqlalchemy.exc import IntegrityError
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,12 +18,20 @@ class User(db.Model):
     user_type = db.Column(db.String(20), nullable=False)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Relationships each serialization profile reads, see loadOptions
+    profiles = {'summary': (), 'detail': ()}
+
     def __init__(self, username, password, user_type):
         self.username = username
         self.user_type = user_type
         self.set_password(password)
 
-    def get_json(self):
+    @classmethod
+    def loadOptions(cls, profile='detail'):
+        """Eager-load options for everything get_json(profile) touches"""
+        return [db.selectinload(getattr(cls, name)) for name in cls.profiles[profile]]
+
+    def get_json(self, profile='detail'):
         return {
             'id': self.id,
             'username': self.username,
@@ -24,11 +40,15 @@ class User(db.Model):
 
     def set_password(self, password):
         """Create hashed password."""
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
     
     def check_password(self, password):
-        """Check hashed password."""
-        return check_password_hash(self.password, password)
+        """Check hashed password, upgrading it if it uses outdated parameters."""
+        if not check_password_hash(self.password, password):
+            return False
+        if needs_rehash(self.password):
+            self.set_password(password)
+        return True
 
 class Student(User):
     __tablename__ = 'student'
@@ -41,25 +61,44 @@ class Student(User):
     loggedHours = db.relationship('LoggedHours', backref='student', lazy=True)
     accolades = db.relationship('Accolade', backref='student', lazy=True)
 
+    profiles = {'summary': (), 'detail': ('loggedHours', 'accolades')}
+
     def __init__(self, username, password, studentName, studentEmail):
         super().__init__(username, password, user_type='student')
         self.studentName = studentName
         self.studentEmail = studentEmail
 
-    def get_json(self):
-        data = super().get_json()
+    def get_json(self, profile='detail'):
+        data = super().get_json(profile)
         data.update({
             'studentName': self.studentName,
             'studentEmail': self.studentEmail,
-            'totalHours': self.totalHours,
-            'loggedHours': [log.get_json() for log in self.loggedHours],
-            'accolades': [accolade.get_json() for accolade in self.accolades]
+            'totalHours': self.totalHours
         })
+        if profile == 'detail':
+            data.update({
+                'loggedHours': [log.get_json() for log in self.loggedHours],
+                'accolades': [accolade.get_json() for accolade in self.accolades]
+            })
         return data
 
+    @staticmethod
+    def addConfirmedHours(studentID, delta):
+        """Atomically shift a student's stored total (totalHours = totalHours + :delta)"""
+        db.session.execute(
+            db.update(Student).where(Student.id == studentID).values(
+                totalHours=db.func.coalesce(Student.totalHours, 0) + delta)
+        )
+
     def requestConfirmation(self, log):
-        """Request confirmation for logged hours"""
+        """Request confirmation for logged hours. A request still open for the
+        entry is returned instead of queueing a duplicate."""
         if log.studentID == self.id and not log.isConfirmed:
+            request = db.session.scalars(db.select(ConfirmRequest).where(
+                ConfirmRequest.studentID == self.id, ConfirmRequest.loggedHoursID == log.logID,
+                ConfirmRequest.status.in_(('pending', 'claimed')))).first()
+            if request:
+                return request
             request = ConfirmRequest(
                 loggedHoursID=log.logID,
                 studentID=self.id,
@@ -76,14 +115,8 @@ class Student(User):
         return leaderboard.generateRankings()
 
     def viewAccolades(self):
-        """View student's unique, actually earned accolades (no duplicates)"""
-        unique = {}
-        for accolade in self.accolades:
-            # Only keep the first accolade per milestone
-            if accolade.milestone not in unique:
-                unique[accolade.milestone] = accolade
-        # Return accolades sorted by milestone (optional)
-        return [unique[m] for m in sorted(unique.keys())]
+        """View student's earned accolades, unique per milestone by constraint"""
+        return db.session.scalars(Accolade.forStudent(self.id)).all()
 
 class Staff(User):
     __tablename__ = 'staff'
@@ -94,19 +127,25 @@ class Staff(User):
     
     confirmedHours = db.relationship('LoggedHours', backref='confirming_staff', 
                                    foreign_keys='LoggedHours.staffID', lazy=True)
+    # Confirmed-only view of the same rows, filtered in SQL rather than Python
+    hoursConfirmed = db.relationship('LoggedHours', viewonly=True, lazy=True,
+                                     primaryjoin='and_(Staff.id == LoggedHours.staffID, LoggedHours.isConfirmed == True)')
+
+    profiles = {'summary': (), 'detail': ('hoursConfirmed',)}
 
     def __init__(self, username, password, staffName, staffEmail):
         super().__init__(username, password, user_type='staff')
         self.staffName = staffName
         self.staffEmail = staffEmail
 
-    def get_json(self):
-        data = super().get_json()
+    def get_json(self, profile='detail'):
+        data = super().get_json(profile)
         data.update({
             'staffName': self.staffName,
-            'staffEmail': self.staffEmail,
-            'hoursConfirmed': [log.get_json() for log in self.confirmedHours if log.isConfirmed]
+            'staffEmail': self.staffEmail
         })
+        if profile == 'detail':
+            data['hoursConfirmed'] = [log.get_json() for log in self.hoursConfirmed]
         return data
 
     def logHours(self, student, hours, description):
@@ -120,43 +159,120 @@ class Staff(User):
             isConfirmed=False
         )
         db.session.add(log_entry)
+        db.session.flush()
+        HoursLedger.append([(student.id, log_entry.logID, 'logged', hours, log_entry.logDate)])
         db.session.commit()
         return log_entry
 
     def confirmHours(self, log):
         """Confirm logged hours"""
-        if not log.isConfirmed:
-            log.isConfirmed = True
-            log.dateConfirmed = datetime.utcnow()
-            
-            # Update student's total hours
-            student = Student.query.get(log.studentID)
-            if student:
-                confirmed_hours = LoggedHours.query.filter_by(
-                    studentID=student.id, isConfirmed=True).all()
-                student.totalHours = sum(hour.hours for hour in confirmed_hours)
+        student = db.session.get(Student, log.studentID)
+        changed = LoggedHours.setConfirmed([log.logID]) if student else []
+        if not changed:
+            # Missing student, or another request already confirmed it
+            db.session.rollback()
+            return None
+        DailyHours.record(changed)
+        HoursLedger.appendRows(changed, 'confirmed')
+        # Update student's total hours by the delta instead of re-summing
+        Student.addConfirmedHours(student.id, log.hours)
+        self.checkAccolades(student)
+        db.session.commit()
+        Leaderboard.updateStudent(student)
+        return log
+
+    def confirmHoursBulk(self, logIDs, chunk_size=500, on_chunk=None):
+        """Confirm many logged hours, committing roughly chunk_size entries at a time.
+        on_chunk is called with each committed chunk's logIDs."""
+        pending = db.session.execute(
+            db.select(LoggedHours.logID, LoggedHours.studentID)
+            .where(LoggedHours.logID.in_(set(logIDs)), LoggedHours.isConfirmed.isnot(True))
+            .order_by(LoggedHours.studentID, LoggedHours.logID)
+        ).all()
+        # Chunks never split a student, so accolades are evaluated once per student
+        by_student = {}
+        for row in pending:
+            by_student.setdefault(row.studentID, []).append(row.logID)
+        confirmed, chunk = [], []
+        for ids in by_student.values():
+            chunk.extend(ids)
+            if len(chunk) >= chunk_size:
+                confirmed.extend(self._confirmChunk(chunk, on_chunk))
+                chunk = []
+        if chunk:
+            confirmed.extend(self._confirmChunk(chunk, on_chunk))
+        return confirmed
+
+    def _confirmChunk(self, logIDs, on_chunk=None):
+        changed, students = self._confirmLogs(logIDs)
+        db.session.commit()
+        for student in students:
+            Leaderboard.updateStudent(student)
+        committed = [row.logID for row in changed]
+        if on_chunk:
+            on_chunk(committed)
+        return committed
+
+    def _confirmLogs(self, logIDs):
+        """Confirm entries, apply per-student deltas and accolades without committing"""
+        changed = LoggedHours.setConfirmed(logIDs)
+        DailyHours.record(changed)
+        HoursLedger.appendRows(changed, 'confirmed')
+        students, deltas = [], {}
+        for row in changed:
+            deltas[row.studentID] = deltas.get(row.studentID, 0) + row.hours
+        if deltas:
+            student_table = Student.__table__
+            db.session.execute(
+                db.update(student_table).where(student_table.c.id == db.bindparam('student_id')).values(
+                    totalHours=db.func.coalesce(student_table.c.totalHours, 0) + db.bindparam('delta')),
+                [{'student_id': studentID, 'delta': delta} for studentID, delta in deltas.items()]
+            )
+            students = db.session.execute(
+                db.select(Student).where(Student.id.in_(deltas))
+                .execution_options(populate_existing=True)
+            ).scalars().all()
+            for student in students:
                 self.checkAccolades(student)
-                db.session.commit()
-                return log
-        return None
+        return changed, students
+
+    def processRequests(self, token, approveIDs=(), rejectIDs=()):
+        """Approve or reject requests claimed under token in one transaction.
+        Claimed requests in neither list go back to the queue."""
+        now = datetime.utcnow()
+        decided = {}
+        for status, requestIDs in (('approved', approveIDs), ('rejected', rejectIDs)):
+            if not requestIDs:
+                continue
+            rows = db.session.execute(
+                db.update(ConfirmRequest)
+                .where(ConfirmRequest.requestID.in_(requestIDs), ConfirmRequest.claimToken == token,
+                       ConfirmRequest.status == 'claimed')
+                .values(status=status, processedAt=now, processedBy=self.id)
+                .returning(ConfirmRequest.requestID, ConfirmRequest.loggedHoursID)
+            ).all()
+            decided[status] = rows
+        ConfirmRequest.release(token)
+        changed, students = self._confirmLogs([row.loggedHoursID for row in decided.get('approved', [])])
+        db.session.commit()
+        for student in students:
+            Leaderboard.updateStudent(student)
+        return {
+            'approved': sorted(row.requestID for row in decided.get('approved', [])),
+            'rejected': sorted(row.requestID for row in decided.get('rejected', [])),
+            'confirmedLogs': sorted(row.logID for row in changed)
+        }
 
     def checkAccolades(self, student):
         """Check and award accolades based on milestones"""
-        milestones = [10, 25, 50]
-        for milestone in milestones:
-            if student.totalHours >= milestone:
-                existing_accolade = Accolade.query.filter_by(
-                    studentID=student.id, milestone=milestone).first()
-                if not existing_accolade:
-                    accolade = Accolade(
-                        studentID=student.id,
-                        milestone=milestone,
-                        dateAwarded=datetime.utcnow()
-                    )
-                    db.session.add(accolade)
+        return Accolade.award(student)
 
 class LoggedHours(db.Model):
     __tablename__ = 'loggedHours'
+    __table_args__ = (
+        db.Index('ix_loggedHours_student_confirmed', 'studentID', 'isConfirmed'),
+        db.Index('ix_loggedHours_staff_confirmed', 'staffID', 'isConfirmed'),
+    )
     logID = db.Column(db.Integer, primary_key=True)
     studentID = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     staffID = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
@@ -178,36 +294,337 @@ class LoggedHours(db.Model):
             'dateConfirmed': self.dateConfirmed.isoformat() if self.dateConfirmed else None
         }
 
+    @staticmethod
+    def insertMany(logs):
+        """Write unsaved entries with one executemany INSERT ... RETURNING (batched
+        into multi-row VALUES where the dialect keeps RETURNING in order, as on
+        PostgreSQL), fill in their logIDs and append them to the ledger, stamped at
+        write time like every other append so createdAt follows seq. Does not commit."""
+        if not logs:
+            return logs
+        columns = ('studentID', 'staffID', 'hours', 'description', 'logDate', 'isConfirmed')
+        stmt = db.insert(LoggedHours.__table__).returning(LoggedHours.logID, sort_by_parameter_order=True)
+        result = db.session.execute(stmt, [{column: getattr(log, column) for column in columns} for log in logs])
+        for log, logID in zip(logs, result.scalars()):
+            log.logID = logID
+        HoursLedger.append([(log.studentID, log.logID, 'logged', log.hours, None) for log in logs])
+        return logs
+
+    @staticmethod
+    def setConfirmed(logIDs, confirmed=True):
+        """Flip confirmation for the given entries in one guarded UPDATE.
+        Entries already in the requested state are left alone, so the
+        returned (logID, studentID, hours, dateConfirmed) rows are only the
+        ones changed."""
+        if confirmed:
+            stmt = db.update(LoggedHours).where(LoggedHours.isConfirmed.isnot(True)).values(
+                isConfirmed=True, dateConfirmed=datetime.utcnow())
+        else:
+            stmt = db.update(LoggedHours).where(LoggedHours.isConfirmed == True).values(isConfirmed=False)
+        stmt = stmt.where(LoggedHours.logID.in_(logIDs)).returning(
+            LoggedHours.logID, LoggedHours.studentID, LoggedHours.hours, LoggedHours.dateConfirmed)
+        return db.session.execute(stmt).all()
+
     def setStudentStatus(self, studentStatus):
         """Set confirmation status"""
-        if studentStatus.lower() == 'confirmed':
-            self.isConfirmed = True
-            self.dateConfirmed = datetime.utcnow()
-        else:
-            self.isConfirmed = False
+        confirmed = studentStatus.lower() == 'confirmed'
+        student = None
+        changed = LoggedHours.setConfirmed([self.logID], confirmed)
+        if changed:
+            # Keep the stored total and daily rollup in step with the status change
+            Student.addConfirmedHours(self.studentID, self.hours if confirmed else -self.hours)
+            DailyHours.record(changed, 1 if confirmed else -1)
+            HoursLedger.appendRows(changed, 'confirmed' if confirmed else 'unconfirmed')
+            student = db.session.get(Student, self.studentID)
         db.session.commit()
+        if student:
+            Leaderboard.updateStudent(student)
         
     def getHours(self):
         """Get hours logged"""
         return self.hours   
 
+def upsert_insert(dialect):
+    """The dialect's INSERT construct if it supports ON CONFLICT DO UPDATE, else None.
+    Imported on use, loading the postgresql dialect costs startup time."""
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+class DailyHours(db.Model):
+    """Confirmed hours per student per day, so windowed leaderboards sum a
+    bounded number of buckets instead of scanning loggedHours"""
+    __tablename__ = 'dailyHours'
+    __table_args__ = (
+        db.Index('ix_dailyHours_day_student', 'day', 'studentID', 'hours'),
+    )
+    studentID = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    hours = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def record(rows, sign=1):
+        """Add (or with sign=-1 remove) setConfirmed rows to their confirmation day's bucket"""
+        deltas = {}
+        for row in rows:
+            key = (row.studentID, (row.dateConfirmed or datetime.utcnow()).date())
+            deltas[key] = deltas.get(key, 0) + sign * row.hours
+        buckets = [{'studentID': studentID, 'day': day, 'hours': delta}
+                   for (studentID, day), delta in deltas.items() if delta]
+        if not buckets:
+            return
+        table = DailyHours.__table__
+        insert = upsert_insert(db.session.get_bind(mapper=DailyHours).dialect.name)
+        if insert is not None:
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(index_elements=[table.c.studentID, table.c.day],
+                                              set_={'hours': table.c.hours + stmt.excluded.hours})
+            db.session.execute(stmt, buckets)
+            return
+        for values in buckets:
+            bucket = db.session.get(DailyHours, (values['studentID'], values['day']), with_for_update=True)
+            if bucket:
+                bucket.hours += values['hours']
+            else:
+                db.session.add(DailyHours(**values))
+        db.session.flush()
+
+    @staticmethod
+    def rebuild():
+        """Backfill every bucket from confirmed loggedHours, replacing what is there"""
+        table = DailyHours.__table__
+        day = db.func.date(LoggedHours.dateConfirmed)
+        db.session.execute(db.delete(table))
+        result = db.session.execute(db.insert(table).from_select(
+            ['studentID', 'day', 'hours'],
+            db.select(LoggedHours.studentID, day, db.func.sum(LoggedHours.hours))
+            .where(LoggedHours.isConfirmed == True, LoggedHours.dateConfirmed.isnot(None))
+            .group_by(LoggedHours.studentID, day)
+        ))
+        return result.rowcount
+
+class HoursLedger(db.Model):
+    """Append-only per-student history of hour events. Each entry stores the
+    student's confirmed and pending balances after it, so balances (current or
+    as of a date) are one indexed lookup instead of a sum over loggedHours."""
+    __tablename__ = 'hoursLedger'
+    __table_args__ = (
+        db.UniqueConstraint('studentID', 'seq', name='uq_hoursLedger_student_seq'),
+        db.Index('ix_hoursLedger_student_created', 'studentID', 'createdAt'),
+    )
+    # (confirmed, pending) balance change per hour for each kind of entry
+    KINDS = {'logged': (0, 1), 'confirmed': (1, -1), 'unconfirmed': (-1, 1)}
+
+    entryID = db.Column(db.Integer, primary_key=True)
+    studentID = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    logID = db.Column(db.Integer, db.ForeignKey('loggedHours.logID'))
+    kind = db.Column(db.String(20), nullable=False)
+    hours = db.Column(db.Integer, nullable=False)
+    confirmedBalance = db.Column(db.Integer, nullable=False)
+    pendingBalance = db.Column(db.Integer, nullable=False)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def get_json(self):
+        return {
+            'seq': self.seq,
+            'logID': self.logID,
+            'kind': self.kind,
+            'hours': self.hours,
+            'confirmedBalance': self.confirmedBalance,
+            'pendingBalance': self.pendingBalance,
+            'createdAt': self.createdAt.isoformat() if self.createdAt else None
+        }
+
+    @staticmethod
+    def append(entries):
+        """Append (studentID, logID, kind, hours, createdAt) entries in order, carrying
+        each student's balances forward from their latest entry. Does not commit."""
+        if not entries:
+            return
+        studentIDs = {entry[0] for entry in entries}
+        students = Student.__table__
+        # Serialize appends per student (a no-op lock on SQLite, which serializes writers)
+        db.session.execute(db.select(students.c.id).where(students.c.id.in_(studentIDs)).with_for_update())
+        latest = db.select(HoursLedger.studentID, db.func.max(HoursLedger.seq).label('seq')).where(
+            HoursLedger.studentID.in_(studentIDs)).group_by(HoursLedger.studentID).subquery()
+        balances = {row.studentID: [row.seq, row.confirmedBalance, row.pendingBalance]
+                    for row in db.session.execute(
+                        db.select(HoursLedger.studentID, HoursLedger.seq, HoursLedger.confirmedBalance,
+                                  HoursLedger.pendingBalance)
+                        .join(latest, db.and_(latest.c.studentID == HoursLedger.studentID,
+                                              latest.c.seq == HoursLedger.seq)))}
+        rows = []
+        for studentID, logID, kind, hours, createdAt in entries:
+            confirmedSign, pendingSign = HoursLedger.KINDS[kind]
+            balance = balances.setdefault(studentID, [0, 0, 0])
+            balance[0] += 1
+            balance[1] += confirmedSign * hours
+            balance[2] += pendingSign * hours
+            rows.append({'studentID': studentID, 'seq': balance[0], 'logID': logID, 'kind': kind,
+                         'hours': hours, 'confirmedBalance': balance[1], 'pendingBalance': balance[2],
+                         'createdAt': createdAt or datetime.utcnow()})
+        db.session.execute(db.insert(HoursLedger.__table__), rows)
+
+    @staticmethod
+    def appendRows(rows, kind):
+        """Append an entry for each (logID, studentID, hours, dateConfirmed) row from setConfirmed"""
+        now = datetime.utcnow()
+        HoursLedger.append([(row.studentID, row.logID, kind, row.hours,
+                             row.dateConfirmed if kind == 'confirmed' else now) for row in rows])
+
+    @staticmethod
+    def latest(studentID, asOf=None):
+        """The student's last entry, or their last entry at or before asOf"""
+        query = db.select(HoursLedger).where(HoursLedger.studentID == studentID)
+        if asOf is not None:
+            query = query.where(HoursLedger.createdAt <= asOf).order_by(
+                HoursLedger.createdAt.desc(), HoursLedger.seq.desc())
+        else:
+            query = query.order_by(HoursLedger.seq.desc())
+        return db.session.scalars(query.limit(1)).first()
+
+    @staticmethod
+    def history(studentID, limit=50, before=None):
+        """Newest-first page of a student's entries, keyset-paginated on seq"""
+        query = db.select(HoursLedger).where(HoursLedger.studentID == studentID)
+        if before is not None:
+            query = query.where(HoursLedger.seq < before)
+        return db.session.scalars(query.order_by(HoursLedger.seq.desc()).limit(limit)).all()
+
+    @staticmethod
+    def rebuild():
+        """Replace the ledger with entries derived from loggedHours: one 'logged' entry
+        per log and one 'confirmed' entry per confirmed log, with running balances"""
+        events = db.union_all(
+            db.select(LoggedHours.studentID, LoggedHours.logID, db.literal('logged').label('kind'),
+                      LoggedHours.hours, db.func.coalesce(LoggedHours.logDate, LoggedHours.dateConfirmed)
+                      .label('createdAt'), db.literal(0).label('confirmedSign'),
+                      db.literal(1).label('pendingSign'), db.literal(0).label('position')),
+            db.select(LoggedHours.studentID, LoggedHours.logID, db.literal('confirmed'),
+                      LoggedHours.hours, LoggedHours.dateConfirmed, db.literal(1), db.literal(-1),
+                      db.literal(1))
+            .where(LoggedHours.isConfirmed == True, LoggedHours.dateConfirmed.isnot(None))
+        ).subquery()
+        order = (events.c.createdAt, events.c.logID, events.c.position)
+        window = {'partition_by': events.c.studentID, 'order_by': order}
+        running = dict(window, rows=(None, 0))
+        table = HoursLedger.__table__
+        db.session.execute(db.delete(table))
+        result = db.session.execute(db.insert(table).from_select(
+            ['studentID', 'seq', 'logID', 'kind', 'hours', 'confirmedBalance', 'pendingBalance', 'createdAt'],
+            db.select(
+                events.c.studentID,
+                db.func.row_number().over(**window),
+                events.c.logID, events.c.kind, events.c.hours,
+                db.func.sum(events.c.hours * events.c.confirmedSign).over(**running),
+                db.func.sum(events.c.hours * events.c.pendingSign).over(**running),
+                events.c.createdAt
+            )
+        ))
+        return result.rowcount
+
+DEFAULT_MILESTONES = {10: "Bronze Service Award", 25: "Silver Service Award", 50: "Gold Service Award"}
+
+class MilestoneRegistry:
+    """Accolade tiers (hours -> award name), built once per app from ACCOLADE_MILESTONES"""
+    def __init__(self, milestones):
+        self.names = {int(hours): name for hours, name in milestones.items()}
+        self.hours = sorted(self.names)
+
+    def name(self, milestone):
+        return self.names.get(milestone, f"{milestone} Hour Award")
+
+    def reached(self, totalHours):
+        return [hours for hours in self.hours if hours <= (totalHours or 0)]
+
+def load_milestones(app):
+    """Cache the milestone registry on the app at startup"""
+    registry = MilestoneRegistry(app.config.get('ACCOLADE_MILESTONES') or DEFAULT_MILESTONES)
+    app.extensions['accolade_milestones'] = registry
+    return registry
+
+def get_milestones():
+    if has_app_context() and 'accolade_milestones' in current_app.extensions:
+        return current_app.extensions['accolade_milestones']
+    return MilestoneRegistry(DEFAULT_MILESTONES)
+
 class Accolade(db.Model):
     __tablename__ = 'accolade'
+    __table_args__ = (
+        db.UniqueConstraint('studentID', 'milestone', name='uq_accolade_student_milestone'),
+    )
     accoladeID = db.Column(db.Integer, primary_key=True)
     studentID = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     milestone = db.Column(db.Integer, nullable=False)
     dateAwarded = db.Column(db.DateTime, default=datetime.utcnow)
 
     def get_json(self):
-        milestone_names = {10: "Bronze Service Award", 25: "Silver Service Award", 50: "Gold Service Award"}
         return {
             'accoladeID': self.accoladeID,
             'studentID': self.studentID,
             'milestone': self.milestone,
-            'name': milestone_names.get(self.milestone, f"{self.milestone} Hour Award"),
+            'name': get_milestones().name(self.milestone),
             'dateAwarded': self.dateAwarded.isoformat() if self.dateAwarded else None
         }
 
+    @staticmethod
+    def forStudent(studentID):
+        """A student's accolades by milestone, as a query the async API can run too"""
+        return db.select(Accolade).where(Accolade.studentID == studentID).order_by(Accolade.milestone)
+
+    @staticmethod
+    def award(student):
+        """Award every reached milestone the student does not have yet.
+        One query for the existing milestones, one INSERT for the missing ones.
+        A concurrent award of the same milestone is skipped, not raised."""
+        reached = get_milestones().reached(student.totalHours)
+        if not reached:
+            return []
+        existing = set(db.session.scalars(
+            db.select(Accolade.milestone).where(Accolade.studentID == student.id)))
+        missing = [milestone for milestone in reached if milestone not in existing]
+        if not missing:
+            return missing
+        now = datetime.utcnow()
+        rows = [{'studentID': student.id, 'milestone': milestone, 'dateAwarded': now} for milestone in missing]
+        table = Accolade.__table__
+        insert = upsert_insert(db.session.get_bind(mapper=Accolade).dialect.name)
+        if insert is not None:
+            db.session.execute(insert(table).on_conflict_do_nothing(
+                index_elements=[table.c.studentID, table.c.milestone]), rows)
+            return missing
+        for values in rows:
+            # A savepoint per row, so losing a race keeps the caller's transaction
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(table), values)
+            except IntegrityError:
+                pass
+        return missing
+
+    @staticmethod
+    def recomputeAll():
+        """Backfill missing awards for every student with one INSERT ... SELECT"""
+        hours = get_milestones().hours
+        if not hours:
+            return 0
+        tiers = [db.select(db.literal(milestone).label('milestone')) for milestone in hours]
+        tiers = (db.union_all(*tiers) if len(tiers) > 1 else tiers[0]).subquery('tiers')
+        student = Student.__table__
+        accolade = Accolade.__table__
+        reached = db.select(student.c.id, tiers.c.milestone, db.literal(datetime.utcnow(), db.DateTime)).join(
+            tiers, db.func.coalesce(student.c.totalHours, 0) >= tiers.c.milestone
+        ).where(~db.exists().where(accolade.c.studentID == student.c.id,
+                                   accolade.c.milestone == tiers.c.milestone))
+        result = db.session.execute(
+            db.insert(accolade).from_select(['studentID', 'milestone', 'dateAwarded'], reached))
+        return result.rowcount
+
     def assignedToStudent(self, student):
         """Assign accolade to student"""
         self.studentID = student.id
@@ -219,11 +636,20 @@ class Accolade(db.Model):
     
 class ConfirmRequest(db.Model):
     __tablename__ = 'confirmRequest'
+    __table_args__ = (
+        db.Index('ix_confirmRequest_student_status', 'studentID', 'status'),
+        db.Index('ix_confirmRequest_status_date', 'status', 'requestDate'),
+    )
     requestID = db.Column(db.Integer, primary_key=True)
     loggedHoursID = db.Column(db.Integer, db.ForeignKey('loggedHours.logID'), nullable=False)
     studentID = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     requestDate = db.Column(db.DateTime, default=datetime.utcnow)
+    # pending -> claimed -> approved | rejected
     status = db.Column(db.String(20), default='pending')
+    claimToken = db.Column(db.String(32))
+    claimedAt = db.Column(db.DateTime)
+    processedAt = db.Column(db.DateTime)
+    processedBy = db.Column(db.Integer, db.ForeignKey('staff.id', name='fk_confirmRequest_processedBy_staff'))
 
     def get_json(self):
         return {
@@ -231,45 +657,285 @@ class ConfirmRequest(db.Model):
             'loggedHoursID': self.loggedHoursID,
             'studentID': self.studentID,
             'requestDate': self.requestDate.isoformat() if self.requestDate else None,
-            'status': self.status
+            'status': self.status,
+            'processedAt': self.processedAt.isoformat() if self.processedAt else None,
+            'processedBy': self.processedBy
+        }
+
+    @staticmethod
+    def claimBatch(limit=50, claimTimeout=300):
+        """Claim up to limit pending requests, oldest first. Returns (token, requests).
+        Uses SELECT ... FOR UPDATE SKIP LOCKED where supported (SQLite renders no
+        lock clause); the status guard on the UPDATE keeps the claim exclusive either way."""
+        now = datetime.utcnow()
+        # Claims held longer than claimTimeout belong to a dead worker
+        db.session.execute(
+            db.update(ConfirmRequest)
+            .where(ConfirmRequest.status == 'claimed',
+                   ConfirmRequest.claimedAt < now - timedelta(seconds=claimTimeout))
+            .values(status='pending', claimToken=None, claimedAt=None)
+        )
+        requestIDs = db.session.scalars(
+            db.select(ConfirmRequest.requestID)
+            .where(ConfirmRequest.status == 'pending')
+            .order_by(ConfirmRequest.requestDate, ConfirmRequest.requestID)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        token = uuid4().hex
+        if requestIDs:
+            db.session.execute(
+                db.update(ConfirmRequest)
+                .where(ConfirmRequest.requestID.in_(requestIDs), ConfirmRequest.status == 'pending')
+                .values(status='claimed', claimToken=token, claimedAt=now)
+            )
+        db.session.commit()
+        claimed = db.session.scalars(
+            db.select(ConfirmRequest).where(ConfirmRequest.claimToken == token,
+                                            ConfirmRequest.status == 'claimed')
+            .order_by(ConfirmRequest.requestID)
+        ).all()
+        return token, claimed
+
+    @staticmethod
+    def release(token):
+        """Put requests still claimed under token back in the queue"""
+        db.session.execute(
+            db.update(ConfirmRequest)
+            .where(ConfirmRequest.claimToken == token, ConfirmRequest.status == 'claimed')
+            .values(status='pending', claimToken=None, claimedAt=None)
+        )
+
+    @staticmethod
+    def queueStats(window=3600):
+        """Queue depth per status plus wait and processing latency in seconds"""
+        now = datetime.utcnow()
+        depth = dict(db.session.execute(
+            db.select(ConfirmRequest.status, db.func.count()).group_by(ConfirmRequest.status)
+        ).all())
+        oldest = db.session.scalar(
+            db.select(db.func.min(ConfirmRequest.requestDate)).where(ConfirmRequest.status == 'pending'))
+        recent = db.session.execute(
+            db.select(ConfirmRequest.requestDate, ConfirmRequest.processedAt)
+            .where(ConfirmRequest.processedAt >= now - timedelta(seconds=window))
+        ).all()
+        waits = [(row.processedAt - row.requestDate).total_seconds() for row in recent if row.requestDate]
+        return {
+            'depth': {status: depth.get(status, 0) for status in ('pending', 'claimed', 'approved', 'rejected')},
+            'oldestPendingSeconds': (now - oldest).total_seconds() if oldest else 0,
+            'processedInWindow': len(recent),
+            'windowSeconds': window,
+            'avgLatencySeconds': sum(waits) / len(waits) if waits else 0,
+            'maxLatencySeconds': max(waits) if waits else 0
         }
 
+class IdempotencyKey(db.Model):
+    """Outcome of a write made under a client's Idempotency-Key, kept until expiresAt.
+    keyHash digests the scope, actor and key; fingerprint digests the arguments."""
+    __tablename__ = 'idempotencyKey'
+    keyHash = db.Column(db.String(40), primary_key=True)
+    fingerprint = db.Column(db.String(40), nullable=False)
+    # None until the write finishes
+    message = db.Column(db.String(255))
+    resultID = db.Column(db.Integer)
+    result = db.Column(db.JSON)
+    claimedAt = db.Column(db.DateTime)
+    expiresAt = db.Column(db.DateTime, nullable=False, index=True)
+
+    @staticmethod
+    def claim(keyHash, fingerprint, ttl, lease=30):
+        """Insert a pending key on its own connection, leaving the caller's session
+        alone; returns False when the key is already taken. An expired key, or one
+        still unfinished after lease seconds (its worker died), can be claimed again."""
+        now = datetime.utcnow()
+        table = IdempotencyKey.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(db.delete(table).where(table.c.keyHash == keyHash, db.or_(
+                    table.c.expiresAt < now,
+                    db.and_(table.c.message.is_(None), table.c.claimedAt < now - timedelta(seconds=lease)))))
+                connection.execute(db.insert(table).values(keyHash=keyHash, fingerprint=fingerprint, claimedAt=now,
+                                                           expiresAt=now + timedelta(seconds=ttl)))
+            return True
+        except IntegrityError:
+            return False
+
+    @staticmethod
+    def lookup(keyHash):
+        return db.session.scalars(db.select(IdempotencyKey).where(
+            IdempotencyKey.keyHash == keyHash, IdempotencyKey.expiresAt >= datetime.utcnow())).first()
+
+    @staticmethod
+    def purgeExpired():
+        result = db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.expiresAt < datetime.utcnow()))
+        return result.rowcount
+
+RankRow = namedtuple('RankRow', ['rank', 'id', 'studentName', 'totalHours'])
+
+class RankIndex:
+    """In-process sorted index of students by stored totalHours"""
+    def __init__(self, rows=()):
+        self._lock = Lock()
+        self._entries = {}
+        for row in rows:
+            self._entries[row.id] = (row.totalHours or 0, row.studentName)
+        # Sorted (-totalHours, id) keys, so position gives the rank
+        self._keys = sorted((-hours, studentID) for studentID, (hours, _) in self._entries.items())
+        self.builtAt = time.monotonic()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, studentID, studentName, totalHours):
+        """Insert or move a student in O(log N) search plus a list shift"""
+        totalHours = totalHours or 0
+        with self._lock:
+            old = self._entries.get(studentID)
+            if old:
+                if old[0] == totalHours:
+                    self._entries[studentID] = (totalHours, studentName)
+                    return
+                del self._keys[bisect_left(self._keys, (-old[0], studentID))]
+            self._entries[studentID] = (totalHours, studentName)
+            insort(self._keys, (-totalHours, studentID))
+
+    def remove(self, studentID):
+        with self._lock:
+            old = self._entries.pop(studentID, None)
+            if old:
+                del self._keys[bisect_left(self._keys, (-old[0], studentID))]
+
+    def top(self, n=None):
+        """First n rows in rank order, ties share a rank"""
+        rows = []
+        rank, previous = 0, None
+        with self._lock:
+            keys = self._keys if n is None else self._keys[:n]
+            for position, (negHours, studentID) in enumerate(keys, 1):
+                if negHours != previous:
+                    rank, previous = position, negHours
+                rows.append(RankRow(rank, studentID, self._entries[studentID][1], -negHours))
+        return rows
+
+    def rankOf(self, studentID):
+        """Rank of one student: number of students with more hours plus one"""
+        with self._lock:
+            entry = self._entries.get(studentID)
+            if entry is None:
+                return None
+            rank = bisect_left(self._keys, (-entry[0],)) + 1
+        return RankRow(rank, studentID, entry[1], entry[0])
+
 class Leaderboard:
+    WINDOWS = ('week', 'month', 'term')
+
     def __init__(self):
-        self.studentRanks = []
+        # None until rankings are generated; an empty window stays an empty list
+        self.studentRanks = None
+
+    @staticmethod
+    def rankingQuery(use_stored=False):
+        """Build a single ranked select over all students"""
+        if use_stored:
+            hours = db.func.coalesce(Student.totalHours, 0)
+            query = db.select(Student.id, Student.studentName, hours.label('totalHours'))
+        else:
+            hours = db.func.coalesce(db.func.sum(LoggedHours.hours), 0)
+            query = db.select(Student.id, Student.studentName, hours.label('totalHours')).outerjoin(
+                LoggedHours,
+                db.and_(LoggedHours.studentID == Student.id, LoggedHours.isConfirmed == True)
+            ).group_by(Student.id, Student.studentName)
+        rank = db.func.rank().over(order_by=hours.desc())
+        return query.add_columns(rank.label('rank')).order_by(hours.desc(), Student.id)
+
+    @staticmethod
+    def builtIndex():
+        """The app's rank index if it is built and within LEADERBOARD_INDEX_TTL, else None"""
+        index = current_app.extensions.get('leaderboard_index')
+        ttl = current_app.config.get('LEADERBOARD_INDEX_TTL', 60)
+        if index is None or (ttl and time.monotonic() - index.builtAt > ttl):
+            return None
+        return index
+
+    @staticmethod
+    def index():
+        """Get the app's materialized rank index, building it on first use"""
+        index = Leaderboard.builtIndex()
+        if index is None:
+            index = RankIndex(db.session.execute(Leaderboard.rankingQuery(use_stored=True)))
+            current_app.extensions['leaderboard_index'] = index
+        return index
 
-    def generateRankings(self):
+    @staticmethod
+    def updateStudent(student):
+        """Apply a student's new total to the index if it has been built"""
+        index = current_app.extensions.get('leaderboard_index')
+        if index is not None:
+            index.update(student.id, student.studentName, student.totalHours)
+
+    @staticmethod
+    def invalidate():
+        current_app.extensions.pop('leaderboard_index', None)
+
+    def generateRankings(self, use_stored=False):
         """Generate student rankings based on confirmed hours"""
-        students = Student.query.all()
-        student_hours = []
-        
-        for student in students:
-            total = db.session.query(db.func.sum(LoggedHours.hours)).filter_by(
-                studentID=student.id, isConfirmed=True).scalar() or 0
-            student.totalHours = total  # Update the student's total
-            student_hours.append((student, total))
-        
-        # Sort by hours descending
-        ranked_students = sorted(student_hours, key=lambda x: x[1], reverse=True)
-        self.studentRanks = [student for student, hours in ranked_students]
+        rows = db.session.execute(self.rankingQuery(use_stored))
+        self.studentRanks = [
+            RankRow(row.rank, row.id, row.studentName, row.totalHours) for row in rows
+        ]
         return self.studentRanks
 
-    def topAchiever(self, n: int):
+    @staticmethod
+    def windowBounds(window, today=None):
+        """(first day, last day or None) of the week, month or term containing today"""
+        today = today or datetime.utcnow().date()
+        if window == 'week':
+            return today - timedelta(days=today.weekday()), None
+        if window == 'month':
+            return today.replace(day=1), None
+        if window == 'term':
+            start, end = current_app.config.get('TERM_START'), current_app.config.get('TERM_END')
+            if not start:
+                raise ValueError("TERM_START is not configured")
+            return date.fromisoformat(str(start)), date.fromisoformat(str(end)) if end else None
+        raise ValueError(f"Unknown leaderboard window {window}")
+
+    @staticmethod
+    def windowQuery(start, end=None):
+        """Rank students by the daily rollup buckets between start and end"""
+        hours = db.func.sum(DailyHours.hours)
+        totals = db.select(DailyHours.studentID, hours.label('totalHours')).where(DailyHours.day >= start)
+        if end is not None:
+            totals = totals.where(DailyHours.day <= end)
+        totals = totals.group_by(DailyHours.studentID).having(hours > 0).subquery()
+        rank = db.func.rank().over(order_by=totals.c.totalHours.desc())
+        return db.select(Student.id, Student.studentName, totals.c.totalHours, rank.label('rank')).join(
+            totals, totals.c.studentID == Student.id).order_by(totals.c.totalHours.desc(), Student.id)
+
+    def generateWindowRankings(self, window, today=None):
+        """Generate rankings from hours confirmed this week, month or term"""
+        rows = db.session.execute(self.windowQuery(*self.windowBounds(window, today)))
+        self.studentRanks = [
+            RankRow(row.rank, row.id, row.studentName, row.totalHours) for row in rows
+        ]
+        return self.studentRanks
+
+    def topAchiever(self, n: int = None):
         """Get top N achievers"""
-        if not self.studentRanks:
-            self.generateRankings()
+        if self.studentRanks is None:
+            return self.index().top(n)
         return self.studentRanks[:n]
 
+    def rankOf(self, studentID):
+        """Get a single student's rank without scanning all students"""
+        return self.index().rankOf(studentID)
+
     def get_json(self):
         """Get leaderboard as JSON"""
-        if not self.studentRanks:
-            self.generateRankings()
-        rankings = []
-        for i, student in enumerate(self.studentRanks, 1):
-            rankings.append({
-                'rank': i,
-                'studentID': student.id,
-                'studentName': student.studentName,
-                'totalHours': student.totalHours
-            })
-        return rankings
\ No newline at end of file
+        rows = self.studentRanks if self.studentRanks is not None else self.index().top()
+        return [{
+            'rank': row.rank,
+            'studentID': row.id,
+            'studentName': row.studentName,
+            'totalHours': row.totalHours
+        } for row in rows]
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+import uuid
+from functools import wraps
+from flask import Response, current_app, request
+from werkzeug.http import http_date, parse_etags, quote_etag
+
+from App.cache import TTLCache
+
+# Name of the filesystem backend's data version file, never pruned (entries are sha1 hex)
+VERSION_FILE = 'version'
+# Headers that change the body a view renders for the same path
+VARY_HEADERS = ('Accept',)
+CACHED_HEADERS = ('X-Next-After-Id', 'X-Next-Before')
+
+
+class FileSystemBackend:
+    """Pickled entries in a directory, shared by every worker on the host.
+    Expired files are pruned at most once per ttl, from set()."""
+    def __init__(self, directory, ttl=30):
+        self.directory = directory
+        self.ttl = ttl
+        self._pruned = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        if self.ttl and expires < time.time():
+            return default
+        return value
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + (self.ttl or 0), value), f)
+        os.replace(tmp, self._path(key))
+        if self.ttl and time.time() - self._pruned > self.ttl:
+            self.prune()
+
+    def prune(self, max_age=None):
+        """Delete files not rewritten within max_age seconds (the ttl), i.e. expired entries"""
+        self._pruned = time.time()
+        cutoff = self._pruned - (self.ttl or 0 if max_age is None else max_age)
+        for name in os.listdir(self.directory):
+            if name == VERSION_FILE:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name != VERSION_FILE:
+                os.remove(os.path.join(self.directory, name))
+
+
+class MemoryVersion:
+    """The data version of a memory cache, held apart from its TTL/LRU entries"""
+    def __init__(self):
+        self.value = None
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class FileVersion:
+    """The data version shared by every worker using a filesystem cache. It has no
+    expiry, so ETags only change when the data does."""
+    def __init__(self, path):
+        self.path = path
+
+    def get(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def set(self, value):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(tmp, self.path)
+
+
+def _backend():
+    return current_app.extensions.get('response_cache')
+
+def _version():
+    """Current (token, modified) data version; a new token orphans every cached response"""
+    store = current_app.extensions['response_cache_version']
+    version = store.get()
+    if version is None:
+        version = (uuid.uuid4().hex, int(time.time()))
+        store.set(version)
+    return version
+
+def invalidate_responses():
+    """Bump the data version after a write so cached responses stop being served"""
+    store = current_app.extensions.get('response_cache_version')
+    if store is not None:
+        store.set((uuid.uuid4().hex, int(time.time())))
+
+def cache_key(full_path, headers):
+    # Keyed by the request alone so each response overwrites its stale copy;
+    # the data version lives in the entry and is checked on read
+    return ':'.join([full_path] + [headers.get(h, '') for h in VARY_HEADERS])
+
+def lookup(key):
+    """(entry, token, modified): the cached entry while it matches the current data
+    version (else None), and that version"""
+    backend = _backend()
+    if backend is None:
+        return None, None, None
+    token, modified = _version()
+    entry = backend.get(key)
+    return (entry if entry is not None and entry['version'] == token else None), token, modified
+
+def store(key, token, body, mimetype, headers):
+    """Cache a rendered 200 body under key for data version token"""
+    entry = {
+        'body': body,
+        'mimetype': mimetype,
+        'headers': {h: headers[h] for h in CACHED_HEADERS if h in headers},
+        'etag': hashlib.sha1(body).hexdigest()[:20],
+        'version': token,
+    }
+    backend = _backend()
+    if backend is not None:
+        backend.set(key, entry)
+    return entry
+
+def conditional_response(entry, modified, request_headers):
+    """(status, body, headers) for an entry: 304 without a body when the request's
+    If-None-Match shows the client already has it. Last-Modified is informational:
+    it has whole-second resolution, so two writes in one second would share it and
+    If-Modified-Since could answer 304 for stale data. Every entry has an ETag, so
+    If-Modified-Since is ignored."""
+    headers = {**entry['headers'], 'Content-Type': entry['mimetype'], 'ETag': quote_etag(entry['etag'])}
+    if modified:
+        headers['Last-Modified'] = http_date(modified)
+    if_none_match = parse_etags(request_headers.get('If-None-Match'))
+    if if_none_match.contains_weak(entry['etag']):
+        return 304, b'', headers
+    return 200, entry['body'], headers
+
+def cached_response(view):
+    """Serve a GET view from the response cache, with an ETag and Last-Modified,
+    answering If-None-Match / If-Modified-Since with 304 Not Modified"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = cache_key(request.full_path, request.headers)
+        entry, token, modified = lookup(key)
+        if entry is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            entry = store(key, token, response.get_data(), response.mimetype, response.headers)
+        status, body, headers = conditional_response(entry, modified, request.headers)
+        return Response(body, status, headers)
+    return wrapper
+
+
+def setup_response_cache(app):
+    """Pick the response cache backend named by RESPONSE_CACHE. The memory backend,
+    and its data version, is per process: an invalidation in one worker does not
+    reach the others until their entries expire, so use filesystem with several workers."""
+    backend = app.config.get('RESPONSE_CACHE')
+    ttl = app.config.get('RESPONSE_CACHE_TTL', 30)
+    if backend == 'memory':
+        app.extensions['response_cache'] = TTLCache(app.config.get('RESPONSE_CACHE_SIZE', 256), ttl)
+        app.extensions['response_cache_version'] = MemoryVersion()
+    elif backend == 'filesystem':
+        directory = app.config.get('RESPONSE_CACHE_DIR') or os.path.join(app.instance_path, 'response-cache')
+        app.extensions['response_cache'] = FileSystemBackend(directory, ttl)
+        app.extensions['response_cache_version'] = FileVersion(os.path.join(directory, VERSION_FILE))
+    elif backend:
+        raise ValueError(f"Unknown RESPONSE_CACHE backend {backend}")
@@ -1,7 +1,14 @@
 
 async function getUserData(){
-    const response = await fetch('/api/users');
-    return response.json();
+    let users = [];
+    let url = '/api/users';
+    while(url){
+        const response = await fetch(url);
+        users = users.concat(await response.json());
+        const next = response.headers.get('X-Next-After-Id');
+        url = next ? `/api/users?after_id=${next}` : null;
+    }
+    return users;
 }
 
 function loadTable(users){
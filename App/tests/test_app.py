@@ -1,15 +1,28 @@
+import json
 import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
 from App.main import create_app
-from App.database import db, create_db
+from App.instrumentation import statement_shape
+from App.database import db, create_db, engine_profile
 from App.controllers import (
-    create_user, get_all_users, StudentController, StaffController, view_leaderboard
+    create_user, get_all_users, update_user, StudentController, StaffController, view_leaderboard,
+    view_student_rank, reconcile_total_hours, recompute_accolades, rebuild_rollups, rebuild_ledger,
+    read_rows, import_students, import_staff, import_hours,
+    claim_confirm_requests, process_confirm_requests, confirm_queue_stats, export_stream
 )
+from App.models import Student, Leaderboard, DailyHours, HoursLedger, Accolade, hash_passwords, needs_rehash, load_milestones
+from App.bench import (
+    run_index_benchmark, seed_synthetic, run_path_benchmarks, run_load, run_async_load, asgi_get, parse_importtime
+)
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash
 
 
 
 @pytest.fixture
 def app():
-    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                      'PASSWORD_HASH_PROFILE': 'fast'})
     with app.app_context():
         create_db()
         yield app
@@ -20,6 +33,18 @@ def client(app):
     return app.test_client()
 
 
+@contextmanager
+def count_queries():
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
 """
 USER TESTS
 """
@@ -34,6 +59,69 @@ def test_get_all_users(app):
     users = get_all_users()
     assert any(u.username == "john" for u in users)
 
+def test_hash_passwords_in_pool(app):
+    hashes = hash_passwords(["one", "two", "three"], workers=2)
+    assert [h.split('$')[0] for h in hashes] == ["pbkdf2:sha256:1000"] * 3
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, ["one", "two", "three"]))
+
+def test_login_rehashes_outdated_password(client, app):
+    create_user("alice", "alicepass", "student")
+    app.config['PASSWORD_HASH_METHOD'] = "pbkdf2:sha256:2000"
+    assert client.post('/api/login', json={'username': 'alice', 'password': 'wrong'}).status_code == 401
+    assert get_all_users()[0].password.startswith("pbkdf2:sha256:1000$")
+    assert client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'}).status_code == 200
+    db.session.expire_all()
+    user = get_all_users()[0]
+    assert user.password.startswith("pbkdf2:sha256:2000$")
+    assert user.check_password("alicepass")
+
+def test_needs_rehash_normalizes_short_methods(app):
+    app.config['PASSWORD_HASH_METHOD'] = "pbkdf2:sha256"
+    # What werkzeug stores for the short form
+    stored = f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}$salt$hash"
+    assert not needs_rehash(stored)
+    app.config['PASSWORD_HASH_METHOD'] = "scrypt"
+    assert needs_rehash(stored)
+    assert not needs_rehash("scrypt:32768:8:1$salt$hash")
+
+def test_users_api_keyset_pagination(client):
+    for i in range(5):
+        create_user(f"user{i}", "pass", "student")
+    response = client.get('/api/users?limit=2')
+    assert [u['username'] for u in response.json] == ["user0", "user1"]
+    after_id = response.headers['X-Next-After-Id']
+    response = client.get(f'/api/users?limit=2&after_id={after_id}')
+    assert [u['username'] for u in response.json] == ["user2", "user3"]
+    response = client.get(f'/api/users?limit=2&after_id={response.headers["X-Next-After-Id"]}')
+    assert [u['username'] for u in response.json] == ["user4"]
+    assert 'X-Next-After-Id' not in response.headers
+
+def test_auth_user_lookup_is_cached():
+    config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'PASSWORD_HASH_PROFILE': 'fast'}
+    # Off by default, each worker would serve its own stale copy
+    assert create_app(config).extensions['user_cache'] is None
+    app = create_app({**config, 'USER_CACHE_TTL': 60})
+    with app.app_context():
+        create_db()
+        client = app.test_client()
+        user = create_user("alice", "alicepass", "student")
+        token = client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'}).json['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            assert "alice" in client.get('/api/identify', headers=headers).json['message']
+        assert len(statements) == 1
+        with count_queries() as statements:
+            assert "alice" in client.get('/api/identify', headers=headers).json['message']
+            assert client.get('/', headers=headers).status_code == 200
+        assert statements == []
+
+        # Changing the user evicts the cached copy
+        update_user(user.id, "alicia")
+        db.session.expunge_all()
+        assert "alicia" in client.get('/api/identify', headers=headers).json['message']
+
 
 """
 STUDENT TESTS
@@ -56,6 +144,164 @@ def test_student_leaderboard(app):
     assert rankings[0].studentName == "Alice"
     assert rankings[1].studentName == "John"
 
+def test_leaderboard_rankings_from_confirmed_hours(app):
+    staff, _ = StaffController.create_staff("staff_rank", "staffpass", "Staff Rank", "rank@mail.com")
+    s1, _ = StudentController.create_student("amy", "amypass", "Amy", "amy@mail.com")
+    s2, _ = StudentController.create_student("ben", "benpass", "Ben", "ben@mail.com")
+    s3, _ = StudentController.create_student("cal", "calpass", "Cal", "cal@mail.com")
+    for student, hours in ((s1, 5), (s2, 12), (s3, 5)):
+        log_entry, _ = StaffController.log_hours(staff.id, student.id, hours, "Service")
+        StaffController.confirm_hours(staff.id, log_entry.logID)
+    StaffController.log_hours(staff.id, s1.id, 40, "Unconfirmed")
+
+    leaderboard = Leaderboard()
+    rankings = leaderboard.generateRankings()
+    assert [(r.rank, r.studentName, r.totalHours) for r in rankings] == [
+        (1, "Ben", 12), (2, "Amy", 5), (2, "Cal", 5)
+    ]
+    assert leaderboard.get_json()[0] == {'rank': 1, 'studentID': s2.id, 'studentName': "Ben", 'totalHours': 12}
+
+    # Ranking must not write back to the student rows
+    s1.totalHours = 99
+    db.session.commit()
+    Leaderboard().generateRankings()
+    assert s1.totalHours == 99
+    assert Leaderboard().generateRankings(use_stored=True)[0].studentName == "Amy"
+
+def test_leaderboard_index_tracks_confirmations(app):
+    staff, _ = StaffController.create_staff("staff_idx", "staffpass", "Staff Idx", "idx@mail.com")
+    s1, _ = StudentController.create_student("dee", "deepass", "Dee", "dee@mail.com")
+    s2, _ = StudentController.create_student("eli", "elipass", "Eli", "eli@mail.com")
+    rankings, _ = view_leaderboard()
+    assert [r.rank for r in rankings] == [1, 1]
+
+    log_entry, _ = StaffController.log_hours(staff.id, s2.id, 8, "Service")
+    StaffController.confirm_hours(staff.id, log_entry.logID)
+    s3, _ = StudentController.create_student("fay", "faypass", "Fay", "fay@mail.com")
+    rankings, _ = view_leaderboard(2)
+    assert [(r.studentName, r.totalHours) for r in rankings] == [("Eli", 8), ("Dee", 0)]
+    rank, _ = view_student_rank(s3.id)
+    assert rank.rank == 2 and rank.totalHours == 0
+
+    # Un-confirming through the status setter moves the student back down
+    log_entry.setStudentStatus('pending')
+    assert s2.totalHours == 0
+    rank, _ = view_student_rank(s2.id)
+    assert rank.rank == 1 and rank.totalHours == 0
+    assert view_student_rank(9999)[0] is None
+
+def test_windowed_leaderboards_use_daily_rollup(app, client):
+    from datetime import date, datetime, timedelta
+    from App.models import LoggedHours
+    staff, _ = StaffController.create_staff("rollstaff", "pass", "Roll Staff", None)
+    s1, _ = StudentController.create_student("roll1", "pass", "Roll One", None)
+    s2, _ = StudentController.create_student("roll2", "pass", "Roll Two", None)
+    old, _ = StaffController.log_hours(staff.id, s1.id, 30, "Last year")
+    StaffController.confirm_hours(staff.id, old.logID)
+    # Move the old confirmation out of every window, then rebuild the buckets from it
+    old.dateConfirmed = old.dateConfirmed - timedelta(days=400)
+    db.session.commit()
+    assert rebuild_rollups()[0] == 1
+    # An empty window is empty, not the all-time board
+    assert view_leaderboard(window='week')[0] == []
+    assert client.get('/api/leaderboard?window=week').json == []
+    # top is a positive count, capped like a page limit
+    for top in ('0', '-5', 'abc'):
+        response = client.get(f'/api/leaderboard?top={top}')
+        assert (response.status_code, response.json) == (400, {'message': "top must be a positive integer"})
+    client.application.config['API_MAX_PAGE_SIZE'] = 1
+    assert [row['studentID'] for row in client.get('/api/leaderboard?top=5').json] == [s1.id]
+    client.application.config['API_MAX_PAGE_SIZE'] = 1000
+    recent, _ = StaffController.log_hours(staff.id, s2.id, 5, "This week")
+    StaffController.confirm_hours(staff.id, recent.logID)
+    bulk, _ = StaffController.log_hours(staff.id, s2.id, 2, "Bulk")
+    StaffController.confirm_hours_bulk(staff.id, [bulk.logID])
+
+    assert [row.studentName for row in view_leaderboard()[0]] == ["Roll One", "Roll Two"]
+    week, _ = view_leaderboard(window='week')
+    assert [(row.rank, row.studentName, row.totalHours) for row in week] == [(1, "Roll Two", 7)]
+    app.config['TERM_START'] = (datetime.utcnow().date() - timedelta(days=500)).isoformat()
+    assert [row.totalHours for row in view_leaderboard(window='term')[0]] == [30, 7]
+
+    LoggedHours.query.get(bulk.logID).setStudentStatus('unconfirmed')
+    assert db.session.get(DailyHours, (s2.id, datetime.utcnow().date())).hours == 5
+    assert rebuild_rollups()[0] == 2
+    assert db.session.get(DailyHours, (s2.id, datetime.utcnow().date())).hours == 5
+
+def test_hours_ledger_running_balances(client):
+    from datetime import timedelta
+    staff, _ = StaffController.create_staff("ledgerstaff", "pass", "Ledger Staff", None)
+    student, _ = StudentController.create_student("ledger1", "pass", "Ledger One", None)
+    logs = [StaffController.log_hours(staff.id, student.id, hours, "Service")[0] for hours in (3, 4, 5)]
+    StaffController.confirm_hours(staff.id, logs[0].logID)
+    StaffController.confirm_hours_bulk(staff.id, [logs[1].logID])
+    logs[1].setStudentStatus('unconfirmed')
+    db.session.commit()
+
+    balance, _ = StudentController.view_balance(student.id)
+    assert (balance['confirmedHours'], balance['pendingHours'], balance['seq']) == (3, 9, 6)
+    entries = HoursLedger.history(student.id)
+    assert [e.kind for e in entries] == ['unconfirmed', 'confirmed', 'confirmed', 'logged', 'logged', 'logged']
+    assert StudentController.view_balance(student.id, entries[0].createdAt - timedelta(days=1))[0]['pendingHours'] == 0
+
+    page = client.get(f'/api/students/{student.id}/ledger?limit=4')
+    assert [e['seq'] for e in page.json] == [6, 5, 4, 3] and page.headers['X-Next-Before'] == '3'
+    rest = client.get(f'/api/students/{student.id}/ledger?limit=4&before=3')
+    assert [e['seq'] for e in rest.json] == [2, 1] and 'X-Next-Before' not in rest.headers
+    assert client.get(f'/api/students/{student.id}/balance').json['confirmedHours'] == 3
+    assert client.get(f'/api/students/{student.id}/balance?as_of=2000-01-01').json['pendingHours'] == 0
+    assert client.get(f'/api/students/{student.id}/balance?as_of=soon').status_code == 400
+    assert client.get('/api/students/999/ledger').status_code == 404
+
+    # The rebuild replays the current state: three logs, one of them confirmed
+    assert rebuild_ledger()[0] == 4
+    rebuilt = HoursLedger.latest(student.id)
+    assert (rebuilt.seq, rebuilt.confirmedBalance, rebuilt.pendingBalance) == (4, 3, 9)
+
+def test_student_listings_use_constant_queries(client):
+    staff, _ = StaffController.create_staff("staff_list", "staffpass", "Staff", "staff@mail.com")
+    for i in range(6):
+        student, _ = StudentController.create_student(f"stu{i}", "pass", f"Student {i}", None)
+        StaffController.log_hours(staff.id, student.id, i + 1, "Service")
+    db.session.expunge_all()
+
+    with count_queries() as statements:
+        students = StudentController.get_students_page(limit=10)
+    assert len(students) == 6 and len(statements) == 3
+    assert students[2]['loggedHours'][0]['hours'] == 3
+
+    summary = StudentController.get_students_page(limit=4, after_id=students[0]['id'], profile='summary')
+    assert [s['username'] for s in summary] == ["stu1", "stu2", "stu3", "stu4"]
+    assert 'loggedHours' not in summary[0]
+
+    response = client.get('/api/students?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r['username'] for r in rows] == [f"stu{i}" for i in range(6)]
+    assert client.get('/api/staff?view=detail').json[0]['hoursConfirmed'] == []
+    assert client.get('/api/staff?view=everything').status_code == 400
+
+def test_accolade_unique_per_milestone(app):
+    s, _ = StudentController.create_student("eve", "evepass", "Eve", "eve@mail.com")
+    db.session.add_all([Accolade(studentID=s.id, milestone=10), Accolade(studentID=s.id, milestone=10)])
+    with pytest.raises(Exception):
+        db.session.commit()
+    db.session.rollback()
+
+def test_accolade_award_skips_concurrent_awards(app, monkeypatch):
+    s, _ = StudentController.create_student("eve", "evepass", "Eve", "eve@mail.com")
+    s.totalHours = 10
+    db.session.add(Accolade(studentID=s.id, milestone=10))
+    db.session.commit()
+    # As if another request awarded the milestone after this one read the existing ones
+    monkeypatch.setattr(db.session, 'scalars', lambda *args, **kwargs: [])
+    assert Accolade.award(s) == [10]
+    monkeypatch.setattr('App.models.user.upsert_insert', lambda dialect: None)
+    assert Accolade.award(s) == [10]
+    monkeypatch.undo()
+    db.session.commit()
+    assert db.session.scalar(db.select(db.func.count()).select_from(Accolade)) == 1
+
 def test_student_accolades(app):
     s, _ = StudentController.create_student("eve", "evepass", "Eve", "eve@mail.com")
     staff, _ = StaffController.create_staff("staff_eve", "staffpass", "Staff Eve", "staff_eve@mail.com")
@@ -66,6 +312,26 @@ def test_student_accolades(app):
     assert accolades is not None
     assert any(a.milestone == 50 for a in accolades)
 
+def test_configured_milestones_and_recompute(app):
+    app.config['ACCOLADE_MILESTONES'] = {"5": "Starter", "20": "Regular"}
+    load_milestones(app)
+    staff, _ = StaffController.create_staff("staff_eve", "staffpass", "Staff Eve", "staff_eve@mail.com")
+    s1, _ = StudentController.create_student("eve", "evepass", "Eve", "eve@mail.com")
+    s2, _ = StudentController.create_student("max", "maxpass", "Max", "max@mail.com")
+    log_entry, _ = StaffController.log_hours(staff.id, s1.id, 6, "Service")
+    StaffController.confirm_hours(staff.id, log_entry.logID)
+    assert [a.get_json()['name'] for a in s1.viewAccolades()] == ["Starter"]
+
+    # Totals changed outside confirmation are picked up by the bulk backfill
+    s1.totalHours = 25
+    s2.totalHours = 21
+    db.session.commit()
+    awarded, _ = recompute_accolades()
+    assert awarded == 3
+    assert [a.milestone for a in s1.viewAccolades()] == [5, 20]
+    assert [a.milestone for a in s2.viewAccolades()] == [5, 20]
+    assert recompute_accolades()[0] == 0
+
 
 """
 STAFF TESTS
@@ -90,3 +356,629 @@ def test_staff_log_and_confirm_hours(app):
     assert confirmed is not None
     assert confirmed.isConfirmed is True
     assert confirmed.hours == 5
+
+def test_confirm_hours_is_guarded_and_incremental(app):
+    staff, _ = StaffController.create_staff("john", "johnpass", "John Doe", "john@mail.com")
+    student, _ = StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    first, _ = StaffController.log_hours(staff.id, student.id, 4, "Morning")
+    second, _ = StaffController.log_hours(staff.id, student.id, 3, "Evening")
+    StaffController.confirm_hours(staff.id, first.logID)
+    StaffController.confirm_hours(staff.id, second.logID)
+    assert student.totalHours == 7
+
+    # A second confirmation of the same entry must not add the hours again
+    assert staff.confirmHours(first) is None
+    assert student.totalHours == 7
+
+def test_reconcile_total_hours(app):
+    staff, _ = StaffController.create_staff("john", "johnpass", "John Doe", "john@mail.com")
+    student, _ = StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    log_entry, _ = StaffController.log_hours(staff.id, student.id, 6, "Service")
+    StaffController.confirm_hours(staff.id, log_entry.logID)
+    student.totalHours = 40
+    db.session.commit()
+
+    drifted, _ = reconcile_total_hours(fix=False)
+    assert [(r.storedHours, r.confirmedHours) for r in drifted] == [(40, 6)]
+    assert student.totalHours == 40
+    reconcile_total_hours()
+    db.session.expire_all()
+    assert student.totalHours == 6
+    assert reconcile_total_hours()[0] == []
+
+def test_confirm_hours_bulk(app):
+    staff, _ = StaffController.create_staff("john", "johnpass", "John Doe", "john@mail.com")
+    s1, _ = StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    s2, _ = StudentController.create_student("bob", "bobpass", "Bob", "bob@mail.com")
+    logs = [StaffController.log_hours(staff.id, s1.id, 4, "Service")[0] for _ in range(3)]
+    logs.append(StaffController.log_hours(staff.id, s2.id, 30, "Drive")[0])
+    StaffController.confirm_hours(staff.id, logs[0].logID)
+
+    log_ids = [log.logID for log in logs] + [9999]
+    result, msg = StaffController.confirm_hours_bulk(staff.id, log_ids, chunk_size=2)
+    assert result['confirmed'] == [log.logID for log in logs[1:]]
+    assert result['skipped'] == [logs[0].logID, 9999]
+    assert s1.totalHours == 12
+    assert s2.totalHours == 30
+    assert [a.milestone for a in s2.viewAccolades()] == [10, 25]
+    assert StaffController.confirm_hours_bulk(staff.id, log_ids)[0]['confirmed'] == []
+
+def test_confirm_hours_bulk_partial_failure(app, monkeypatch):
+    from App.models import Staff
+    staff, _ = StaffController.create_staff("john", "johnpass", "John Doe", "john@mail.com")
+    s1, _ = StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    s2, _ = StudentController.create_student("bob", "bobpass", "Bob", "bob@mail.com")
+    log_ids = [StaffController.log_hours(staff.id, student.id, 4, "Service")[0].logID
+               for student in (s1, s1, s2)]
+    confirm_logs, invalidations = Staff._confirmLogs, []
+    def failing(self, logIDs):
+        if invalidations:
+            raise RuntimeError("disk full")
+        return confirm_logs(self, logIDs)
+    monkeypatch.setattr(Staff, '_confirmLogs', failing)
+    monkeypatch.setattr('App.controllers.user.invalidate_responses', lambda: invalidations.append(1))
+    result, msg = StaffController.confirm_hours_bulk(staff.id, log_ids, chunk_size=2)
+    assert result is None and msg == "Error confirming hours after confirming 2 of 3 entries: disk full"
+    # The committed chunk is kept and its cached responses dropped
+    assert invalidations == [1] and s1.totalHours == 8 and s2.totalHours == 0
+
+def test_confirm_hours_bulk_endpoint(client):
+    staff, _ = StaffController.create_staff("john", "johnpass", "John Doe", "john@mail.com")
+    student, _ = StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    log_entry, _ = StaffController.log_hours(staff.id, student.id, 5, "Service")
+    token = client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'}).json['access_token']
+    response = client.post('/api/hours/confirm', json={'logIds': [log_entry.logID]},
+                           headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 403
+
+    token = client.post('/api/login', json={'username': 'john', 'password': 'johnpass'}).json['access_token']
+    response = client.post('/api/hours/confirm', json={'logIds': [log_entry.logID]},
+                           headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.json['confirmed'] == [log_entry.logID]
+
+
+"""
+IMPORT TESTS
+"""
+def test_import_students_and_hours(app, tmp_path):
+    StudentController.create_student("taken", "takenpass", "Taken", "taken@mail.com")
+    students = tmp_path / "students.csv"
+    students.write_text(
+        "username,password,studentName,studentEmail\n"
+        "amy,amypass,Amy,amy@mail.com\n"
+        "taken,pass,Dup,dup@mail.com\n"
+        "ben,benpass,,ben@mail.com\n"
+        "amy,again,Amy Again,\n"
+        "cal,calpass,Cal,\n"
+    )
+    report, msg = import_students(read_rows(str(students)), chunk_size=2)
+    assert report['created'] == 2
+    assert [line for line, _ in report['errors']] == [3, 4, 5]
+    amy = StudentController.get_student_username("amy")
+    assert amy.check_password("amypass")
+    assert amy.user_type == "student" and amy.totalHours == 0
+
+    staff = tmp_path / "staff.jsonl"
+    staff.write_text('{"username": "sam", "password": "sampass", "staffName": "Sam"}\nnot json\n')
+    report, msg = import_staff(read_rows(str(staff)))
+    assert report['created'] == 1 and report['errors'] == [(2, "Malformed row")]
+
+    hours = tmp_path / "hours.jsonl"
+    hours.write_text(
+        '{"staff": "sam", "student": "amy", "hours": 3, "description": "Cleanup"}\n'
+        '{"staff": "sam", "student": "nobody", "hours": 2}\n'
+        '{"staff": "sam", "student": "cal", "hours": 0}\n'
+    )
+    report, msg = import_hours(read_rows(str(hours)))
+    assert report['created'] == 1
+    assert [line for line, _ in report['errors']] == [2, 3]
+    assert [log.hours for log in amy.loggedHours] == [3]
+
+def test_staff_detail_profile_filters_confirmed_in_sql(app):
+    student, _ = StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    for i in range(3):
+        staff, _ = StaffController.create_staff(f"staff{i}", "pass", f"Staff {i}", None)
+        confirmed, _ = StaffController.log_hours(staff.id, student.id, 2, "Confirmed")
+        StaffController.log_hours(staff.id, student.id, 1, "Pending")
+        StaffController.confirm_hours(staff.id, confirmed.logID)
+    db.session.expunge_all()
+
+    with count_queries() as statements:
+        staff_json = StaffController.get_staff_json()
+    assert len(statements) == 2
+    assert [[log['hours'] for log in s['hoursConfirmed']] for s in staff_json] == [[2], [2], [2]]
+    with count_queries() as statements:
+        summary = StaffController.get_staff_json('summary')
+    assert len(statements) == 1 and 'hoursConfirmed' not in summary[0]
+
+
+"""
+EXPORT TESTS
+"""
+def test_export_streams_filtered_rows(app):
+    import csv, gzip
+    staff, _ = StaffController.create_staff("exporter", "pass", "Export Staff", None)
+    s1, _ = StudentController.create_student("exp1", "pass", "Export One", None)
+    s2, _ = StudentController.create_student("exp2", "pass", "Export Two", None)
+    for student, hours in ((s1, 12), (s2, 3), (s1, 2)):
+        log_entry, _ = StaffController.log_hours(staff.id, student.id, hours, "Service, with comma")
+        StaffController.confirm_hours(staff.id, log_entry.logID)
+
+    rows = list(csv.DictReader(''.join(export_stream('hours', studentId=s1.id)).splitlines()))
+    assert [(row['studentName'], row['hours']) for row in rows] == [("Export One", "12"), ("Export One", "2")]
+    assert rows[0]['description'] == "Service, with comma"
+    from datetime import date
+    assert ''.join(export_stream('hours', end=date(2000, 1, 1))).count('\n') == 1
+
+    accolades = [json.loads(line) for line in export_stream('accolades', 'jsonl')]
+    assert [(a['studentName'], a['name']) for a in accolades] == [("Export One", "Bronze Service Award")]
+
+    board = gzip.decompress(b''.join(export_stream('leaderboard', gzip=True))).decode()
+    assert board.splitlines() == ['rank,studentID,studentName,totalHours',
+                                  f'1,{s1.id},Export One,14', f'2,{s2.id},Export Two,3']
+    with pytest.raises(ValueError):
+        export_stream('passwords')
+
+def test_export_endpoint_is_staff_only(client):
+    StaffController.create_staff("exportstaff", "pass", "Export Staff", None)
+    StudentController.create_student("exportstudent", "pass", "Export Student", None)
+    token = client.post('/api/login', json={'username': 'exportstudent', 'password': 'pass'}).json['access_token']
+    assert client.get('/api/export/hours', headers={'Authorization': f'Bearer {token}'}).status_code == 403
+
+    token = client.post('/api/login', json={'username': 'exportstaff', 'password': 'pass'}).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.get('/api/export/leaderboard?format=jsonl', headers=headers)
+    assert response.status_code == 200 and 'attachment' in response.headers['Content-Disposition']
+    assert json.loads(response.data.decode().splitlines()[0])['studentName'] == "Export Student"
+    assert client.get('/api/export/leaderboard?window=term', headers=headers).status_code == 400
+
+def test_analytics_percentiles():
+    import heapq, random
+    from array import array
+    from App.controllers import percentiles
+    rng = random.Random(3)
+    columns = [array('d', sorted(rng.expovariate(1 / 40) for _ in range(2000))) for _ in range(3)]
+    ordered = sorted(value for column in columns for value in column)
+    exact = {}
+    for p in (1, 50, 99):
+        rank = (len(ordered) - 1) * p / 100
+        exact[p] = ordered[int(rank)] + (ordered[int(rank) + 1] - ordered[int(rank)]) * (rank - int(rank))
+    # One merged walk over the sorted arrays matches sorting everything
+    assert percentiles(heapq.merge(*columns), len(ordered), (1, 50, 99)) == exact
+    assert percentiles(array('q', [0, 0, 5, 12, 30]), 5, (50, 75)) == {50: 5, 75: 12}
+    assert percentiles(array('d', [7.0]), 1, (10, 99)) == {10: 7.0, 99: 7.0}
+
+def test_hours_analytics_report(client):
+    from datetime import datetime, timedelta
+    from App.controllers import hours_analytics
+    staff, _ = StaffController.create_staff("statstaff", "pass", "Stat Staff", None)
+    students = [StudentController.create_student(f"stat{i}", "pass", f"Stat {i}", None)[0] for i in range(4)]
+    for student, hours in zip(students, (5, 12, 30)):
+        log, _ = StaffController.log_hours(staff.id, student.id, hours, "Service")
+        StaffController.confirm_hours(staff.id, log.logID)
+        # Confirmed a day and a half after it was logged, on a Wednesday
+        log.logDate, log.dateConfirmed = datetime(2026, 3, 2, 12), datetime(2026, 3, 4)
+    StaffController.log_hours(staff.id, students[3].id, 2, "Pending")
+    db.session.commit()
+
+    report, message = hours_analytics()
+    assert report['entries'] == 4 and message == "Analysed 4 logged hours entries"
+    hours = report['studentHours']
+    assert (hours['count'], hours['max'], hours['percentiles']['p50']) == (4, 30, 8.5)
+    assert [b['students'] for b in hours['histogram']] == [2, 1, 1, 0]
+    latency = report['confirmationLatencyHours']
+    assert latency['overall']['percentiles']['p90'] == 36.0
+    assert latency['staff'][0]['staffName'] == "Stat Staff" and latency['staff'][0]['count'] == 3
+    assert report['weeklyVolume'][0] == {'week': '2026-03-02', 'entries': 3, 'loggedHours': 47,
+                                         'confirmedHours': 47}
+    assert hours_analytics(end=datetime(2026, 3, 1).date())[0]['entries'] == 0
+
+    token = client.post('/api/login', json={'username': 'stat0', 'password': 'pass'}).json['access_token']
+    assert client.get('/api/admin/analytics', headers={'Authorization': f'Bearer {token}'}).status_code == 403
+    token = client.post('/api/login', json={'username': 'statstaff', 'password': 'pass'}).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/admin/analytics?from=2026-03-02&to=2026-03-08', headers=headers).json['entries'] == 3
+    assert client.get('/api/admin/analytics?from=March', headers=headers).status_code == 400
+
+def test_write_behind_buffer_batches_logged_hours(tmp_path):
+    from App.models import LoggedHours, HoursLedger
+    from App.controllers import replay_buffered_hours
+    dead_letter = tmp_path / 'dead.jsonl'
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                      'PASSWORD_HASH_PROFILE': 'fast', 'HOURS_WRITE_BUFFER': True,
+                      'HOURS_BUFFER_SIZE': 3, 'HOURS_BUFFER_INTERVAL': 0, 'HOURS_DEAD_LETTER': str(dead_letter)})
+    with app.app_context():
+        create_db()
+        staff, _ = StaffController.create_staff("bufstaff", "pass", "Buffer Staff", None)
+        student, _ = StudentController.create_student("bufstudent", "pass", "Buffer Student", None)
+        buffer = app.extensions['hours_buffer']
+        queued = [StaffController.log_hours(staff.id, student.id, 2, "Queued", durable=False) for _ in range(2)]
+        assert [message for _, message in queued] == ["Queued hours for logging"] * 2
+        assert queued[0][0].logID is None and db.session.scalar(db.select(db.func.count(LoggedHours.logID))) == 0
+
+        # A durable call writes only its own entry
+        log, message = StaffController.log_hours(staff.id, student.id, 5, "Durable")
+        assert message == "Logged hours successfully" and log.logID == 1
+        assert len(buffer) == 2 and buffer.flushes == 0
+        # and its failure is reported, not queued for a later flush
+        with pytest.raises(Exception):
+            buffer.log(staff.id, student.id, None, "Bad durable", durable=True)
+        assert len(buffer) == 2
+
+        # The third queued entry fills the buffer, which flushes in one transaction
+        third, _ = StaffController.log_hours(staff.id, student.id, 2, "Queued", durable=False)
+        assert buffer.flushes == 1 and [q.logID for q, _ in queued] + [third.logID] == [2, 3, 4]
+        assert HoursLedger.latest(student.id).pendingBalance == 11
+        # Stamped when written, not when queued, so as-of lookups follow the ledger order
+        entries = HoursLedger.history(student.id)[::-1]
+        assert [e.createdAt for e in entries] == sorted(e.createdAt for e in entries)
+
+        # An entry that cannot be written is dead-lettered, not dropped, and the rest still land
+        buffer.log(staff.id, student.id, None, "Bad")
+        good = buffer.log(staff.id, student.id, 1, "Good")
+        assert buffer.flush() == [good] and buffer.dead_lettered == 1
+        assert json.loads(dead_letter.read_text())['description'] == "Bad"
+        assert replay_buffered_hours()[0] == {'written': 0, 'failed': 1}
+        record = json.loads(dead_letter.read_text())
+        dead_letter.write_text(json.dumps({**record, 'hours': 3}) + '\n')
+        assert replay_buffered_hours()[0] == {'written': 1, 'failed': 0} and dead_letter.read_text() == ''
+
+        client = app.test_client()
+        token = client.post('/api/login', json={'username': 'bufstaff', 'password': 'pass'}).json['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+        response = client.post('/api/hours', json={'studentId': student.id, 'hours': 1}, headers=headers)
+        assert response.status_code == 202 and response.json['logID'] is None
+        # The interval is 0, so the request's teardown found the buffer due
+        assert len(buffer) == 0 and db.session.get(LoggedHours, 7).hours == 1
+        response = client.post('/api/hours', json={'studentId': student.id, 'hours': 1, 'durable': True},
+                               headers=headers)
+        assert response.status_code == 201 and response.json['logID'] == 8
+
+def test_idempotency_keys_replay_without_writes(client):
+    from App.models import Student, LoggedHours, ConfirmRequest, IdempotencyKey
+    staff, _ = StaffController.create_staff("idemstaff", "pass", "Idem Staff", None)
+    student, _ = StudentController.create_student("idemstudent", "pass", "Idem Student", None)
+    first, _ = StaffController.log_hours(staff.id, student.id, 3, "Retry me", idempotencyKey="k1")
+    again, message = StaffController.log_hours(staff.id, student.id, 3, "Retry me", idempotencyKey="k1")
+    assert again.logID == first.logID and message == "Logged hours successfully"
+    assert db.session.scalar(db.select(db.func.count(LoggedHours.logID))) == 1
+    assert StaffController.log_hours(staff.id, student.id, 4, "Changed", idempotencyKey="k1") == \
+        (None, "Idempotency key was already used with different arguments")
+
+    # Replays are served from the front cache; a cold cache falls back to the table
+    app = client.application
+    with count_queries() as statements:
+        StaffController.log_hours(staff.id, student.id, 3, "Retry me", idempotencyKey="k1")
+    assert not [s for s in statements if 'INSERT' in s or 'idempotencyKey' in s]
+    app.extensions['idempotency_cache'].clear()
+    assert StaffController.confirm_hours(staff.id, first.logID, idempotencyKey="c1")[0].isConfirmed
+    app.extensions['idempotency_cache'].clear()
+    confirmed, message = StaffController.confirm_hours(staff.id, first.logID, idempotencyKey="c1")
+    assert confirmed.logID == first.logID and message == "Hours confirmed successfully"
+    assert StaffController.confirm_hours(staff.id, first.logID) == (None, "Hours already confirmed")
+
+    # Failed calls release their key
+    assert StaffController.log_hours(staff.id, 999, 1, "Nobody", idempotencyKey="k2")[0] is None
+    assert db.session.scalar(db.select(db.func.count()).select_from(IdempotencyKey)) == 2
+
+    # A claim left unfinished by a dead worker blocks retries only for the lease
+    from datetime import datetime, timedelta
+    from App.idempotency import _digest
+    claimed = datetime.utcnow() - timedelta(seconds=5)
+    db.session.add(IdempotencyKey(keyHash=_digest('log_hours', staff.id, "k3"), fingerprint="x",
+                                  claimedAt=claimed, expiresAt=claimed + timedelta(days=1)))
+    db.session.commit()
+    app = client.application
+    app.config['IDEMPOTENCY_LEASE'] = 60
+    assert StaffController.log_hours(staff.id, student.id, 1, "Late", idempotencyKey="k3")[1] == \
+        "A request with this idempotency key is still in progress"
+    app.config['IDEMPOTENCY_LEASE'] = 2
+    assert StaffController.log_hours(staff.id, student.id, 1, "Late", idempotencyKey="k3")[0].hours == 1
+
+    token = client.post('/api/login', json={'username': 'idemstudent', 'password': 'pass'}).json['access_token']
+    pending, _ = StaffController.log_hours(staff.id, student.id, 2, "Pending")
+    headers = {'Authorization': f'Bearer {token}'}
+    responses = [client.post(f'/api/hours/{pending.logID}/confirm-request', headers=headers) for _ in range(2)]
+    assert responses[0].json['requestID'] == responses[1].json['requestID']
+    assert db.session.scalar(db.select(db.func.count(ConfirmRequest.requestID))) == 1
+
+    token = client.post('/api/login', json={'username': 'idemstaff', 'password': 'pass'}).json['access_token']
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'bulk-1'}
+    first = client.post('/api/hours/confirm', json={'logIds': [pending.logID]}, headers=headers)
+    retry = client.post('/api/hours/confirm', json={'logIds': [pending.logID]}, headers=headers)
+    assert first.json == retry.json and retry.json['confirmed'] == [pending.logID]
+    assert client.post('/api/hours/confirm', json={'logIds': [1, 2]}, headers=headers).status_code == 409
+    assert db.session.get(Student, student.id).totalHours == 5
+
+
+"""
+BENCHMARK TESTS
+"""
+def test_index_benchmark_uses_indexes(app):
+    report = run_index_benchmark(students=20, logs_per_student=3, repeat=5)
+    for name, variants in report['queries'].items():
+        assert any('SCAN' in step for step in variants['without_indexes']['plan'])
+        assert any('INDEX' in step for step in variants['with_indexes']['plan'])
+
+def test_seed_and_path_benchmarks(app):
+    summary = seed_synthetic(students=30, staff=3, logs=300, seed=1)
+    assert summary['loggedHours'] == 300
+    assert reconcile_total_hours(fix=False)[0] == []
+    # Skewed: the first student holds more history than the last
+    counts = [len(StudentController.get_student(summary['firstStudentID'] + i).loggedHours) for i in (0, 29)]
+    assert counts[0] > counts[1]
+
+    report = run_path_benchmarks(repeat=2)
+    assert report['rows'] == {'students': 30, 'loggedHours': 300}
+    assert {'view_leaderboard_cold', 'login', 'confirm_hours', 'api_users_page'} <= set(report['paths'])
+    assert report['paths']['view_leaderboard_warm']['queries_per_call'] == 0
+    json.dumps(report)
+
+def test_load_driver_with_test_client(app):
+    report = run_load(['/health', '/api/users'], requests=20, threads=4, app=app)
+    assert report['statuses'] == {'200': 20}
+    assert report['latency']['runs'] == 20
+
+
+def test_cli_profile_skips_web_only_subsystems():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                      'PASSWORD_HASH_PROFILE': 'fast', 'APP_PROFILE': 'cli'})
+    assert 'admin' not in app.extensions and 'flask-jwt-extended' in app.extensions
+    assert not any(rule.rule.startswith('/admin') for rule in app.url_map.iter_rules())
+
+def test_parse_importtime():
+    report = parse_importtime("""import time: self [us] | cumulative | imported package
+import time:      1500 |       1500 |     sqlalchemy.sql
+import time:       500 |       2000 |   sqlalchemy
+import time:       250 |        250 | App.models""")
+    assert report['total_ms'] == 2.2
+    assert report['packages'] == [{'package': 'sqlalchemy', 'ms': 2.0}, {'package': 'App', 'ms': 0.2}]
+
+
+"""
+CONFIRMATION QUEUE TESTS
+"""
+def test_confirmation_queue_claims_and_processes(app):
+    staff, _ = StaffController.create_staff("john", "johnpass", "John Doe", "john@mail.com")
+    student, _ = StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    logs = [StaffController.log_hours(staff.id, student.id, 4, "Service")[0] for _ in range(4)]
+    requests = [StudentController.request_confirmation(student.id, log.logID)[0] for log in logs]
+
+    first, _ = claim_confirm_requests(staff.id, limit=3)
+    second, _ = claim_confirm_requests(staff.id, limit=3)
+    assert [r.requestID for r in first['requests']] == [r.requestID for r in requests[:3]]
+    assert [r.requestID for r in second['requests']] == [requests[3].requestID]
+    assert confirm_queue_stats()[0]['depth']['claimed'] == 4
+
+    # Another worker's token cannot decide these requests
+    result, _ = process_confirm_requests(staff.id, second['token'], approveIds=[requests[0].requestID])
+    assert result['approved'] == []
+
+    ids = [r.requestID for r in first['requests']]
+    result, _ = process_confirm_requests(staff.id, first['token'], approveIds=ids[:2], rejectIds=ids[2:])
+    assert result['approved'] == ids[:2] and result['rejected'] == ids[2:]
+    assert result['confirmedLogs'] == [logs[0].logID, logs[1].logID]
+    assert student.totalHours == 8
+    assert requests[0].status == 'approved' and requests[0].processedBy == staff.id
+
+    # Releasing a claim without a decision puts it back in the queue
+    process_confirm_requests(staff.id, second['token'])
+    stats, _ = confirm_queue_stats()
+    assert stats['depth'] == {'pending': 1, 'claimed': 0, 'approved': 2, 'rejected': 1}
+    assert stats['processedInWindow'] == 3
+
+def test_confirmation_queue_stats_endpoint_is_staff_only(client):
+    StaffController.create_staff("john", "johnpass", "John Doe", "john@mail.com")
+    StudentController.create_student("alice", "alicepass", "Alice", "alice@mail.com")
+    token = client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'}).json['access_token']
+    response = client.get('/api/confirm-requests/stats', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 403
+
+    token = client.post('/api/login', json={'username': 'john', 'password': 'johnpass'}).json['access_token']
+    response = client.get('/api/confirm-requests/stats', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200 and response.json['depth']['pending'] == 0
+
+
+"""
+INSTRUMENTATION TESTS
+"""
+def test_statement_shape_ignores_values():
+    assert statement_shape("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'bob'") == \
+        statement_shape("SELECT * FROM t WHERE id IN (?) AND name = 'alice'")
+
+def test_instrumentation_counts_queries_and_flags_n_plus_one():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                      'PASSWORD_HASH_PROFILE': 'fast', 'INSTRUMENTATION': True,
+                      'INSTRUMENTATION_DEBUG_HEADER': True, 'INSTRUMENTATION_N_PLUS_ONE_THRESHOLD': 3})
+
+    @app.route('/test/lazy-hours')
+    def lazy_hours():
+        from App.models import Student
+        return {'hours': [len(student.loggedHours) for student in Student.query.all()]}
+
+    with app.app_context():
+        create_db()
+        for i in range(4):
+            StudentController.create_student(f"stu{i}", "pass", f"Student {i}", None)
+        db.session.expunge_all()
+        client = app.test_client()
+        assert client.get('/api/users').headers['X-Query-Count'] == '1'
+        assert client.get('/test/lazy-hours').headers['X-Query-Count'] == '5'
+
+        body = client.get('/metrics').data.decode()
+        assert 'http_request_duration_seconds_count{endpoint="user_views.get_users_action",method="GET"} 1' in body
+        assert 'sql_n_plus_one_total{endpoint="lazy_hours",method="GET"} 1' in body
+        assert 'sql_n_plus_one_total{endpoint="user_views.get_users_action"' not in body
+        assert 'confirm_queue_depth{status="pending"} 0' in body
+
+        # A statement that raises leaves no timing state on the pooled connection
+        from sqlalchemy.exc import OperationalError
+        from App.instrumentation import begin_request_stats
+        stats = begin_request_stats()
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql("SELECT * FROM missing_table")
+            conn.exec_driver_sql("SELECT 1")
+            assert not any(key.startswith('instrumentation') for key in conn.info)
+        assert stats['count'] == 1
+
+
+"""
+DATABASE ENGINE TESTS
+"""
+def test_engine_profiles():
+    name, options = engine_profile('postgresql://app@localhost/app', {'DB_POOL_SIZE': 20})
+    assert name == 'postgresql'
+    assert options['pool_size'] == 20 and options['pool_pre_ping'] is True
+    name, options = engine_profile('postgresql://app@localhost/app',
+                                   {'SQLALCHEMY_ENGINE_OPTIONS': {'pool_recycle': 60}})
+    assert options['pool_recycle'] == 60 and options['max_overflow'] == 10
+    assert engine_profile('sqlite:///:memory:', {}) == ('sqlite', {})
+
+def test_sqlite_pragmas_applied(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+                      'PASSWORD_HASH_PROFILE': 'fast', 'SQLITE_PRAGMAS': {'busy_timeout': 7000}})
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == 'wal'
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 7000
+
+def test_read_replica_routing(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+                      'SQLALCHEMY_REPLICA_URI': f"sqlite:///{tmp_path / 'replica.db'}",
+                      'PASSWORD_HASH_PROFILE': 'fast', 'INSTRUMENTATION': True,
+                      'INSTRUMENTATION_DEBUG_HEADER': True})
+    with app.app_context():
+        create_db()
+        db.metadata.create_all(app.extensions['replica_engine'])
+        StudentController.create_student("primary", "pass", "Primary Student", "primary@example.com")
+        # Outside a request the write only pins this session until its transaction ends
+        assert StudentController.get_students_json() == []
+        db.session.execute(db.update(Student).values(totalHours=1))
+        assert len(StudentController.get_students_json()) == 1
+        db.session.rollback()
+        assert StudentController.get_students_json() == []
+    with app.test_request_context():
+        # Inside a request a committed write keeps its reads on the primary until the request ends
+        StudentController.create_student("second", "pass", "Second Student", None)
+        assert len(StudentController.get_students_json()) == 2
+    with app.app_context():
+        # A fresh session reads the (empty) replica and writes still go to the primary
+        assert StudentController.get_students_json() == []
+        assert StudentController.get_student_username("primary") is not None
+    with app.test_request_context(headers={'X-Read-Your-Writes': '1'}):
+        assert len(StudentController.get_students_json()) == 2
+    with app.app_context():
+        # Replica reads are counted like primary ones
+        response = app.test_client().get('/api/users')
+        assert response.get_json() == [] and response.headers['X-Query-Count'] == '1'
+
+
+"""
+RESPONSE CACHE TESTS
+"""
+@pytest.mark.parametrize('backend', ['memory', 'filesystem'])
+def test_response_cache_etags_and_invalidation(backend, tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                      'PASSWORD_HASH_PROFILE': 'fast', 'RESPONSE_CACHE': backend,
+                      'RESPONSE_CACHE_DIR': str(tmp_path / 'responses')})
+    with app.app_context():
+        create_db()
+        student, _ = StudentController.create_student("cached", "pass", "Cached Student", None)
+        staff, _ = StaffController.create_staff("cachestaff", "pass", "Cache Staff", None)
+        client = app.test_client()
+
+        first = client.get('/api/leaderboard')
+        assert first.status_code == 200 and first.json[0]['studentName'] == "Cached Student"
+        etag = first.headers['ETag']
+        with count_queries() as statements:
+            repeat = client.get('/api/leaderboard', headers={'If-None-Match': etag})
+        assert repeat.status_code == 304 and statements == []
+
+        log_entry, _ = StaffController.log_hours(staff.id, student.id, 12, "Service")
+        StaffController.confirm_hours(staff.id, log_entry.logID)
+        fresh = client.get('/api/leaderboard', headers={'If-None-Match': etag})
+        assert fresh.status_code == 200 and fresh.headers['ETag'] != etag
+        assert fresh.json[0]['totalHours'] == 12
+
+        accolades = client.get(f'/api/students/{student.id}/accolades')
+        assert [a['milestone'] for a in accolades.json] == [10]
+        assert client.get('/api/students/999/accolades').status_code == 404
+        assert client.get('/api/leaderboard?window=week').json[0]['totalHours'] == 12
+        assert client.get('/api/leaderboard?window=term').status_code == 400
+
+        if backend == 'filesystem':
+            # Invalidations overwrite entries in place instead of orphaning files
+            directory = tmp_path / 'responses'
+            before = len(list(directory.iterdir()))
+            for hours in (1, 2):
+                StaffController.log_hours(staff.id, student.id, hours, "More")
+                client.get('/api/leaderboard')
+            assert len(list(directory.iterdir())) == before
+        # Evicting or pruning every entry keeps the data version, so ETags still match
+        etag = client.get('/api/leaderboard').headers['ETag']
+        if backend == 'filesystem':
+            app.extensions['response_cache'].prune(max_age=0)
+            assert [path.name for path in directory.iterdir()] == ['version']
+        else:
+            app.extensions['response_cache'].clear()
+        assert client.get('/api/leaderboard', headers={'If-None-Match': etag}).status_code == 304
+        # Last-Modified only has whole seconds, so If-Modified-Since alone never answers 304
+        modified = fresh.headers['Last-Modified']
+        assert client.get('/api/leaderboard', headers={'If-Modified-Since': modified}).status_code == 200
+
+
+"""
+ASYNC API TESTS
+"""
+def test_async_api_matches_sync_views(tmp_path):
+    import asyncio
+    from App.async_api import AsyncAPI
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+                      'PASSWORD_HASH_PROFILE': 'fast', 'API_PAGE_SIZE': 2, 'RESPONSE_CACHE': 'memory',
+                      'INSTRUMENTATION': True})
+    with app.app_context():
+        create_db()
+        staff, _ = StaffController.create_staff("asyncstaff", "pass", "Async Staff", None)
+        student, _ = StudentController.create_student("asyncstudent", "pass", "Async Student", None)
+        log_entry, _ = StaffController.log_hours(staff.id, student.id, 11, "Service")
+        StaffController.confirm_hours(staff.id, log_entry.logID)
+        application = AsyncAPI(app)
+        client = app.test_client()
+
+        def get(path, headers=()):
+            status, response_headers, body = asyncio.run(asgi_get(application, path, headers))
+            return status, response_headers, body
+        # Async requests are measured under the sync view's endpoint, SQL included
+        accolades = f'/api/students/{student.id}/accolades'
+        assert get(accolades)[0] == 200
+        metrics = client.get('/metrics').data.decode()
+        assert 'sql_statements_total{endpoint="user_views.get_student_accolades_action",method="GET"} 2' in metrics
+        # and share the sync views' cache entries, so either tier answers a revalidation
+        etag = client.get(accolades).headers['ETag']
+        status, headers, body = get(accolades, [('If-None-Match', etag)])
+        assert (status, headers['etag'], body) == (304, etag, b'')
+        assert client.get(accolades, headers={'If-None-Match': get(accolades)[1]['etag']}).status_code == 304
+        # Both read parameters the same way: a bad after_id keeps the limit, a bad top is rejected
+        for path, expected in (('/api/users?limit=1&after_id=abc', 200), ('/api/leaderboard?top=abc', 400)):
+            status, headers, body = get(path)
+            response = client.get(path)
+            assert (status, json.loads(body)) == (response.status_code, response.json) and status == expected, path
+        assert len(client.get('/api/users?limit=1&after_id=abc').json) == 1
+
+        for path in ('/health', '/api/users', '/api/users?after_id=1', '/api/leaderboard?top=5',
+                     '/api/leaderboard?window=week', f'/api/students/{student.id}/accolades'):
+            status, headers, body = get(path)
+            assert (status, json.loads(body)) == (200, client.get(path).json), path
+        assert get('/api/users')[1]['x-next-after-id'] == '2'
+        assert get('/api/leaderboard?window=term')[0] == 400
+        assert get('/api/students/999/accolades')[0] == 404
+        # Everything else is served by the Flask app
+        status, headers, body = get('/api/users?format=ndjson')
+        assert status == 200 and len(body.decode().splitlines()) == 2
+
+        report = run_async_load(application, ['/health', '/api/users'], requests=20, concurrency=5)
+        assert report['statuses'] == {'200': 20}
+        asyncio.run(application.engine.dispose())
@@ -4,6 +4,8 @@ from flask_admin import Admin
 from flask import flash, redirect, url_for, request
 from App.database import db
 from App.models import User
+from App.controllers import invalidate_user
+from App.response_cache import invalidate_responses
 
 class AdminView(ModelView):
 
@@ -11,6 +13,14 @@ class AdminView(ModelView):
     def is_accessible(self):
         return current_user is not None
 
+    def after_model_change(self, form, model, is_created):
+        invalidate_user(model.id)
+        invalidate_responses()
+
+    def after_model_delete(self, model):
+        invalidate_user(model.id)
+        invalidate_responses()
+
     def inaccessible_callback(self, name, **kwargs):
         # redirect to login page if user doesn't have access
         flash("Login to access admin")
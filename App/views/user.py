@@ -1,17 +1,50 @@
-from flask import Blueprint, render_template, jsonify, request, send_from_directory, flash, redirect, url_for
+import json
+from datetime import datetime
+from functools import partial
+from flask import Blueprint, render_template, jsonify, request, send_from_directory, flash, redirect, url_for, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, current_user as jwt_current_user
 
 from.index import index_views
 
+from App.models import Student, Staff, Leaderboard
+from App.response_cache import cached_response
+from App.idempotency import IDEMPOTENCY_HEADER, idempotency_status
 from App.controllers import (
     create_user,
     get_all_users,
     get_all_users_json,
+    get_users_page,
+    iter_pages,
+    page_args,
+    leaderboard_top,
+    leaderboard_json,
+    StudentController,
+    StaffController,
+    view_leaderboard,
+    claim_confirm_requests,
+    process_confirm_requests,
+    confirm_queue_stats,
+    export_stream,
+    parse_date,
+    parse_as_of,
+    hours_analytics,
     jwt_required
 )
 
 user_views = Blueprint('user_views', __name__, template_folder='../templates')
 
+def listing_response(fetch_page):
+    """Serve a keyset-paginated listing as a JSON page or a streamed NDJSON body"""
+    limit, after_id = page_args(request.args)
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        lines = (json.dumps(item) + '\n' for item in iter_pages(fetch_page, after_id=after_id))
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    items = fetch_page(limit, after_id)
+    response = jsonify(items)
+    if len(items) == limit:
+        response.headers['X-Next-After-Id'] = str(items[-1]['id'])
+    return response
+
 @user_views.route('/users', methods=['GET'])
 def get_user_page():
     users = get_all_users()
@@ -25,9 +58,73 @@ def create_user_action():
     return redirect(url_for('user_views.get_user_page'))
 
 @user_views.route('/api/users', methods=['GET'])
+@cached_response
 def get_users_action():
-    users = get_all_users_json()
-    return jsonify(users)
+    return listing_response(get_users_page)
+
+@user_views.route('/api/students', methods=['GET'])
+@cached_response
+def get_students_action():
+    profile = request.args.get('view', 'summary')
+    if profile not in Student.profiles:
+        return jsonify({'message': f"Unknown view {profile}"}), 400
+    return listing_response(partial(StudentController.get_students_page, profile=profile))
+
+@user_views.route('/api/staff', methods=['GET'])
+@cached_response
+def get_staff_action():
+    profile = request.args.get('view', 'summary')
+    if profile not in Staff.profiles:
+        return jsonify({'message': f"Unknown view {profile}"}), 400
+    return listing_response(partial(StaffController.get_staff_page, profile=profile))
+
+@user_views.route('/api/leaderboard', methods=['GET'])
+@cached_response
+def get_leaderboard_action():
+    window = request.args.get('window')
+    try:
+        top = leaderboard_top(request.args)
+        if window:
+            Leaderboard.windowBounds(window)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    rankings, message = view_leaderboard(top, window)
+    if rankings is None:
+        return jsonify({'message': message}), 500
+    return jsonify(leaderboard_json(rankings))
+
+@user_views.route('/api/students/<int:student_id>/accolades', methods=['GET'])
+@cached_response
+def get_student_accolades_action(student_id):
+    if not StudentController.get_student(student_id):
+        return jsonify({'message': "Student not found"}), 404
+    accolades, message = StudentController.view_accolades(student_id)
+    return jsonify([accolade.get_json() for accolade in accolades])
+
+@user_views.route('/api/students/<int:student_id>/ledger', methods=['GET'])
+@cached_response
+def get_student_ledger_action(student_id):
+    limit = request.args.get('limit', current_app.config.get('API_PAGE_SIZE', 100), type=int)
+    limit = max(1, min(limit, current_app.config.get('API_MAX_PAGE_SIZE', 1000)))
+    entries, message = StudentController.view_ledger(student_id, limit, request.args.get('before', type=int))
+    if entries is None:
+        return jsonify({'message': message}), 404
+    response = jsonify([entry.get_json() for entry in entries])
+    if len(entries) == limit and entries[-1].seq > 1:
+        response.headers['X-Next-Before'] = str(entries[-1].seq)
+    return response
+
+@user_views.route('/api/students/<int:student_id>/balance', methods=['GET'])
+@cached_response
+def get_student_balance_action(student_id):
+    try:
+        asOf = parse_as_of(request.args.get('as_of'))
+    except ValueError:
+        return jsonify({'message': "as_of must be an ISO date or datetime"}), 400
+    balance, message = StudentController.view_balance(student_id, asOf)
+    if balance is None:
+        return jsonify({'message': message}), 404
+    return jsonify(balance)
 
 @user_views.route('/api/users', methods=['POST'])
 def create_user_endpoint():
@@ -35,6 +132,132 @@ def create_user_endpoint():
     user = create_user(data['username'], data['password'], 'student')
     return jsonify({'message': f"user {user.username} created with id {user.id}"})
 
+@user_views.route('/api/hours', methods=['POST'])
+@jwt_required()
+def log_hours_endpoint():
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can log hours'}), 403
+    data = request.json or {}
+    if not isinstance(data.get('studentId'), int) or not isinstance(data.get('hours'), int):
+        return jsonify({'message': 'studentId and hours must be integers'}), 400
+    # Keyed requests are written before answering so a retry can get the same logID back
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    log_entry, message = StaffController.log_hours(jwt_current_user.id, data['studentId'], data['hours'],
+                                                   data.get('description'), bool(data.get('durable') or key),
+                                                   idempotencyKey=key)
+    if log_entry is None:
+        return jsonify({'message': message}), idempotency_status(message)
+    # 202 while the entry waits in the write-behind buffer
+    return jsonify({'message': message, **log_entry.get_json()}), 201 if log_entry.logID else 202
+
+@user_views.route('/api/hours/confirm', methods=['POST'])
+@jwt_required()
+def confirm_hours_bulk_endpoint():
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can confirm hours'}), 403
+    data = request.json or {}
+    log_ids = data.get('logIds')
+    if not isinstance(log_ids, list):
+        return jsonify({'message': 'logIds must be a list of log IDs'}), 400
+    chunk_size = data.get('chunkSize', current_app.config.get('CONFIRM_CHUNK_SIZE', 500))
+    result, message = StaffController.confirm_hours_bulk(jwt_current_user.id, log_ids, chunk_size,
+                                                         idempotencyKey=request.headers.get(IDEMPOTENCY_HEADER))
+    if result is None:
+        return jsonify({'message': message}), idempotency_status(message)
+    return jsonify({'message': message, **result})
+
+@user_views.route('/api/hours/<int:log_id>/confirm', methods=['POST'])
+@jwt_required()
+def confirm_hours_endpoint(log_id):
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can confirm hours'}), 403
+    log_entry, message = StaffController.confirm_hours(jwt_current_user.id, log_id,
+                                                       idempotencyKey=request.headers.get(IDEMPOTENCY_HEADER))
+    if log_entry is None:
+        return jsonify({'message': message}), idempotency_status(message)
+    return jsonify({'message': message, **log_entry.get_json()})
+
+@user_views.route('/api/hours/<int:log_id>/confirm-request', methods=['POST'])
+@jwt_required()
+def request_confirmation_endpoint(log_id):
+    if jwt_current_user.user_type != 'student':
+        return jsonify({'message': 'Only students can request confirmation'}), 403
+    confirm_request, message = StudentController.request_confirmation(
+        jwt_current_user.id, log_id, idempotencyKey=request.headers.get(IDEMPOTENCY_HEADER))
+    if confirm_request is None:
+        return jsonify({'message': message}), idempotency_status(message)
+    return jsonify({'message': message, **confirm_request.get_json()}), 201
+
+@user_views.route('/api/confirm-requests/claim', methods=['POST'])
+@jwt_required()
+def claim_confirm_requests_endpoint():
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can review confirmation requests'}), 403
+    limit = (request.json or {}).get('limit', 50) if request.is_json else 50
+    result, message = claim_confirm_requests(jwt_current_user.id, limit)
+    if result is None:
+        return jsonify({'message': message}), 400
+    return jsonify({'message': message, 'token': result['token'],
+                    'requests': [r.get_json() for r in result['requests']]})
+
+@user_views.route('/api/confirm-requests/process', methods=['POST'])
+@jwt_required()
+def process_confirm_requests_endpoint():
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can review confirmation requests'}), 403
+    data = request.json or {}
+    if not data.get('token'):
+        return jsonify({'message': 'token is required'}), 400
+    result, message = process_confirm_requests(jwt_current_user.id, data['token'],
+                                               data.get('approve', []), data.get('reject', []))
+    if result is None:
+        return jsonify({'message': message}), 400
+    return jsonify({'message': message, **result})
+
+@user_views.route('/api/confirm-requests/stats', methods=['GET'])
+@jwt_required()
+def confirm_queue_stats_endpoint():
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can review confirmation requests'}), 403
+    stats, message = confirm_queue_stats()
+    if stats is None:
+        return jsonify({'message': message}), 500
+    return jsonify(stats)
+
+@user_views.route('/api/export/<kind>', methods=['GET'])
+@jwt_required()
+def export_endpoint(kind):
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can export data'}), 403
+    format = request.args.get('format', 'csv')
+    gzip = request.args.get('gzip', type=int) == 1
+    try:
+        chunks = export_stream(kind, format, gzip,
+                               start=parse_date(request.args.get('from')),
+                               end=parse_date(request.args.get('to')),
+                               studentId=request.args.get('student', type=int),
+                               window=request.args.get('window'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    filename = f"{kind}-{datetime.utcnow():%Y%m%d}.{format}" + ('.gz' if gzip else '')
+    mimetype = 'application/gzip' if gzip else ('text/csv' if format == 'csv' else 'application/x-ndjson')
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@user_views.route('/api/admin/analytics', methods=['GET'])
+@jwt_required()
+def analytics_endpoint():
+    if jwt_current_user.user_type != 'staff':
+        return jsonify({'message': 'Only staff can view analytics'}), 403
+    try:
+        start, end = parse_date(request.args.get('from')), parse_date(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    report, message = hours_analytics(start, end)
+    if report is None:
+        return jsonify({'message': message}), 500
+    return jsonify(report)
+
 @user_views.route('/static/users', methods=['GET'])
 def static_user_page():
   return send_from_directory('static', 'static-user.html')
\ No newline at end of file
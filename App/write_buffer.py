@@ -0,0 +1,206 @@
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from App.database import db
+from App.models import LoggedHours
+from App.response_cache import invalidate_responses
+
+DEAD_LETTER_FIELDS = ('staffID', 'studentID', 'hours', 'description')
+
+
+class HoursBuffer:
+    """Per-worker write-behind buffer for logged hours. Entries are written as
+    one multi-row INSERT when the buffer holds `size` entries, when the oldest
+    has waited `interval` seconds, or at the end of a request that finds the
+    buffer due. log(..., durable=True) writes its entry on its own before
+    returning, so the entry has its logID and a failure is the caller's to see."""
+    def __init__(self, app, size=100, interval=1.0, dead_letter=None):
+        self.app = app
+        self.size = size
+        self.interval = interval
+        self.dead_letter = dead_letter or os.path.join(app.instance_path, 'hours-dead-letter.jsonl')
+        self._pending = []
+        self._oldest = None
+        self._timer = None
+        self._lock = threading.Lock()
+        # Held for a whole flush, so a flush that returns has written every earlier entry
+        self._flush_lock = threading.Lock()
+        self.flushes = 0
+        self.dead_lettered = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def log(self, staffID, studentID, hours, description, durable=False):
+        """Queue an entry, or write it now when durable. Returns the LoggedHours;
+        a queued entry's logID is set once flushed."""
+        log = LoggedHours(staffID=staffID, studentID=studentID, hours=hours, description=description,
+                          logDate=datetime.utcnow(), isConfirmed=False)
+        if durable:
+            # Never queued, so a failure here is reported once and not retried behind the caller
+            with self.app.app_context():
+                try:
+                    LoggedHours.insertMany([log])
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                invalidate_responses()
+            return log
+        with self._lock:
+            self._pending.append(log)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._schedule()
+            full = len(self._pending) >= self.size
+        if full:
+            self.flush_quietly()
+        return log
+
+    def due(self):
+        return len(self._pending) >= self.size or \
+            (self._oldest is not None and time.monotonic() - self._oldest >= self.interval)
+
+    def flush(self):
+        """Write everything queued so far in one transaction; returns the entries written.
+        A locked or unreachable database puts the batch back for the next flush. Any
+        other failure retries the entries one by one and dead-letters those that still
+        fail, since each was already acknowledged to its caller."""
+        with self._flush_lock:
+            with self._lock:
+                logs, self._pending, self._oldest = self._pending, [], None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not logs:
+                return []
+            # A fresh app context gets its own session, apart from the caller's request
+            with self.app.app_context():
+                try:
+                    written = self._insert(logs)
+                except OperationalError:
+                    with self._lock:
+                        self._pending[:0] = logs
+                        self._oldest = self._oldest or time.monotonic()
+                        self._schedule()
+                    raise
+                except Exception:
+                    written = self._insert_each(logs)
+                if written:
+                    invalidate_responses()
+            self.flushes += 1
+            return written
+
+    @staticmethod
+    def _insert(logs):
+        try:
+            LoggedHours.insertMany(logs)
+            db.session.commit()
+            return logs
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _insert_each(self, logs):
+        written, failed, retry = [], [], []
+        for log in logs:
+            try:
+                written.extend(self._insert([log]))
+            except OperationalError:
+                retry.append(log)
+            except Exception as e:
+                failed.append((log, e))
+        if retry:
+            with self._lock:
+                self._pending[:0] = retry
+                self._oldest = self._oldest or time.monotonic()
+                self._schedule()
+        if failed:
+            self._dead_letter(failed)
+        return written
+
+    def _dead_letter(self, failed):
+        """Append entries that cannot be written to the dead-letter file for `flask hours-buffer replay`"""
+        records = []
+        for log, error in failed:
+            record = {field: getattr(log, field) for field in DEAD_LETTER_FIELDS}
+            record.update(logDate=log.logDate.isoformat(), error=str(error.__cause__ or error))
+            records.append(json.dumps(record))
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter) or '.', exist_ok=True)
+            with open(self.dead_letter, 'a') as file:
+                file.writelines(record + '\n' for record in records)
+        except OSError:
+            # Last resort: the entries are still in the log
+            self.app.logger.exception("Cannot write the dead-letter file, lost entries: %s", records)
+            raise
+        self.dead_lettered += len(failed)
+        self.app.logger.error("Dead-lettered %d buffered logged hours entries to %s", len(failed), self.dead_letter)
+
+    def flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            self.app.logger.exception("Buffered logged hours flush failed")
+
+    def _schedule(self):
+        # Caller holds self._lock
+        if self._timer is None and self.interval:
+            self._timer = threading.Timer(self.interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush_quietly()
+
+
+def hours_buffer():
+    """The app's HoursBuffer, or None when HOURS_WRITE_BUFFER is off"""
+    return current_app.extensions.get('hours_buffer')
+
+def replay_dead_letters(path):
+    """Retry dead-lettered entries one by one, keeping those that still fail in the file"""
+    if not os.path.exists(path):
+        return {'written': 0, 'failed': 0}
+    with open(path) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    written, failed = 0, []
+    for record in records:
+        log = LoggedHours(**{field: record[field] for field in DEAD_LETTER_FIELDS},
+                          logDate=datetime.fromisoformat(record['logDate']), isConfirmed=False)
+        try:
+            LoggedHours.insertMany([log])
+            db.session.commit()
+            written += 1
+        except Exception as e:
+            db.session.rollback()
+            failed.append({**record, 'error': str(e.__cause__ or e)})
+    with open(path, 'w') as file:
+        file.writelines(json.dumps(record) + '\n' for record in failed)
+    if written:
+        invalidate_responses()
+    return {'written': written, 'failed': len(failed)}
+
+def setup_hours_buffer(app):
+    if not app.config.get('HOURS_WRITE_BUFFER'):
+        return None
+    buffer = HoursBuffer(app, app.config.get('HOURS_BUFFER_SIZE', 100),
+                         app.config.get('HOURS_BUFFER_INTERVAL', 1.0), app.config.get('HOURS_DEAD_LETTER'))
+    app.extensions['hours_buffer'] = buffer
+
+    @app.teardown_request
+    def flush_due_hours(exc):
+        if buffer.due():
+            buffer.flush_quietly()
+
+    # Whatever is still queued when the worker exits
+    atexit.register(buffer.flush_quietly)
+    return buffer
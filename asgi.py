@@ -0,0 +1,6 @@
+# ASGI entry point: uvicorn asgi:application --workers 4
+from App.main import create_app
+from App.async_api import AsyncAPI
+
+app = create_app()
+application = AsyncAPI(app)
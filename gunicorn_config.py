@@ -14,6 +14,9 @@ worker_class = 'gevent'
 # Log level
 loglevel = 'info'
 
+# Show the app's startup log lines (e.g. the database engine profile)
+raw_env = ['FLASK_LOG_LEVEL=INFO']
+
 # Where to log to
 accesslog = '-'  # '-' means log to stdout
 errorlog = '-'  # '-' means log to stderr
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Create the original user, student, staff, loggedHours, accolade and confirmRequest tables
+
+Revision ID: 1a6c3e8f0b52
+Revises:
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a6c3e8f0b52'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+TABLES = [
+    ('user', [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String(length=20), nullable=False, unique=True),
+        sa.Column('password', sa.String(length=256), nullable=False),
+        sa.Column('user_type', sa.String(length=20), nullable=False),
+        sa.Column('created_date', sa.DateTime(), nullable=True),
+    ]),
+    ('student', [
+        sa.Column('id', sa.Integer(), sa.ForeignKey('user.id'), primary_key=True),
+        sa.Column('studentName', sa.String(length=100), nullable=False),
+        sa.Column('totalHours', sa.Integer(), nullable=True),
+        sa.Column('studentEmail', sa.String(length=100), nullable=True),
+    ]),
+    ('staff', [
+        sa.Column('id', sa.Integer(), sa.ForeignKey('user.id'), primary_key=True),
+        sa.Column('staffName', sa.String(length=100), nullable=False),
+        sa.Column('staffEmail', sa.String(length=100), nullable=True),
+    ]),
+    ('loggedHours', [
+        sa.Column('logID', sa.Integer(), primary_key=True),
+        sa.Column('studentID', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('staffID', sa.Integer(), sa.ForeignKey('staff.id'), nullable=False),
+        sa.Column('hours', sa.Integer(), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('logDate', sa.DateTime(), nullable=True),
+        sa.Column('isConfirmed', sa.Boolean(), nullable=True),
+        sa.Column('dateConfirmed', sa.DateTime(), nullable=True),
+    ]),
+    ('accolade', [
+        sa.Column('accoladeID', sa.Integer(), primary_key=True),
+        sa.Column('studentID', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('milestone', sa.Integer(), nullable=False),
+        sa.Column('dateAwarded', sa.DateTime(), nullable=True),
+    ]),
+    ('confirmRequest', [
+        sa.Column('requestID', sa.Integer(), primary_key=True),
+        sa.Column('loggedHoursID', sa.Integer(), sa.ForeignKey('loggedHours.logID'), nullable=False),
+        sa.Column('studentID', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('requestDate', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+    ]),
+]
+
+
+def upgrade():
+    # Databases created by `flask init` (db.create_all) already have these
+    inspector = sa.inspect(op.get_bind())
+    for name, columns in TABLES:
+        if not inspector.has_table(name):
+            op.create_table(name, *columns)
+
+
+def downgrade():
+    for name, _ in reversed(TABLES):
+        op.drop_table(name)
@@ -0,0 +1,47 @@
+"""Add indexes for the hot loggedHours, accolade and confirmRequest filters
+
+Revision ID: 3f2a9c41d7e0
+Revises: 1a6c3e8f0b52
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c41d7e0'
+down_revision = '1a6c3e8f0b52'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_loggedHours_student_confirmed', 'loggedHours', ['studentID', 'isConfirmed']),
+    ('ix_loggedHours_staff_confirmed', 'loggedHours', ['staffID', 'isConfirmed']),
+    ('ix_confirmRequest_student_status', 'confirmRequest', ['studentID', 'status']),
+]
+
+
+def upgrade():
+    # Tables created by `flask init` (db.create_all) already have these
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+    constraints = {constraint['name'] for constraint in inspector.get_unique_constraints('accolade')}
+    if 'uq_accolade_student_milestone' not in constraints:
+        # Keep the earliest award per milestone before enforcing uniqueness
+        op.execute(
+            'DELETE FROM accolade WHERE "accoladeID" NOT IN '
+            '(SELECT MIN("accoladeID") FROM accolade GROUP BY "studentID", milestone)'
+        )
+        with op.batch_alter_table('accolade') as batch_op:
+            batch_op.create_unique_constraint('uq_accolade_student_milestone', ['studentID', 'milestone'])
+
+
+def downgrade():
+    with op.batch_alter_table('accolade') as batch_op:
+        batch_op.drop_constraint('uq_accolade_student_milestone', type_='unique')
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,38 @@
+"""Add the idempotencyKey store
+
+Revision ID: 5b9e1d47c3a8
+Revises: e7a3b95d0c12
+Create Date: 2026-10-18 21:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9e1d47c3a8'
+down_revision = 'e7a3b95d0c12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by `flask init` (db.create_all) already have the table
+    inspector = sa.inspect(op.get_bind())
+    if 'idempotencyKey' in inspector.get_table_names():
+        return
+    op.create_table(
+        'idempotencyKey',
+        sa.Column('keyHash', sa.String(length=40), primary_key=True),
+        sa.Column('fingerprint', sa.String(length=40), nullable=False),
+        sa.Column('message', sa.String(length=255), nullable=True),
+        sa.Column('resultID', sa.Integer(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('expiresAt', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_idempotencyKey_expiresAt', 'idempotencyKey', ['expiresAt'])
+
+
+def downgrade():
+    op.drop_index('ix_idempotencyKey_expiresAt', table_name='idempotencyKey')
+    op.drop_table('idempotencyKey')
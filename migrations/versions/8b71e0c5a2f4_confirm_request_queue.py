@@ -0,0 +1,46 @@
+"""Add claim and processing columns for the confirmation request queue
+
+Revision ID: 8b71e0c5a2f4
+Revises: 3f2a9c41d7e0
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b71e0c5a2f4'
+down_revision = '3f2a9c41d7e0'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column('claimToken', sa.String(length=32), nullable=True),
+    sa.Column('claimedAt', sa.DateTime(), nullable=True),
+    sa.Column('processedAt', sa.DateTime(), nullable=True),
+    sa.Column('processedBy', sa.Integer(), nullable=True),
+]
+
+
+def upgrade():
+    # Tables created by `flask init` (db.create_all) already have these
+    inspector = sa.inspect(op.get_bind())
+    existing = {column['name'] for column in inspector.get_columns('confirmRequest')}
+    missing = [column for column in COLUMNS if column.name not in existing]
+    if missing:
+        with op.batch_alter_table('confirmRequest') as batch_op:
+            for column in missing:
+                batch_op.add_column(column)
+            if 'processedBy' not in existing:
+                batch_op.create_foreign_key('fk_confirmRequest_processedBy_staff', 'staff', ['processedBy'], ['id'])
+    if 'ix_confirmRequest_status_date' not in {index['name'] for index in inspector.get_indexes('confirmRequest')}:
+        op.create_index('ix_confirmRequest_status_date', 'confirmRequest', ['status', 'requestDate'])
+
+
+def downgrade():
+    op.drop_index('ix_confirmRequest_status_date', table_name='confirmRequest')
+    with op.batch_alter_table('confirmRequest') as batch_op:
+        batch_op.drop_constraint('fk_confirmRequest_processedBy_staff', type_='foreignkey')
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
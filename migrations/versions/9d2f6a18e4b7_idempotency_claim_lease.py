@@ -0,0 +1,30 @@
+"""Record when an idempotency key was claimed, for reclaiming abandoned keys
+
+Revision ID: 9d2f6a18e4b7
+Revises: 5b9e1d47c3a8
+Create Date: 2026-10-19 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f6a18e4b7'
+down_revision = '5b9e1d47c3a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by `flask init` (db.create_all) already have the column
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('idempotencyKey')}
+    if 'claimedAt' in columns:
+        return
+    with op.batch_alter_table('idempotencyKey') as batch_op:
+        batch_op.add_column(sa.Column('claimedAt', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('idempotencyKey') as batch_op:
+        batch_op.drop_column('claimedAt')
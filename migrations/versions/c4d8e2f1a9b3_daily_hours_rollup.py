@@ -0,0 +1,42 @@
+"""Add the dailyHours rollup of confirmed hours and backfill it
+
+Revision ID: c4d8e2f1a9b3
+Revises: 8b71e0c5a2f4
+Create Date: 2026-10-18 18:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e2f1a9b3'
+down_revision = '8b71e0c5a2f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by `flask init` (db.create_all) already have the table
+    inspector = sa.inspect(op.get_bind())
+    if 'dailyHours' in inspector.get_table_names():
+        return
+    op.create_table(
+        'dailyHours',
+        sa.Column('studentID', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('hours', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('studentID', 'day'),
+    )
+    op.create_index('ix_dailyHours_day_student', 'dailyHours', ['day', 'studentID', 'hours'])
+    op.execute(
+        'INSERT INTO "dailyHours" ("studentID", day, hours) '
+        'SELECT "studentID", date("dateConfirmed"), sum(hours) FROM "loggedHours" '
+        'WHERE "isConfirmed" AND "dateConfirmed" IS NOT NULL '
+        'GROUP BY "studentID", date("dateConfirmed")'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_dailyHours_day_student', table_name='dailyHours')
+    op.drop_table('dailyHours')
@@ -0,0 +1,60 @@
+"""Add the per-student hoursLedger with running balances and backfill it
+
+Revision ID: e7a3b95d0c12
+Revises: c4d8e2f1a9b3
+Create Date: 2026-10-18 20:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b95d0c12'
+down_revision = 'c4d8e2f1a9b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by `flask init` (db.create_all) already have the table
+    inspector = sa.inspect(op.get_bind())
+    if 'hoursLedger' in inspector.get_table_names():
+        return
+    op.create_table(
+        'hoursLedger',
+        sa.Column('entryID', sa.Integer(), primary_key=True),
+        sa.Column('studentID', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('logID', sa.Integer(), sa.ForeignKey('loggedHours.logID'), nullable=True),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('hours', sa.Integer(), nullable=False),
+        sa.Column('confirmedBalance', sa.Integer(), nullable=False),
+        sa.Column('pendingBalance', sa.Integer(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('studentID', 'seq', name='uq_hoursLedger_student_seq'),
+    )
+    op.create_index('ix_hoursLedger_student_created', 'hoursLedger', ['studentID', 'createdAt'])
+    # One 'logged' entry per log and one 'confirmed' entry per confirmed log, in time order
+    op.execute(
+        'INSERT INTO "hoursLedger" ("studentID", seq, "logID", kind, hours, '
+        '"confirmedBalance", "pendingBalance", "createdAt") '
+        'SELECT "studentID", '
+        'row_number() OVER w, "logID", kind, hours, '
+        'sum(hours * "confirmedSign") OVER w, sum(hours * "pendingSign") OVER w, "createdAt" '
+        'FROM ('
+        'SELECT "studentID", "logID", \'logged\' AS kind, hours, '
+        'coalesce("logDate", "dateConfirmed") AS "createdAt", 0 AS "confirmedSign", 1 AS "pendingSign", '
+        '0 AS position FROM "loggedHours" '
+        'UNION ALL '
+        'SELECT "studentID", "logID", \'confirmed\', hours, "dateConfirmed", 1, -1, 1 FROM "loggedHours" '
+        'WHERE "isConfirmed" AND "dateConfirmed" IS NOT NULL'
+        ') AS events '
+        'WINDOW w AS (PARTITION BY "studentID" ORDER BY "createdAt", "logID", position '
+        'ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_hoursLedger_student_created', table_name='hoursLedger')
+    op.drop_table('hoursLedger')
@@ -1,4 +1,4 @@
-import click, pytest, sys
+import click, json, sys
 from flask.cli import with_appcontext, AppGroup
 
 from App.database import db, get_migrate
@@ -7,11 +7,37 @@ from App.main import create_app
 from App.controllers import (
     create_user, get_all_users_json, get_all_users,
     StudentController, StaffController,
-    initialize, view_leaderboard
+    initialize, view_leaderboard, view_student_rank, reconcile_total_hours,
+    read_rows, import_students, import_staff, import_hours, recompute_accolades, rebuild_rollups,
+    rebuild_ledger, purge_idempotency_keys, replay_buffered_hours,
+    claim_confirm_requests, process_confirm_requests, confirm_queue_stats,
+    export_stream, parse_date, parse_as_of, hours_analytics
 )
 
-app = create_app()
-migrate = get_migrate(app)
+# Commands that serve requests and need the full app
+SERVE_COMMANDS = {'run', 'shell', 'routes'}
+# flask's own options that take a value, e.g. `flask --app wsgi run`
+VALUE_OPTIONS = {'--app', '-A', '--env-file', '-e'}
+
+def cli_command(argv):
+    """The flask subcommand in argv, skipping the group's options and their values"""
+    args = iter(argv)
+    for arg in args:
+        if arg in VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+def app_profile():
+    """'web' when a server imports this module or for `flask run`, 'cli' for one-off commands"""
+    if click.get_current_context(silent=True) is None:
+        return 'web'
+    return 'web' if cli_command(sys.argv[1:]) in SERVE_COMMANDS else 'cli'
+
+app = create_app(profile=app_profile())
+# Only the flask CLI runs migrations
+migrate = get_migrate(app) if click.get_current_context(silent=True) else None
 
 '''
 Database init
@@ -73,18 +99,36 @@ def create_student_command(username, password, studentName, studentEmail):
 
 @student_cli.command("list", help="Lists students")
 def list_student_command():
-    students = StudentController.get_students_json()
+    students = StudentController.get_students_json('summary')
     for student in students:
         print(f"ID: {student['id']}, Name: {student['studentName']}, Hours: {student['totalHours']}")
 
 @student_cli.command("leaderboard", help="Shows the student leaderboard")
-def leaderboard_command():
-    rankings, message = view_leaderboard()
-    if rankings:
+@click.option("--top", type=click.IntRange(min=1), default=None, help="Only show the top N students")
+@click.option("--window", type=click.Choice(['week', 'month', 'term']), default=None,
+              help="Rank hours confirmed this week, month or term instead of all time")
+def leaderboard_command(top, window):
+    rankings, message = view_leaderboard(top, window)
+    if rankings is None:
+        print(f"Error: {message}")
+    elif not rankings:
+        print(f"No hours logged in this {window}." if window else "No students found.")
+    else:
         print("\n===== STUDENT LEADERBOARD =====")
-        for i, student in enumerate(rankings, 1):
-            print(f"{i}. {student.studentName}: {student.totalHours} hours")
+        for student in rankings:
+            print(f"{student.rank}. {student.studentName}: {student.totalHours} hours")
         print("=" * 32)
+
+@student_cli.command("rank", help="Shows a student's leaderboard rank")
+@click.argument("username")
+def rank_command(username):
+    student = StudentController.get_student_username(username)
+    if not student:
+        print("Student not found")
+        return
+    rank, message = view_student_rank(student.id)
+    if rank:
+        print(f"{rank.studentName} is ranked #{rank.rank} with {rank.totalHours} hours")
     else:
         print(f"Error: {message}")
 
@@ -104,6 +148,14 @@ def accolades_command(username):
     else:
         print("Student not found")
 
+@student_cli.command("reconcile", help="Recomputes stored total hours from confirmed logs")
+@click.option("--dry-run", is_flag=True, help="Only report drift, do not fix it")
+def reconcile_command(dry_run):
+    drifted, message = reconcile_total_hours(fix=not dry_run)
+    for row in drifted:
+        print(f"ID: {row.id}, Name: {row.studentName}, Stored: {row.storedHours}, Confirmed: {row.confirmedHours}")
+    print(message if dry_run or not drifted else f"{message} (fixed)")
+
 app.cli.add_command(student_cli)
 
 
@@ -126,7 +178,7 @@ def create_staff_command(username, password, staffName, staffEmail):
 
 @staff_cli.command("list", help="Lists staff")
 def list_staff_command():
-    staff_members = StaffController.get_staff_json()
+    staff_members = StaffController.get_staff_json('summary')
     if not staff_members:
         print("No staff members found.")
     else:
@@ -168,9 +220,391 @@ def confirm_hours_command(staff_username, log_id):
     else:
         print(f"Error: {message}")
 
+@staff_cli.command("confirm-hours-bulk", help="Confirm many logged hours read from a file or stdin")
+@click.argument("staff_username")
+@click.argument("ids_file", type=click.File("r"), default="-")
+@click.option("--chunk-size", type=int, default=500, help="Entries committed per transaction")
+def confirm_hours_bulk_command(staff_username, ids_file, chunk_size):
+    staff = StaffController.get_staff_username(staff_username)
+    if not staff:
+        print("Staff not found")
+        return
+    try:
+        log_ids = [int(token) for line in ids_file for token in line.replace(',', ' ').split()]
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    result, message = StaffController.confirm_hours_bulk(staff.id, log_ids, chunk_size)
+    if result is None:
+        print(f"Error: {message}")
+        return
+    print(message)
+    if result['skipped']:
+        print(f"Skipped (missing or already confirmed): {', '.join(map(str, result['skipped']))}")
+
 app.cli.add_command(staff_cli)
 
 
+'''
+Confirmation Queue Commands
+'''
+queue_cli = AppGroup('queue', help='Confirmation request queue commands')
+
+@queue_cli.command("process", help="Claims pending confirmation requests in batches and approves (or rejects) them")
+@click.argument("staff_username")
+@click.option("--batch-size", type=int, default=50)
+@click.option("--reject", is_flag=True, help="Reject instead of approve")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches")
+def process_queue_command(staff_username, batch_size, reject, max_batches):
+    staff = StaffController.get_staff_username(staff_username)
+    if not staff:
+        print("Staff not found")
+        return
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        claim, message = claim_confirm_requests(staff.id, batch_size)
+        if claim is None:
+            print(f"Error: {message}")
+            return
+        if not claim['requests']:
+            break
+        request_ids = [r.requestID for r in claim['requests']]
+        decision = {'rejectIds': request_ids} if reject else {'approveIds': request_ids}
+        result, message = process_confirm_requests(staff.id, claim['token'], **decision)
+        print(message if result is not None else f"Error: {message}")
+        batches += 1
+    print(f"Processed {batches} batch(es)")
+
+@queue_cli.command("stats", help="Shows confirmation queue depth and latency")
+def queue_stats_command():
+    stats, message = confirm_queue_stats()
+    if stats is None:
+        print(f"Error: {message}")
+        return
+    print(", ".join(f"{status}: {count}" for status, count in stats['depth'].items()))
+    print(f"Oldest pending: {stats['oldestPendingSeconds']:.0f}s, "
+          f"avg latency: {stats['avgLatencySeconds']:.0f}s, max latency: {stats['maxLatencySeconds']:.0f}s "
+          f"({stats['processedInWindow']} processed in the last {stats['windowSeconds']}s)")
+
+app.cli.add_command(queue_cli)
+
+
+'''
+Accolade Commands
+'''
+accolades_cli = AppGroup('accolades', help='Accolade commands')
+
+@accolades_cli.command("recompute", help="Awards every missing accolade based on stored total hours")
+@click.option("--reconcile", is_flag=True, help="Fix drifted total hours first")
+def recompute_accolades_command(reconcile):
+    if reconcile:
+        drifted, message = reconcile_total_hours()
+        print(message)
+    awarded, message = recompute_accolades()
+    print(message if awarded is not None else f"Error: {message}")
+
+app.cli.add_command(accolades_cli)
+
+
+'''
+Rollup Commands
+'''
+rollup_cli = AppGroup('rollup', help='Confirmed hours rollup commands')
+
+@rollup_cli.command("backfill", help="Rebuilds the daily confirmed hours buckets from logged hours")
+def rollup_backfill_command():
+    buckets, message = rebuild_rollups()
+    print(message if buckets is not None else f"Error: {message}")
+
+app.cli.add_command(rollup_cli)
+
+
+'''
+Ledger Commands
+'''
+ledger_cli = AppGroup('ledger', help='Hours ledger commands')
+
+@ledger_cli.command("show", help="Shows a student's balance and latest ledger entries")
+@click.argument("username")
+@click.option("--limit", type=int, default=20, help="Entries to show")
+@click.option("--before", type=int, default=None, help="Show entries before this sequence number")
+@click.option("--as-of", default=None, help="Balance as of this ISO date or datetime")
+def ledger_show_command(username, limit, before, as_of):
+    student = StudentController.get_student_username(username)
+    if not student:
+        print("Student not found")
+        return
+    try:
+        as_of = parse_as_of(as_of)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    balance, message = StudentController.view_balance(student.id, as_of)
+    print(f"{student.studentName}: {balance['confirmedHours']} confirmed, "
+          f"{balance['pendingHours']} pending as of {balance['asOf']}")
+    entries, message = StudentController.view_ledger(student.id, limit, before)
+    for entry in entries:
+        print(f"#{entry.seq} {entry.createdAt.isoformat()} {entry.kind} {entry.hours}h (log {entry.logID}) "
+              f"-> {entry.confirmedBalance} confirmed, {entry.pendingBalance} pending")
+
+@ledger_cli.command("rebuild", help="Rebuilds every student's ledger from logged hours")
+def ledger_rebuild_command():
+    entries, message = rebuild_ledger()
+    print(message if entries is not None else f"Error: {message}")
+
+app.cli.add_command(ledger_cli)
+
+
+'''
+Write Buffer Commands
+'''
+hours_buffer_cli = AppGroup('hours-buffer', help='Write-behind hours buffer commands')
+
+@hours_buffer_cli.command("replay", help="Retries dead-lettered logged hours entries")
+@click.option("--file", "path", type=click.Path(dir_okay=False), default=None,
+              help="Dead-letter file, defaults to HOURS_DEAD_LETTER")
+def hours_buffer_replay_command(path):
+    report, message = replay_buffered_hours(path)
+    print(message if report is not None else f"Error: {message}")
+
+app.cli.add_command(hours_buffer_cli)
+
+
+'''
+Idempotency Commands
+'''
+idempotency_cli = AppGroup('idempotency', help='Idempotency key commands')
+
+@idempotency_cli.command("purge", help="Deletes expired idempotency keys")
+def idempotency_purge_command():
+    purged, message = purge_idempotency_keys()
+    print(message if purged is not None else f"Error: {message}")
+
+app.cli.add_command(idempotency_cli)
+
+
+'''
+Import Commands
+'''
+import_cli = AppGroup('import', help='Bulk data import commands')
+
+importers = {'students': import_students, 'staff': import_staff, 'hours': import_hours}
+
+@import_cli.command("students", help="Imports students (username, password, studentName, studentEmail)")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", type=click.Choice(['csv', 'jsonl']), default=None, help="Defaults to the file extension")
+@click.option("--chunk-size", type=int, default=500, help="Rows inserted per transaction")
+def import_students_command(file, format, chunk_size):
+    run_import('students', file, format, chunk_size)
+
+@import_cli.command("staff", help="Imports staff (username, password, staffName, staffEmail)")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", type=click.Choice(['csv', 'jsonl']), default=None, help="Defaults to the file extension")
+@click.option("--chunk-size", type=int, default=500, help="Rows inserted per transaction")
+def import_staff_command(file, format, chunk_size):
+    run_import('staff', file, format, chunk_size)
+
+@import_cli.command("hours", help="Imports logged hours (staff, student, hours, description, logDate)")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", type=click.Choice(['csv', 'jsonl']), default=None, help="Defaults to the file extension")
+@click.option("--chunk-size", type=int, default=500, help="Rows inserted per transaction")
+def import_hours_command(file, format, chunk_size):
+    run_import('hours', file, format, chunk_size)
+
+def run_import(kind, file, format, chunk_size):
+    report, message = importers[kind](read_rows(file, format), chunk_size)
+    if report is None:
+        print(f"Error: {message}")
+        return
+    for line, error in report['errors']:
+        print(f"Line {line}: {error}")
+    print(message)
+
+app.cli.add_command(import_cli)
+
+
+'''
+Export Commands
+'''
+export_cli = AppGroup('export', help='Streaming data export commands')
+
+def export_options(command):
+    command = click.option("--student", default=None, help="Only this student's username")(command)
+    command = click.option("--gzip", is_flag=True, help="Gzip the output on the fly")(command)
+    command = click.option("--format", type=click.Choice(['csv', 'jsonl']), default='csv')(command)
+    command = click.option("--output", "-o", type=click.Path(dir_okay=False), default=None,
+                           help="File to write, defaults to stdout")(command)
+    return command
+
+def run_export(kind, output, format, gzip, student, **filters):
+    studentId = None
+    if student:
+        found = StudentController.get_student_username(student)
+        if not found:
+            print(f"Error: student {student} not found", file=sys.stderr)
+            sys.exit(1)
+        studentId = found.id
+    try:
+        for key in ('start', 'end'):
+            if key in filters:
+                filters[key] = parse_date(filters[key])
+        chunks = export_stream(kind, format, gzip, studentId=studentId, **filters)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    stream = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            stream.write(chunk if gzip else chunk.encode('utf-8'))
+    finally:
+        if output:
+            stream.close()
+        else:
+            stream.flush()
+
+@export_cli.command("hours", help="Exports logged hours, optionally within a logDate range")
+@export_options
+@click.option("--from", "start", default=None, help="First logDate (YYYY-MM-DD)")
+@click.option("--to", "end", default=None, help="Last logDate (YYYY-MM-DD)")
+def export_hours_command(output, format, gzip, student, start, end):
+    run_export('hours', output, format, gzip, student, start=start, end=end)
+
+@export_cli.command("accolades", help="Exports awarded accolades, optionally within a dateAwarded range")
+@export_options
+@click.option("--from", "start", default=None, help="First award date (YYYY-MM-DD)")
+@click.option("--to", "end", default=None, help="Last award date (YYYY-MM-DD)")
+def export_accolades_command(output, format, gzip, student, start, end):
+    run_export('accolades', output, format, gzip, student, start=start, end=end)
+
+@export_cli.command("leaderboard", help="Exports a leaderboard snapshot")
+@export_options
+@click.option("--window", type=click.Choice(['week', 'month', 'term']), default=None)
+def export_leaderboard_command(output, format, gzip, student, window):
+    run_export('leaderboard', output, format, gzip, student, window=window)
+
+app.cli.add_command(export_cli)
+
+
+'''
+Benchmark Commands
+'''
+bench_cli = AppGroup('bench', help='Performance benchmark commands')
+
+@bench_cli.command("indexes", help="Compares hot query plans and latency with and without indexes")
+@click.option("--students", type=int, default=2000)
+@click.option("--logs-per-student", type=int, default=25)
+@click.option("--repeat", type=int, default=200, help="Lookups timed per query")
+def bench_indexes_command(students, logs_per_student, repeat):
+    from App.bench import run_index_benchmark
+    report = run_index_benchmark(students, logs_per_student, repeat)
+    print(f"Seeded {report['students']} students and {report['loggedHours']} logged hours")
+    for name, variants in report['queries'].items():
+        print(f"\n{name}")
+        for variant, result in variants.items():
+            print(f"  {variant}: {result['avg_ms']} ms  plan: {'; '.join(result['plan'])}")
+
+def write_report(report, output):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as file:
+            file.write(text + "\n")
+        print(f"Wrote {output}")
+    else:
+        print(text)
+
+@bench_cli.command("seed", help="Bulk inserts a synthetic, skewed dataset")
+@click.option("--students", type=int, default=1000)
+@click.option("--staff", type=int, default=20)
+@click.option("--logs", type=int, default=20000, help="Logged hours entries")
+@click.option("--skew", type=float, default=1.1, help="Zipf exponent of logs per student")
+@click.option("--confirmed-ratio", type=float, default=0.7)
+@click.option("--reset", is_flag=True, help="Drop and recreate all tables first")
+def bench_seed_command(students, staff, logs, skew, confirmed_ratio, reset):
+    from App.bench import seed_synthetic
+    if reset:
+        db.drop_all()
+        db.create_all()
+    summary = seed_synthetic(students, staff, logs, skew, confirmed_ratio)
+    print(json.dumps(summary))
+
+@bench_cli.command("run", help="Times the key paths and prints JSON results")
+@click.option("--repeat", type=int, default=20, help="Calls timed per path")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write the JSON here")
+def bench_run_command(repeat, output):
+    from App.bench import run_path_benchmarks
+    write_report(run_path_benchmarks(repeat), output)
+
+@bench_cli.command("load", help="Threaded HTTP load against the test client or a running server")
+@click.option("--url", default=None, help="Base URL of a running server, e.g. http://127.0.0.1:8080")
+@click.option("--path", "paths", multiple=True, default=["/api/users", "/health"])
+@click.option("--requests", type=int, default=500)
+@click.option("--threads", type=int, default=8)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write the JSON here")
+def bench_load_command(url, paths, requests, threads, output):
+    from App.bench import run_load
+    write_report(run_load(list(paths), requests, threads, base_url=url, app=app), output)
+
+@bench_cli.command("startup", help="Reports import time and startup latency of the app factory and CLI")
+@click.option("--repeat", type=int, default=3)
+@click.option("--top", type=int, default=15, help="Packages to list by import time")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write the JSON here")
+def bench_startup_command(repeat, top, output):
+    from App.bench import run_startup_benchmark
+    write_report(run_startup_benchmark(repeat, top=top), output)
+
+@bench_cli.command("async", help="Compares the threaded sync path with the async ASGI path")
+@click.option("--path", "paths", multiple=True,
+              default=["/api/users", "/health", "/api/leaderboard?top=20"])
+@click.option("--requests", type=int, default=500)
+@click.option("--threads", type=int, default=8, help="Worker threads for the sync path")
+@click.option("--concurrency", type=int, default=64, help="Requests in flight on the async path")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write the JSON here")
+def bench_async_command(paths, requests, threads, concurrency, output):
+    from App.async_api import AsyncAPI
+    from App.bench import run_load, run_async_load
+    report = {
+        'sync': run_load(list(paths), requests, threads, app=app),
+        'async': run_async_load(AsyncAPI(app), list(paths), requests, concurrency),
+    }
+    write_report(report, output)
+
+@bench_cli.command("writes", help="Compares per-row commits with the write-behind buffer for logging hours")
+@click.option("--entries", type=int, default=2000)
+@click.option("--threads", type=int, default=8)
+@click.option("--batch-size", type=int, default=100, help="Entries per buffered INSERT")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write the JSON here")
+def bench_writes_command(entries, threads, batch_size, output):
+    from App.bench import run_write_benchmark
+    write_report(run_write_benchmark(entries, threads, batch_size), output)
+
+app.cli.add_command(bench_cli)
+
+
+'''
+Report Commands
+'''
+report_cli = AppGroup('report', help='Reporting commands')
+
+@report_cli.command("analytics", help="Hours per student, confirmation latency and weekly volume as JSON")
+@click.option("--from", "start", default=None, help="First logDate (YYYY-MM-DD), inclusive")
+@click.option("--to", "end", default=None, help="Last logDate (YYYY-MM-DD), inclusive")
+@click.option("--batch-size", type=int, default=10000, help="Rows fetched per round trip")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write the JSON here")
+def report_analytics_command(start, end, batch_size, output):
+    try:
+        start, end = parse_date(start), parse_date(end)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    report, message = hours_analytics(start, end, batch_size)
+    if report is None:
+        print(f"Error: {message}")
+        return
+    write_report(report, output)
+
+app.cli.add_command(report_cli)
+
+
 '''
 Test Commands
 '''
@@ -179,6 +613,7 @@ test = AppGroup('test', help='Testing commands')
 @test.command("user", help="Run User tests")
 @click.argument("type", default="all")
 def user_tests_command(type):
+    import pytest
     if type == "unit":
         sys.exit(pytest.main(["-k", "UserUnitTests"]))
     elif type == "int":